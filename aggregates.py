@@ -0,0 +1,309 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from log_store import (KATALOG_LOGU, KOLUMNA_DATY, PLIK_CSV, list_dates, migrate_csv, partition_dir, read_log,
+                       write_parquet_atomic)
+
+# Zmienne, dla których trzymamy liczność/sumę/sumę kwadratów/min/max
+ZMIENNE = ['temperatura', 'wilgotnosc_wzgledna', 'cisnienie', 'suma_opadu']
+
+# Zmienne akumulatora kowariancji (suma_opadu jest zbyt rzadko wypełniona w historii)
+ZMIENNE_KOWARIANCJI = ['temperatura', 'wilgotnosc_wzgledna', 'cisnienie']
+
+# Agregaty dzienne leżą obok danych w partycji, sumy per stacja w katalogu głównym logu
+PLIK_DZIENNY = "_agregaty.parquet"
+PLIK_STACJI = "_agregaty_stacje.parquet"
+
+KLUCZ = ['stacja', 'data']
+PARY = [(a, b) for i, a in enumerate(ZMIENNE_KOWARIANCJI) for b in ZMIENNE_KOWARIANCJI[i:]]
+
+
+def _kolumna_kow(a, b):
+    return f"kow_{a}__{b}"
+
+
+# Agregaty (stacja, dzień) policzone z surowych wierszy logu
+def _agreguj(df):
+    df = pd.DataFrame({
+        'stacja': df['stacja'].astype(str).to_numpy(),
+        'data': pd.to_datetime(df[KOLUMNA_DATY]).dt.strftime('%Y-%m-%d').to_numpy(),
+        **{v: pd.to_numeric(df[v], errors='coerce').to_numpy(dtype='float64') if v in df.columns
+           else np.full(len(df), np.nan) for v in ZMIENNE},
+    })
+    grupy = df.groupby(KLUCZ, sort=True)
+    kolumny = {}
+    for v in ZMIENNE:
+        kolumny[f"{v}_n"] = grupy[v].count()
+        kolumny[f"{v}_suma"] = grupy[v].sum()
+        kolumny[f"{v}_suma_kw"] = (df[v] * df[v]).groupby([df['stacja'], df['data']]).sum()
+        kolumny[f"{v}_min"] = grupy[v].min()
+        kolumny[f"{v}_max"] = grupy[v].max()
+    wynik = pd.DataFrame(kolumny)
+
+    # Kowariancja po wierszach kompletnych: liczność, średnie i współmomenty względem średniej grupy
+    pelne = df.dropna(subset=ZMIENNE_KOWARIANCJI)
+    grupy_pelne = pelne.groupby(KLUCZ, sort=True)
+    srednie = grupy_pelne[ZMIENNE_KOWARIANCJI].mean()
+    wynik['kow_n'] = grupy_pelne.size()
+    wycentrowane = pelne[ZMIENNE_KOWARIANCJI].to_numpy() - srednie.loc[
+        pd.MultiIndex.from_frame(pelne[KLUCZ])].to_numpy()
+    for v in ZMIENNE_KOWARIANCJI:
+        wynik[f"kow_srednia_{v}"] = srednie[v]
+    for a, b in PARY:
+        iloczyn = wycentrowane[:, ZMIENNE_KOWARIANCJI.index(a)] * wycentrowane[:, ZMIENNE_KOWARIANCJI.index(b)]
+        wynik[_kolumna_kow(a, b)] = pd.Series(iloczyn, index=pelne.index).groupby(
+            [pelne['stacja'], pelne['data']]).sum()
+
+    wynik['kow_n'] = wynik['kow_n'].fillna(0)
+    return wynik.reset_index()
+
+
+# Scalenie agregatów do zadanego klucza (np. ['stacja'], ['data'] lub [] – cały kraj).
+# Kowariancja: C = Σ C_p + Σ n_p (m_p - m)(m_p - m)ᵀ, stabilne numerycznie i łączne.
+def merge_aggregates(tab, klucze):
+    tab = tab.copy()
+    if not klucze:
+        tab['_caly'] = 0
+        klucze = ['_caly']
+    grupy = tab.groupby(klucze, sort=True)
+
+    kolumny = {}
+    for v in ZMIENNE:
+        for stat in ('n', 'suma', 'suma_kw'):
+            kolumny[f"{v}_{stat}"] = grupy[f"{v}_{stat}"].sum()
+        kolumny[f"{v}_min"] = grupy[f"{v}_min"].min()
+        kolumny[f"{v}_max"] = grupy[f"{v}_max"].max()
+
+    n = tab['kow_n'].fillna(0)
+    n_razem = n.groupby([tab[k] for k in klucze]).transform('sum')
+    kolumny['kow_n'] = grupy['kow_n'].sum()
+    srednie = {}
+    for v in ZMIENNE_KOWARIANCJI:
+        wazona = (tab[f"kow_srednia_{v}"].fillna(0) * n).groupby([tab[k] for k in klucze]).transform('sum')
+        srednie[v] = wazona / n_razem.replace(0, np.nan)
+        kolumny[f"kow_srednia_{v}"] = srednie[v].groupby([tab[k] for k in klucze]).first()
+    for a, b in PARY:
+        delta_a = tab[f"kow_srednia_{a}"] - srednie[a]
+        delta_b = tab[f"kow_srednia_{b}"] - srednie[b]
+        skladnik = tab[_kolumna_kow(a, b)].fillna(0) + (n * delta_a * delta_b).fillna(0)
+        kolumny[_kolumna_kow(a, b)] = skladnik.groupby([tab[k] for k in klucze]).sum()
+
+    wynik = pd.DataFrame(kolumny).reset_index()
+    return wynik.drop(columns=['_caly'], errors='ignore')
+
+
+# Średnie, odchylenia i ekstrema z agregatów (bez dotykania surowych wierszy)
+def summarize(tab, klucze=('stacja',)):
+    wynik = tab[list(klucze)].copy()
+    for v in ZMIENNE:
+        n = tab[f"{v}_n"]
+        suma = tab[f"{v}_suma"]
+        wynik[f"{v}_n"] = n
+        wynik[f"{v}_srednia"] = suma / n.replace(0, np.nan)
+        wariancja = (tab[f"{v}_suma_kw"] - suma * suma / n.replace(0, np.nan)) / (n - 1).where(n > 1)
+        wynik[f"{v}_wariancja"] = wariancja.clip(lower=0)
+        wynik[f"{v}_odchylenie"] = np.sqrt(wynik[f"{v}_wariancja"])
+        wynik[f"{v}_min"] = tab[f"{v}_min"]
+        wynik[f"{v}_max"] = tab[f"{v}_max"]
+    return wynik
+
+
+# Macierz korelacji z jednego wiersza agregatów
+def correlation(wiersz):
+    k = len(ZMIENNE_KOWARIANCJI)
+    macierz = np.empty((k, k))
+    for a, b in PARY:
+        i, j = ZMIENNE_KOWARIANCJI.index(a), ZMIENNE_KOWARIANCJI.index(b)
+        macierz[i, j] = macierz[j, i] = wiersz[_kolumna_kow(a, b)]
+    odchylenia = np.sqrt(np.diag(macierz))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        korelacja = macierz / np.outer(odchylenia, odchylenia)
+    return pd.DataFrame(korelacja, index=ZMIENNE_KOWARIANCJI, columns=ZMIENNE_KOWARIANCJI)
+
+
+def _czytaj(sciezka):
+    return pd.read_parquet(sciezka) if os.path.exists(sciezka) else None
+
+
+# Partycja bez surowych wierszy (wszystkie zastąpione): agregat dzienny i pusty katalog do usunięcia
+def _usun_pusta_partycje(data, katalog=KATALOG_LOGU):
+    sciezka = os.path.join(partition_dir(data, katalog), PLIK_DZIENNY)
+    if os.path.exists(sciezka):
+        os.remove(sciezka)
+    if os.path.isdir(partition_dir(data, katalog)) and not os.listdir(partition_dir(data, katalog)):
+        os.rmdir(partition_dir(data, katalog))
+
+
+# Aktualizacja po dopisaniu nowych wierszy – koszt O(nowe wiersze + liczba stacji)
+def update_aggregates(df, katalog=KATALOG_LOGU):
+    nowe = _agreguj(df)
+
+    for data, fragment in nowe.groupby('data'):
+        sciezka = os.path.join(partition_dir(data, katalog), PLIK_DZIENNY)
+        stare = _czytaj(sciezka)
+        if stare is not None:
+            fragment = merge_aggregates(pd.concat([stare, fragment], ignore_index=True), KLUCZ)
+        os.makedirs(os.path.dirname(sciezka), exist_ok=True)
+        write_parquet_atomic(fragment.reset_index(drop=True), sciezka)
+
+    sciezka = os.path.join(katalog, PLIK_STACJI)
+    stacje = merge_aggregates(nowe, ['stacja'])
+    stare = _czytaj(sciezka)
+    if stare is not None:
+        stacje = merge_aggregates(pd.concat([stare, stacje], ignore_index=True), ['stacja'])
+    os.makedirs(katalog, exist_ok=True)
+    write_parquet_atomic(stacje, sciezka)
+    return stacje
+
+
+# Odwrotność merge_aggregates dla sum per stacja: usunięcie wkładu części (te same kolumny, klucz 'stacja').
+# Kowariancja: C_r = C - C_p - n_r·n_p/n · (m_r - m_p)(m_r - m_p)ᵀ. Min/max nie da się odjąć –
+# zostają bez zmian, a zwracana lista wskazuje stacje, w których odjęta część mogła wyznaczać ekstremum.
+def _odejmij(calosc, czesc):
+    wynik = calosc.set_index('stacja')
+    czesc = czesc.set_index('stacja').reindex(wynik.index)
+    do_przeliczenia = pd.Series(False, index=wynik.index)
+    for v in ZMIENNE:
+        for stat in ('n', 'suma', 'suma_kw'):
+            wynik[f"{v}_{stat}"] = wynik[f"{v}_{stat}"] - czesc[f"{v}_{stat}"].fillna(0)
+        do_przeliczenia |= (czesc[f"{v}_min"] <= wynik[f"{v}_min"]) | (czesc[f"{v}_max"] >= wynik[f"{v}_max"])
+
+    n = wynik['kow_n'].fillna(0)
+    n_p = czesc['kow_n'].fillna(0)
+    n_r = n - n_p
+    srednie_r = {}
+    for v in ZMIENNE_KOWARIANCJI:
+        m_p = czesc[f"kow_srednia_{v}"].fillna(0)
+        srednie_r[v] = ((wynik[f"kow_srednia_{v}"].fillna(0) * n - m_p * n_p) / n_r.where(n_r > 0))
+    for a, b in PARY:
+        poprawka = (n_r * n_p / n.where(n > 0) * (srednie_r[a] - czesc[f"kow_srednia_{a}"])
+                    * (srednie_r[b] - czesc[f"kow_srednia_{b}"]))
+        wynik[_kolumna_kow(a, b)] = (wynik[_kolumna_kow(a, b)] - czesc[_kolumna_kow(a, b)].fillna(0)
+                                     - poprawka.fillna(0)).where(n_r > 0, 0.0)
+    for v in ZMIENNE_KOWARIANCJI:
+        wynik[f"kow_srednia_{v}"] = srednie_r[v]
+    wynik['kow_n'] = n_r
+    return wynik.reset_index(), do_przeliczenia[do_przeliczenia].index.tolist()
+
+
+# Po zastąpieniu wierszy (upsert): agregaty dzienne wskazanych partycji liczone od nowa, a sumy per stacja
+# korygowane o różnicę – odjęcie starego wkładu tych partycji i scalenie nowego. Koszt O(wskazane partycje
+# + liczba stacji); agregaty dzienne całej historii czytane tylko dla stacji, których min/max
+# mógł pochodzić z zastąpionych wierszy.
+def refresh_aggregates(daty, katalog=KATALOG_LOGU):
+    stare, nowe = [], []
+    for data in sorted(set(daty)):
+        sciezka = os.path.join(partition_dir(data, katalog), PLIK_DZIENNY)
+        poprzedni = _czytaj(sciezka)
+        if poprzedni is not None:
+            stare.append(poprzedni)
+        surowe = read_log(data, data, katalog=katalog)
+        if surowe.empty:
+            _usun_pusta_partycje(data, katalog)
+            continue
+        dzienny = _agreguj(surowe)
+        write_parquet_atomic(dzienny, sciezka)
+        nowe.append(dzienny)
+
+    sciezka = os.path.join(katalog, PLIK_STACJI)
+    stacje = _czytaj(sciezka)
+    if stacje is None:
+        dzienne = daily_aggregates(katalog=katalog)
+        stacje = merge_aggregates(dzienne, ['stacja']) if not dzienne.empty else dzienne
+    else:
+        do_przeliczenia = []
+        if stare:
+            stacje, do_przeliczenia = _odejmij(stacje, merge_aggregates(pd.concat(stare, ignore_index=True),
+                                                                        ['stacja']))
+        if nowe:
+            stacje = merge_aggregates(pd.concat([stacje] + nowe, ignore_index=True), ['stacja'])
+        if do_przeliczenia:
+            dzienne = daily_aggregates(katalog=katalog)
+            ekstrema = dzienne[dzienne['stacja'].isin(do_przeliczenia)].groupby('stacja').agg(
+                {f"{v}_{stat}": stat for v in ZMIENNE for stat in ('min', 'max')}).reindex(do_przeliczenia)
+            stacje = stacje.set_index('stacja')
+            stacje.loc[ekstrema.index, ekstrema.columns] = ekstrema
+            stacje = stacje.reset_index()
+    os.makedirs(katalog, exist_ok=True)
+    write_parquet_atomic(stacje, sciezka)
+    return stacje
+
+
+# Odczyt: sumy per stacja – O(liczba stacji)
+def station_aggregates(katalog=KATALOG_LOGU):
+    tab = _czytaj(os.path.join(katalog, PLIK_STACJI))
+    return tab if tab is not None else merge_aggregates(_agreguj(read_log(katalog=katalog)), ['stacja'])
+
+
+def station_summary(katalog=KATALOG_LOGU):
+    return summarize(station_aggregates(katalog))
+
+
+# Podsumowanie krajowe i korelacje całej historii; pusta historia – pusta seria i macierz
+def national_summary(katalog=KATALOG_LOGU):
+    stacje = station_aggregates(katalog)
+    if stacje.empty:
+        return pd.Series(dtype='float64'), pd.DataFrame(np.nan, index=ZMIENNE_KOWARIANCJI, columns=ZMIENNE_KOWARIANCJI)
+    kraj = merge_aggregates(stacje, [])
+    return summarize(kraj, klucze=()).iloc[0], correlation(kraj.iloc[0])
+
+
+# Agregaty dzienne z wybranego zakresu dat
+def daily_aggregates(start=None, end=None, katalog=KATALOG_LOGU):
+    fragmenty = [pd.read_parquet(sciezka) for data in list_dates(start, end, katalog)
+                 if os.path.exists(sciezka := os.path.join(partition_dir(data, katalog), PLIK_DZIENNY))]
+    if not fragmenty:
+        return pd.DataFrame(columns=KLUCZ)
+    return pd.concat(fragmenty, ignore_index=True)
+
+
+# Jednorazowe przeniesienie historii ze starego CSV do magazynu razem z agregatami.
+# Wywoływane jawnie przy starcie programów (main, app, kolektor, cli), nie w ścieżce odczytu.
+# Agregaty powstają jeszcze pod blokadą migracji, więc czekający proces zastaje je gotowe.
+def prepare_store(plik_csv=PLIK_CSV, katalog=KATALOG_LOGU):
+    return migrate_csv(plik_csv, katalog, po_migracji=rebuild_aggregates)
+
+
+# Przebudowa od zera z surowego logu; porównuje z zapisanymi agregatami i zwraca maksymalne rozbieżności
+def rebuild_aggregates(katalog=KATALOG_LOGU):
+    poprzednie = _czytaj(os.path.join(katalog, PLIK_STACJI))
+
+    surowe = read_log(katalog=katalog)
+    nowe = _agreguj(surowe)
+    for data, fragment in nowe.groupby('data'):
+        write_parquet_atomic(fragment.reset_index(drop=True), os.path.join(partition_dir(data, katalog), PLIK_DZIENNY))
+    for data in set(list_dates(katalog=katalog)) - set(nowe['data']):
+        _usun_pusta_partycje(data, katalog)
+    stacje = merge_aggregates(nowe, ['stacja'])
+    os.makedirs(katalog, exist_ok=True)
+    write_parquet_atomic(stacje, os.path.join(katalog, PLIK_STACJI))
+
+    if poprzednie is None:
+        return {}
+    stare = summarize(poprzednie).set_index('stacja')
+    swieze = summarize(stacje).set_index('stacja')
+    stare, swieze = stare.align(swieze, join='outer')
+    zgodne = np.isclose(stare.to_numpy(dtype='float64'), swieze.to_numpy(dtype='float64'),
+                        rtol=1e-6, atol=1e-6, equal_nan=True)
+    niezgodne = pd.Series((~zgodne).sum(axis=0), index=stare.columns)
+    return {kolumna: int(liczba) for kolumna, liczba in niezgodne.items() if liczba}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agregaty przyrostowe logu pogodowego")
+    parser.add_argument("--przebuduj", action="store_true", help="przelicz agregaty od zera i porównaj z zapisanymi")
+    argumenty = parser.parse_args()
+
+    if argumenty.przebuduj:
+        rozbieznosci = rebuild_aggregates()
+        if rozbieznosci:
+            print("Rozbieżności względem zapisanych agregatów (liczba stacji):")
+            for kolumna, liczba in rozbieznosci.items():
+                print(f"  {kolumna}: {liczba}")
+        else:
+            print("Agregaty zgodne z surowym logiem.")
+    else:
+        print(station_summary().to_string(index=False))
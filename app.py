@@ -1,349 +1,411 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 from datetime import datetime, timedelta
 
-from data_loader import fetch_weather_data
-from data_processing import clean_and_merge_data, merge_with_locations, calculate_heat_index
-from visualization import plot_temperature, plot_humidity
-
-# Funkcja do interpretacji pogody
-def interpretuj_pogode(wiersz):
-    opad = float(wiersz.get('suma_opadu', 0))
-    temp = float(wiersz['temperatura'])
-    wilg = float(wiersz['wilgotnosc_wzgledna'])
-
-    if opad > 0 and temp < 0:
-        return "❄️ Śnieg"
-    elif opad > 2.5:
-        return "🌧️ Deszcz"
-    elif wilg > 85:
-        return "☁️ Pochmurno"
-    elif wilg < 60:
-        return "☀️ Słonecznie"
-    else:
-        return "🌤️ Częściowe zachmurzenie"
-
-# Funkcja do tłumaczenia kierunku wiatru
-def kierunek_wiatru(stopnie):
-    kierunki = ["N", "NE", "E", "SE", "S", "SW", "W", "NW"]
-    indeks = round(stopnie / 45) % 8
-    return kierunki[indeks]
+from aggregates import prepare_store
+from fetch_cache import get_weather_data, cache_stats
+from data_processing import calculate_derived_metrics
+from dashboard import dashboard_snapshot
+from log_store import read_station_history
+from downsampling import history_for_chart
+from forecast import forecast
+from stations import cached_idw_grid, grid_frame
+from instrumentation import finish_run, lap, start_run
 
 # Konfiguracja strony
 st.set_page_config(page_title="Pogoda w Polsce", layout="wide")
 st.title("Prognoza pogody w polskich miastach")
 
-# Pobieranie i przetwarzanie danych
-df_surowe = fetch_weather_data()
-df_czyste = clean_and_merge_data(df_surowe)
-df_czyste = merge_with_locations(df_czyste)
-df_czyste = calculate_heat_index(df_czyste)
+# Historia ze starego weather_log.csv trafia do magazynu raz na proces (kolejne przeliczenia strony
+# nie sprawdzają nawet znacznika migracji)
+@st.cache_resource(show_spinner=False)
+def przygotuj_magazyn():
+    return prepare_store()
 
-# Średnia temperatura
-srednia_temp = df_czyste['temperatura'].mean()
 
-# Wybór stacji
-stacja_wybrana = st.sidebar.selectbox("Wybierz stację do analizy", df_czyste['stacja'].unique())
-df_stacja = df_czyste[df_czyste['stacja'] == stacja_wybrana]
-aktualny_wiersz = df_stacja.iloc[0]
+przygotuj_magazyn()
 
-# Historia pogodowa z pliku
+# Profilowanie bieżącego przeliczenia strony (czas i pamięć etapów, tylko dla tej sesji)
+profilowanie = st.sidebar.checkbox("Profiluj przeliczenie strony", value=False)
+profil_pamieci = st.sidebar.checkbox("Śledź pamięć (wolniej)", value=False, disabled=not profilowanie)
+start_run("rerun", wlaczone=profilowanie or None, pamiec=profil_pamieci if profilowanie else None)
+
+# finally także przy przerwanym przeliczeniu (st.stop, nowy rerun) – inaczej odcinek i śledzenie pamięci
+# zostałyby otwarte dla całego procesu
 try:
-    df_historia = pd.read_csv("weather_log.csv")
-    df_historia["data_pobrania"] = pd.to_datetime(df_historia["data_pobrania"])
-    dzisiaj = datetime.now()
-    siedem_dni_temu = dzisiaj - timedelta(days=7)
-    df_historia_stacja = df_historia[
-        (df_historia["stacja"] == stacja_wybrana) & 
-        (df_historia["data_pobrania"] >= siedem_dni_temu)
-    ]
-except:
-    df_historia_stacja = pd.DataFrame()
-
-# Wyświetlanie danych
-st.subheader(f"Analiza stacji: {stacja_wybrana}")
-
-opis_pogody = interpretuj_pogode(aktualny_wiersz)
-st.markdown(f"### Aktualna prognoza: **{opis_pogody}**")
-
-# Rząd 1: podstawowe parametry
-col1, col2, col3, col4 = st.columns(4)
-with col1:
-    st.metric("📈 Temperatura", f"{aktualny_wiersz['temperatura']} °C")
-with col2:
-    st.metric("🌡️ Odczuwalna temperatura", f"{aktualny_wiersz['heat_index']} °C")
-with col3:
-    st.metric("💧 Wilgotność", f"{aktualny_wiersz['wilgotnosc_wzgledna']}%")
-with col4:
-    st.metric("🌧️ Opady", f"{aktualny_wiersz['suma_opadu']} mm")
-
-st.markdown("<div style='margin-top: 20px;'></div>", unsafe_allow_html=True)
-
-# Rząd 2: dodatkowe informacje
-kierunek = kierunek_wiatru(float(aktualny_wiersz.get("kierunek_wiatru", 0)))
-predkosc_wiatru = aktualny_wiersz.get("predkosc_wiatru", "brak danych")
-cisnienie = aktualny_wiersz.get("cisnienie", "brak danych")
-odchylenie_temp = round(aktualny_wiersz['temperatura'] - srednia_temp, 2)
-
-col5, col6, col7, col8 = st.columns(4)
-with col5:
-    st.metric("🔀 Odchylenie od średniej", f"{odchylenie_temp} °C")
-with col6:
-    st.metric("💨 Wiatr", f"{predkosc_wiatru} m/s, {kierunek}")
-with col7:
-    st.metric("📉 Ciśnienie", f"{cisnienie} hPa")
-with col8:
-    st.write("")  # pusta kolumna
-
-# Historia pogodowa
-if not df_historia_stacja.empty:
-    st.markdown(f"### Ostatnie 7 dni – {stacja_wybrana}:")
-    col_temp, col_wilg, col_cisn = st.columns(3)
-
-    fig_temp = px.line(df_historia_stacja, x="data_pobrania", y="temperatura", markers=True, title="Temperatura (°C)")
-    fig_temp.update_layout(xaxis_title="Data", yaxis_title="Temperatura")
-    col_temp.plotly_chart(fig_temp, use_container_width=True)
-
-    fig_wilg = px.line(df_historia_stacja, x="data_pobrania", y="wilgotnosc_wzgledna", markers=True, title="Wilgotność (%)")
-    fig_wilg.update_layout(xaxis_title="Data", yaxis_title="Wilgotność")
-    col_wilg.plotly_chart(fig_wilg, use_container_width=True)
-
-    fig_cisn = px.line(df_historia_stacja, x="data_pobrania", y="cisnienie", markers=True, title="Ciśnienie (hPa)")
-    fig_cisn.update_layout(xaxis_title="Data", yaxis_title="Ciśnienie")
-    col_cisn.plotly_chart(fig_cisn, use_container_width=True)
-else:
-    st.info("Brak danych historycznych do wyświetlenia.")
-
-# Anomalie pogodowe
-st.subheader("Wyjątkowo ciepłe i zimne obszary")
-
-srednia = df_czyste['temperatura'].mean()
-odchylenie = df_czyste['temperatura'].std()
-
-df_gorace = df_czyste[df_czyste['temperatura'] > srednia + 5]
-df_zimne = df_czyste[df_czyste['temperatura'] < srednia - 5]
-
-st.markdown(f"Średnia krajowa temperatura: **{round(srednia, 2)} °C**")
-st.markdown(f"Odchylenie standardowe: **{round(odchylenie, 2)}**")
-
-st.markdown("#### 🌞 Stacje z temperaturą > średnia + 5°C")
-st.dataframe(df_gorace[['stacja', 'temperatura']])
-
-st.markdown("#### ❄️ Stacje z temperaturą < średnia - 5°C")
-st.dataframe(df_zimne[['stacja', 'temperatura']])
-
-# Mapa pogodowa
-st.sidebar.header("Ustawienia mapy")
-pokaz_mape = st.sidebar.checkbox("Pokaż mapę pogodową", value=True)
-zmienna_mapy = st.sidebar.selectbox("Wybierz zmienną do mapy", ["temperatura", "wilgotnosc_wzgledna", "cisnienie", "heat_index"])
-
-if pokaz_mape:
-    st.subheader(f"Mapa – {zmienna_mapy.capitalize()}")
-    df_mapa = df_czyste.dropna(subset=["latitude", "longitude", zmienna_mapy])
-
-    fig_mapa = px.scatter_mapbox(
-        df_mapa,
-        lat="latitude",
-        lon="longitude",
-        color=zmienna_mapy,
-        size=zmienna_mapy,
-        hover_name="stacja",
-        color_continuous_scale="RdYlBu_r",
-        mapbox_style="carto-positron",
-        zoom=5,
-        center={"lat": 52, "lon": 19},
-        title=f"{zmienna_mapy.capitalize()} w Polsce",
-        height=700
-    )
-    st.plotly_chart(fig_mapa)
-
-# Ekstrema pogodowe
-st.markdown("### Ekstremalne wartości pogodowe")
-
-col1, col2, col3, col4, col5, col6 = st.columns(6)
-
-max_temp = df_czyste.loc[df_czyste['temperatura'].idxmax()]
-col1.metric("Najcieplejsze miasto", max_temp['stacja'], f"{max_temp['temperatura']}°C")
-
-min_temp = df_czyste.loc[df_czyste['temperatura'].idxmin()]
-col2.metric("Najzimniejsze miasto", min_temp['stacja'], f"{min_temp['temperatura']}°C")
-
-max_wilg = df_czyste.loc[df_czyste['wilgotnosc_wzgledna'].idxmax()]
-col3.metric("Największa wilgotność", max_wilg['stacja'], f"{max_wilg['wilgotnosc_wzgledna']}%")
-
-min_wilg = df_czyste.loc[df_czyste['wilgotnosc_wzgledna'].idxmin()]
-col4.metric("Najmniejsza wilgotność", min_wilg['stacja'], f"{min_wilg['wilgotnosc_wzgledna']}%")
-
-if 'predkosc_wiatru' in df_czyste.columns:
-    max_wiatr = df_czyste.loc[df_czyste['predkosc_wiatru'].idxmax()]
-    col5.metric("Najsilniejszy wiatr", max_wiatr['stacja'], f"{max_wiatr['predkosc_wiatru']} m/s")
-
-    min_wiatr = df_czyste.loc[df_czyste['predkosc_wiatru'].idxmin()]
-    col6.metric("Najsłabszy wiatr", min_wiatr['stacja'], f"{min_wiatr['predkosc_wiatru']} m/s")
-else:
-    col5.warning("Brak danych o wietrze")
-    col6.empty()
-
-# Porównanie dwóch miast
-st.sidebar.header("Porównanie dwóch miast")
-miasta = df_czyste['stacja'].unique()
-miasto1 = st.sidebar.selectbox("Wybierz pierwsze miasto", miasta)
-miasto2 = st.sidebar.selectbox("Wybierz drugie miasto", miasta, index=1)
-
-df_porownanie = df_czyste[df_czyste['stacja'].isin([miasto1, miasto2])]
-
-# Porównanie parametrów
-st.subheader("Porównanie parametrów")
-
-wymagane_kolumny = ['stacja', 'temperatura', 'wilgotnosc_wzgledna', 'predkosc_wiatru', 'heat_index', 'suma_opadu']
-brakujace = [k for k in wymagane_kolumny if k not in df_porownanie.columns]
-if brakujace:
-    st.warning(f"Brakuje kolumn: {', '.join(brakujace)}.")
-else:
-    df_slupki = df_porownanie[wymagane_kolumny].melt(id_vars='stacja', var_name='Parametr', value_name='Wartość')
-
-    etykiety_parametrow = {
-        "temperatura": "Temperatura (°C)",
-        "wilgotnosc_wzgledna": "Wilgotność (%)",
-        "predkosc_wiatru": "Wiatr (m/s)",
-        "heat_index": "Temp. odczuwalna (°C)",
-        "suma_opadu": "Opady (mm)"
-    }
-    df_slupki["Parametr"] = df_slupki["Parametr"].map(etykiety_parametrow)
-
-    fig_porownanie = px.bar(
-        df_slupki,
-        y='Parametr',
-        x='Wartość',
-        color='stacja',
-        barmode='group',
-        orientation='h',
-        title='Grupowane porównanie parametrów'
+    # Pobieranie danych; przetworzenie, statystyki i rankingi – raz na odświeżenie, wspólne dla wszystkich sesji
+    lap("app.dane")
+    df_surowe = get_weather_data()
+    statystyki_cache = cache_stats()
+    migawka = dashboard_snapshot(df_surowe, statystyki_cache['pobrano'])
+    df_czyste = migawka.dane
+
+    # Stan pamięci podręcznej pobierania
+    st.sidebar.caption(
+        f"Dane z {statystyki_cache['pobrano']:%Y-%m-%d %H:%M} · cache: {statystyki_cache['trafienia']} trafień, "
+        f"{statystyki_cache['nieaktualne']} nieaktualnych, {statystyki_cache['chybienia']} chybień"
     )
-    fig_porownanie.update_layout(xaxis_title="Wartość", yaxis_title="Parametr", legend_title="Stacja")
-
-    st.plotly_chart(fig_porownanie, use_container_width=True)
-
-# Ciśnienie w wybranych miastach
-st.markdown("#### Ciśnienie atmosferyczne")
-
-col1, col2 = st.columns(2)
-cisnienie1 = df_porownanie[df_porownanie['stacja'] == miasto1]['cisnienie'].values[0]
-col1.metric(label=f"{miasto1}", value=f"{cisnienie1} hPa")
-
-cisnienie2 = df_porownanie[df_porownanie['stacja'] == miasto2]['cisnienie'].values[0]
-col2.metric(label=f"{miasto2}", value=f"{cisnienie2} hPa")
-
-# Ranking stacji
-st.subheader("Ranking stacji")
-if st.button("Pokaż ranking wszystkich stacji"):
-    st.markdown("### Temperatury (°C)")
-    df_sort_temp = df_czyste.sort_values(by="temperatura", ascending=False)
-    fig_temp = px.bar(df_sort_temp, x="temperatura", y="stacja", orientation="h")
-    st.plotly_chart(fig_temp)
-
-    st.markdown("### Wilgotność (%)")
-    df_sort_wilg = df_czyste.sort_values(by="wilgotnosc_wzgledna", ascending=False)
-    fig_wilg = px.bar(df_sort_wilg, x="wilgotnosc_wzgledna", y="stacja", orientation="h")
-    st.plotly_chart(fig_wilg)
-
-    st.markdown("### Temperatura odczuwalna (°C)")
-    df_sort_heat = df_czyste.sort_values(by="heat_index", ascending=False)
-    fig_heat = px.bar(df_sort_heat, x="heat_index", y="stacja", orientation="h")
-    st.plotly_chart(fig_heat)
-
-    st.markdown("### Ciśnienie (hPa)")
-    df_sort_cisnienie = df_czyste.sort_values(by="cisnienie", ascending=False)
-    fig_cisnienie = px.bar(df_sort_cisnienie, x="cisnienie", y="stacja", orientation="h")
-    st.plotly_chart(fig_cisnienie)
-
-st.subheader("Dodatkowe wizualizacje pogodowe")
-
-# LM
-# 1
-st.markdown("Średnia temperatura odczuwalna w stacjach")
-df_mean_heat = df_czyste.groupby("stacja")["heat_index"].mean().reset_index()
-fig_bar_heat = px.bar(df_mean_heat, x="stacja", y="heat_index",
-                      title="Średnia temperatura odczuwalna (°C)")
-fig_bar_heat.update_layout(xaxis_title="Stacja", yaxis_title="Temperatura odczuwalna (°C)", xaxis_tickangle=45)
-st.plotly_chart(fig_bar_heat, use_container_width=True)
-
-# 2
-st.markdown("Korelacja między parametrami pogodowymi")
-parametry = ["temperatura", "wilgotnosc_wzgledna", "cisnienie", "heat_index"]
-if 'predkosc_wiatru' in df_czyste.columns:
-    parametry.append("predkosc_wiatru")
-if 'suma_opadu' in df_czyste.columns:
-    parametry.append("suma_opadu")
-corr_matrix = df_czyste[parametry].corr()
-fig_heatmap = px.imshow(corr_matrix, text_auto=True, color_continuous_scale="RdBu_r",
-                        title="Mapa korelacji parametrów pogodowych")
-st.plotly_chart(fig_heatmap, use_container_width=True)
-
-# 3
-st.markdown("Odchylenie temperatury od średniej krajowej")
-df_czyste["odchylenie_temp"] = df_czyste["temperatura"] - df_czyste["temperatura"].mean()
-fig_line_odchylenie = px.line(df_czyste, x="stacja", y="odchylenie_temp", markers=True,
-                              title="Odchylenie temperatury od średniej (°C)")
-fig_line_odchylenie.update_layout(xaxis_title="Stacja", yaxis_title="Odchylenie (°C)", xaxis_tickangle=45)
-st.plotly_chart(fig_line_odchylenie, use_container_width=True)
-
-# 4
-if 'predkosc_wiatru' in df_czyste.columns:
-    st.markdown("Maksymalna prędkość wiatru w stacjach")
-    df_max_wiatr = df_czyste.groupby("stacja")["predkosc_wiatru"].max().reset_index()
-    fig_bar_wiatr = px.bar(df_max_wiatr, x="stacja", y="predkosc_wiatru",
-                           title="Maksymalna prędkość wiatru (m/s)")
-    fig_bar_wiatr.update_layout(xaxis_title="Stacja", yaxis_title="Prędkość wiatru (m/s)", xaxis_tickangle=45)
-    st.plotly_chart(fig_bar_wiatr, use_container_width=True)
-
-# 5
-st.markdown("#### 1. Temperatura odczuwalna vs Ciśnienie")
-fig_scatter_heat_press = px.scatter(df_czyste, x="heat_index", y="cisnienie", color="stacja",
-                                    title="Zależność temperatury odczuwalnej i ciśnienia", hover_data=["stacja"])
-fig_scatter_heat_press.update_layout(xaxis_title="Temperatura odczuwalna (°C)", yaxis_title="Ciśnienie (hPa)")
-st.plotly_chart(fig_scatter_heat_press, use_container_width=True)
-
-
-# 6
-st.markdown("Rozkład wilgotności w stacjach")
-fig_box_wilg = px.box(df_czyste, x="stacja", y="wilgotnosc_wzgledna", title="Rozkład wilgotności (%) w stacjach")
-fig_box_wilg.update_layout(xaxis_title="Stacja", yaxis_title="Wilgotność (%)", xaxis_tickangle=45)
-st.plotly_chart(fig_box_wilg, use_container_width=True)
-
-# 7
-if 'suma_opadu' in df_czyste.columns:
-    st.markdown("Suma opadów w stacjach")
-    df_sum_opady = df_czyste.groupby("stacja")["suma_opadu"].sum().reset_index()
-    fig_bar_opady = px.bar(df_sum_opady, x="stacja", y="suma_opadu", title="Suma opadów (mm) w stacjach")
-    fig_bar_opady.update_layout(xaxis_title="Stacja", yaxis_title="Suma opadów (mm)", xaxis_tickangle=45)
-    st.plotly_chart(fig_bar_opady, use_container_width=True)
-
-# 8
-if not df_historia_stacja.empty:
-    st.markdown("Ciśnienie w ostatnich 7 dniach")
-    fig_line_cisnienie_hist = px.line(df_historia_stacja, x="data_pobrania", y="cisnienie", markers=True,
-                                      title=f"Ciśnienie atmosferyczne – {stacja_wybrana}")
-    fig_line_cisnienie_hist.update_layout(xaxis_title="Data", yaxis_title="Ciśnienie (hPa)")
-    st.plotly_chart(fig_line_cisnienie_hist, use_container_width=True)
-
-# 9
-if not df_historia_stacja.empty and 'suma_opadu' in df_historia_stacja.columns:
-    st.markdown("#### 2. Liczba dni z opadami w ostatnich 7 dniach")
-    df_historia_stacja["opady_obecne"] = df_historia_stacja["suma_opadu"].apply(lambda x: "Opady" if x > 0 else "Bez opadów")
-    opady_counts = df_historia_stacja["opady_obecne"].value_counts().reset_index()
-    opady_counts.columns = ["Kategoria", "Liczba dni"]
-    fig_bar_opady_hist = px.bar(opady_counts, x="Kategoria", y="Liczba dni",
-                                title=f"Liczba dni z opadami – {stacja_wybrana}")
-    fig_bar_opady_hist.update_layout(xaxis_title="Kategoria", yaxis_title="Liczba dni")
-    st.plotly_chart(fig_bar_opady_hist, use_container_width=True)
-    
-# 10
-st.markdown("#### 1. Różnica między temperaturą a temperaturą odczuwalną")
-df_czyste["roznica_heat_temp"] = df_czyste["heat_index"] - df_czyste["temperatura"]
-df_roznica = df_czyste.groupby("stacja")["roznica_heat_temp"].mean().reset_index()
-fig_bar_roznica = px.bar(df_roznica, x="stacja", y="roznica_heat_temp",
-                         title="Średnia różnica między temperaturą odczuwalną a rzeczywistą (°C)")
-fig_bar_roznica.update_layout(xaxis_title="Stacja", yaxis_title="Różnica (°C)", xaxis_tickangle=45)
-st.plotly_chart(fig_bar_roznica, use_container_width=True)
\ No newline at end of file
+
+    # Wybór stacji
+    stacja_wybrana = st.sidebar.selectbox("Wybierz stację do analizy", migawka.stacje)
+    aktualny_wiersz = migawka.station(stacja_wybrana)
+
+    # Historia pogodowa z pliku – tylko wybrana stacja i wybrane okno
+    lap("app.historia")
+    liczba_dni = st.sidebar.number_input("Zakres historii (dni)", min_value=1, max_value=3650, value=7)
+    try:
+        dzisiaj = datetime.now()
+        poczatek_okna = dzisiaj - timedelta(days=int(liczba_dni))
+        df_historia_stacja = read_station_history(stacja_wybrana, start=poczatek_okna, end=dzisiaj)
+        df_historia_stacja = df_historia_stacja[df_historia_stacja["data_pobrania"] >= poczatek_okna]
+    except:
+        df_historia_stacja = pd.DataFrame()
+
+    # Wykres historii z ograniczoną liczbą punktów; przy danych zagregowanych dochodzi pasmo min/max
+    def wykres_historii(kolumna, tytul, os_y, szerokosc_px):
+        seria = history_for_chart(df_historia_stacja, kolumna, szerokosc_px=szerokosc_px)
+        fig = px.line(seria, x="czas_pomiaru", y=kolumna, markers=len(seria) <= 100, title=tytul)
+        if f"{kolumna}_min" in seria.columns:
+            for granica in ("min", "max"):
+                fig.add_scatter(x=seria["czas_pomiaru"], y=seria[f"{kolumna}_{granica}"], mode="lines",
+                                line=dict(width=0.5, dash="dot"), name=granica)
+        fig.update_layout(xaxis_title="Data", yaxis_title=os_y)
+        return fig
+
+    # Wyświetlanie danych
+    st.subheader(f"Analiza stacji: {stacja_wybrana}")
+
+    opis_pogody = aktualny_wiersz['opis_pogody']
+    st.markdown(f"### Aktualna prognoza: **{opis_pogody}**")
+
+    # Rząd 1: podstawowe parametry
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("📈 Temperatura", f"{aktualny_wiersz['temperatura']} °C")
+    with col2:
+        st.metric("🌡️ Odczuwalna temperatura", f"{aktualny_wiersz['heat_index']} °C")
+    with col3:
+        st.metric("💧 Wilgotność", f"{aktualny_wiersz['wilgotnosc_wzgledna']}%")
+    with col4:
+        st.metric("🌧️ Opady", f"{aktualny_wiersz['suma_opadu']} mm")
+
+    st.markdown("<div style='margin-top: 20px;'></div>", unsafe_allow_html=True)
+
+    # Rząd 2: dodatkowe informacje
+    kierunek = aktualny_wiersz.get("kierunek_wiatru_8", "brak danych")
+    predkosc_wiatru = aktualny_wiersz.get("predkosc_wiatru", "brak danych")
+    cisnienie = aktualny_wiersz.get("cisnienie", "brak danych")
+    odchylenie_temp = round(aktualny_wiersz['odchylenie_temp'], 2)
+
+    col5, col6, col7, col8 = st.columns(4)
+    with col5:
+        st.metric("🔀 Odchylenie od średniej", f"{odchylenie_temp} °C")
+    with col6:
+        st.metric("💨 Wiatr", f"{predkosc_wiatru} m/s, {kierunek}")
+    with col7:
+        st.metric("📉 Ciśnienie", f"{cisnienie} hPa")
+    with col8:
+        # Średnia historyczna stacji z agregatów przyrostowych (bez czytania surowego logu)
+        try:
+            historia_stacji = migawka.historia_stacji.loc[stacja_wybrana]
+            st.metric("🗓️ Średnia historyczna", f"{historia_stacji['temperatura_srednia']:.1f} °C",
+                      f"σ {historia_stacji['temperatura_odchylenie']:.1f}", delta_color="off")
+        except (KeyError, AttributeError):
+            st.write("")  # pusta kolumna
+
+    # Historia pogodowa
+    if not df_historia_stacja.empty:
+        st.markdown(f"### Ostatnie {liczba_dni} dni – {stacja_wybrana}:")
+        col_temp, col_wilg, col_cisn = st.columns(3)
+
+        fig_temp = wykres_historii("temperatura", "Temperatura (°C)", "Temperatura", szerokosc_px=400)
+        col_temp.plotly_chart(fig_temp, use_container_width=True)
+
+        fig_wilg = wykres_historii("wilgotnosc_wzgledna", "Wilgotność (%)", "Wilgotność", szerokosc_px=400)
+        col_wilg.plotly_chart(fig_wilg, use_container_width=True)
+
+        fig_cisn = wykres_historii("cisnienie", "Ciśnienie (hPa)", "Ciśnienie", szerokosc_px=400)
+        col_cisn.plotly_chart(fig_cisn, use_container_width=True)
+    else:
+        st.info("Brak danych historycznych do wyświetlenia.")
+
+    # Prognoza na najbliższe godziny – liczona raz na wersję modelu dla wszystkich stacji, tu tylko wycinek
+    lap("app.prognoza")
+    prognozy = forecast()
+    prognoza_stacji = prognozy[prognozy["stacja"] == stacja_wybrana]
+    if "czas" in prognoza_stacji.columns and prognoza_stacji["temperatura"].notna().any():
+        st.markdown(f"### Prognoza na {len(prognoza_stacji)} h – {stacja_wybrana}")
+        col_p_temp, col_p_wilg, col_p_cisn = st.columns(3)
+        for kolumna_ui, zmienna, tytul in ((col_p_temp, "temperatura", "Temperatura (°C)"),
+                                          (col_p_wilg, "wilgotnosc_wzgledna", "Wilgotność (%)"),
+                                          (col_p_cisn, "cisnienie", "Ciśnienie (hPa)")):
+            fig = go.Figure()
+            for znak, nazwa in ((1, "górna granica"), (-1, "dolna granica")):
+                fig.add_scatter(x=prognoza_stacji["czas"],
+                                y=prognoza_stacji[zmienna] + znak * 1.96 * prognoza_stacji[f"{zmienna}_blad"],
+                                mode="lines", line=dict(width=0), fill="tonexty" if znak < 0 else None,
+                                fillcolor="rgba(99,110,250,0.2)", name=nazwa, showlegend=False)
+            fig.add_scatter(x=prognoza_stacji["czas"], y=prognoza_stacji[zmienna], mode="lines+markers", name="prognoza")
+            fig.update_layout(title=tytul, xaxis_title="Czas", showlegend=False)
+            kolumna_ui.plotly_chart(fig, use_container_width=True)
+        st.caption("Model autoregresyjny stacji dopasowany do historii logu; pasmo – 95% przedział błędu prognozy")
+    else:
+        st.info("Brak modelu prognozy – uruchom `python cli.py forecast`.")
+
+    # Anomalie pogodowe
+    lap("app.anomalie")
+    st.subheader("Wyjątkowo ciepłe i zimne obszary")
+
+    st.markdown(f"Średnia krajowa temperatura: **{round(migawka.srednia, 2)} °C**")
+    st.markdown(f"Odchylenie standardowe: **{round(migawka.odchylenie, 2)}**")
+
+    st.markdown("#### 🌞 Stacje z temperaturą > średnia + 5°C")
+    st.dataframe(migawka.gorace)
+
+    st.markdown("#### ❄️ Stacje z temperaturą < średnia - 5°C")
+    st.dataframe(migawka.zimne)
+
+    # Anomalie względem normy klimatycznej stacji (klimatologia z całej historii logu)
+    st.subheader("Anomalie względem normy stacji")
+    anomalie = migawka.anomalie_klimatyczne
+    if anomalie is not None and anomalie['temperatura_norma'].notna().any():
+        st.caption("Norma: średnia z historii stacji dla dnia roku (±7 dni); z – odchylenie w odchyleniach standardowych")
+        st.dataframe(anomalie.loc[anomalie['anomalia'] != '',
+                                  ['stacja', 'temperatura', 'temperatura_norma', 'temperatura_z', 'temperatura_percentyl',
+                                   'anomalia']]
+                     .sort_values('temperatura_z', key=abs, ascending=False)
+                     .round({'temperatura': 1, 'temperatura_norma': 1, 'temperatura_z': 2, 'temperatura_percentyl': 0}))
+    else:
+        st.info("Brak norm klimatycznych – uruchom `python cli.py climatology`.")
+
+    # Mapa pogodowa
+    lap("app.mapa")
+    st.sidebar.header("Ustawienia mapy")
+    pokaz_mape = st.sidebar.checkbox("Pokaż mapę pogodową", value=True)
+    zmienna_mapy = st.sidebar.selectbox("Wybierz zmienną do mapy", ["temperatura", "wilgotnosc_wzgledna", "cisnienie", "heat_index"])
+    pokaz_pole = st.sidebar.checkbox("Pole interpolowane (IDW)", value=True)
+
+    # Mapa dla danej zmiennej i warstwy budowana raz na migawkę danych
+    def wykres_mapy(zmienna_mapy, pokaz_pole):
+        df_mapa = df_czyste.dropna(subset=["latitude", "longitude", zmienna_mapy])
+
+        fig_mapa = px.scatter_mapbox(
+            df_mapa,
+            lat="latitude",
+            lon="longitude",
+            color=zmienna_mapy,
+            size=zmienna_mapy,
+            hover_name="stacja",
+            color_continuous_scale="RdYlBu_r",
+            mapbox_style="carto-positron",
+            zoom=5,
+            center={"lat": 52, "lon": 19},
+            title=f"{zmienna_mapy.capitalize()} w Polsce",
+            height=700
+        )
+
+        # Pole interpolowane rysowane pod markerami stacji
+        if pokaz_pole:
+            df_pole = grid_frame(*cached_idw_grid(df_czyste, zmienna_mapy, krok=0.2), zmienna_mapy)
+            fig_mapa.add_trace(go.Scattermapbox(
+                lat=df_pole["latitude"], lon=df_pole["longitude"], mode="markers", hoverinfo="skip", showlegend=False,
+                marker=dict(size=14, color=df_pole[zmienna_mapy], coloraxis="coloraxis", opacity=0.35),
+            ))
+            fig_mapa.data = (fig_mapa.data[-1],) + fig_mapa.data[:-1]
+        return fig_mapa
+
+    if pokaz_mape:
+        st.subheader(f"Mapa – {zmienna_mapy.capitalize()}")
+        st.plotly_chart(migawka.memo(("mapa", zmienna_mapy, pokaz_pole), lambda: wykres_mapy(zmienna_mapy, pokaz_pole)))
+
+    # Ekstrema pogodowe
+    st.markdown("### Ekstremalne wartości pogodowe")
+
+    col1, col2, col3, col4, col5, col6 = st.columns(6)
+
+    max_temp, min_temp = migawka.ekstrema['temperatura']
+    col1.metric("Najcieplejsze miasto", max_temp['stacja'], f"{max_temp['temperatura']}°C")
+    col2.metric("Najzimniejsze miasto", min_temp['stacja'], f"{min_temp['temperatura']}°C")
+
+    max_wilg, min_wilg = migawka.ekstrema['wilgotnosc_wzgledna']
+    col3.metric("Największa wilgotność", max_wilg['stacja'], f"{max_wilg['wilgotnosc_wzgledna']}%")
+    col4.metric("Najmniejsza wilgotność", min_wilg['stacja'], f"{min_wilg['wilgotnosc_wzgledna']}%")
+
+    if 'predkosc_wiatru' in migawka.ekstrema:
+        max_wiatr, min_wiatr = migawka.ekstrema['predkosc_wiatru']
+        col5.metric("Najsilniejszy wiatr", max_wiatr['stacja'], f"{max_wiatr['predkosc_wiatru']} m/s")
+        col6.metric("Najsłabszy wiatr", min_wiatr['stacja'], f"{min_wiatr['predkosc_wiatru']} m/s")
+    else:
+        col5.warning("Brak danych o wietrze")
+        col6.empty()
+
+    # Porównanie dwóch miast
+    lap("app.porownanie")
+    st.sidebar.header("Porównanie dwóch miast")
+    miasto1 = st.sidebar.selectbox("Wybierz pierwsze miasto", migawka.stacje)
+    miasto2 = st.sidebar.selectbox("Wybierz drugie miasto", migawka.stacje, index=1)
+
+    df_porownanie = migawka.stations(dict.fromkeys([miasto1, miasto2])).reset_index(drop=True)
+
+    # Porównanie parametrów
+    st.subheader("Porównanie parametrów")
+
+    wymagane_kolumny = ['stacja', 'temperatura', 'wilgotnosc_wzgledna', 'predkosc_wiatru', 'heat_index', 'suma_opadu']
+    brakujace = [k for k in wymagane_kolumny if k not in df_porownanie.columns]
+    if brakujace:
+        st.warning(f"Brakuje kolumn: {', '.join(brakujace)}.")
+    else:
+        df_slupki = df_porownanie[wymagane_kolumny].melt(id_vars='stacja', var_name='Parametr', value_name='Wartość')
+
+        etykiety_parametrow = {
+            "temperatura": "Temperatura (°C)",
+            "wilgotnosc_wzgledna": "Wilgotność (%)",
+            "predkosc_wiatru": "Wiatr (m/s)",
+            "heat_index": "Temp. odczuwalna (°C)",
+            "suma_opadu": "Opady (mm)"
+        }
+        df_slupki["Parametr"] = df_slupki["Parametr"].map(etykiety_parametrow)
+
+        fig_porownanie = px.bar(
+            df_slupki,
+            y='Parametr',
+            x='Wartość',
+            color='stacja',
+            barmode='group',
+            orientation='h',
+            title='Grupowane porównanie parametrów'
+        )
+        fig_porownanie.update_layout(xaxis_title="Wartość", yaxis_title="Parametr", legend_title="Stacja")
+
+        st.plotly_chart(fig_porownanie, use_container_width=True)
+
+    # Ciśnienie w wybranych miastach
+    st.markdown("#### Ciśnienie atmosferyczne")
+
+    col1, col2 = st.columns(2)
+    cisnienie1 = migawka.station(miasto1)['cisnienie']
+    col1.metric(label=f"{miasto1}", value=f"{cisnienie1} hPa")
+
+    cisnienie2 = migawka.station(miasto2)['cisnienie']
+    col2.metric(label=f"{miasto2}", value=f"{cisnienie2} hPa")
+
+    # Ranking stacji
+    lap("app.ranking")
+    st.subheader("Ranking stacji")
+    if st.button("Pokaż ranking wszystkich stacji"):
+        for kolumna, naglowek in [("temperatura", "Temperatury (°C)"), ("wilgotnosc_wzgledna", "Wilgotność (%)"),
+                                  ("heat_index", "Temperatura odczuwalna (°C)"), ("cisnienie", "Ciśnienie (hPa)")]:
+            st.markdown(f"### {naglowek}")
+            st.plotly_chart(migawka.memo(("ranking", kolumna), lambda: px.bar(
+                migawka.rankingi[kolumna], x=kolumna, y="stacja", orientation="h")))
+
+    lap("app.wizualizacje")
+    st.subheader("Dodatkowe wizualizacje pogodowe")
+
+    # Wykresy niezależne od widżetów – budowane raz na migawkę danych
+    def wykresy_ogolne():
+        wykresy = {}
+
+        # LM
+        # 1
+        fig_bar_heat = px.bar(migawka.srednia_heat_index, x="stacja", y="heat_index",
+                              title="Średnia temperatura odczuwalna (°C)")
+        fig_bar_heat.update_layout(xaxis_title="Stacja", yaxis_title="Temperatura odczuwalna (°C)", xaxis_tickangle=45)
+        wykresy['heat'] = fig_bar_heat
+
+        # 2
+        wykresy['korelacja'] = px.imshow(migawka.korelacja, text_auto=True, color_continuous_scale="RdBu_r",
+                                         title="Mapa korelacji parametrów pogodowych")
+
+        # 3
+        fig_line_odchylenie = px.line(df_czyste, x="stacja", y="odchylenie_temp", markers=True,
+                                      title="Odchylenie temperatury od średniej (°C)")
+        fig_line_odchylenie.update_layout(xaxis_title="Stacja", yaxis_title="Odchylenie (°C)", xaxis_tickangle=45)
+        wykresy['odchylenie'] = fig_line_odchylenie
+
+        # 4
+        if migawka.max_wiatr is not None:
+            fig_bar_wiatr = px.bar(migawka.max_wiatr, x="stacja", y="predkosc_wiatru",
+                                   title="Maksymalna prędkość wiatru (m/s)")
+            fig_bar_wiatr.update_layout(xaxis_title="Stacja", yaxis_title="Prędkość wiatru (m/s)", xaxis_tickangle=45)
+            wykresy['wiatr'] = fig_bar_wiatr
+
+        # 5
+        fig_scatter_heat_press = px.scatter(df_czyste, x="heat_index", y="cisnienie", color="stacja",
+                                            title="Zależność temperatury odczuwalnej i ciśnienia", hover_data=["stacja"])
+        fig_scatter_heat_press.update_layout(xaxis_title="Temperatura odczuwalna (°C)", yaxis_title="Ciśnienie (hPa)")
+        wykresy['heat_cisnienie'] = fig_scatter_heat_press
+
+        # 6
+        fig_box_wilg = px.box(df_czyste, x="stacja", y="wilgotnosc_wzgledna", title="Rozkład wilgotności (%) w stacjach")
+        fig_box_wilg.update_layout(xaxis_title="Stacja", yaxis_title="Wilgotność (%)", xaxis_tickangle=45)
+        wykresy['wilgotnosc'] = fig_box_wilg
+
+        # 7
+        if migawka.suma_opadow is not None:
+            fig_bar_opady = px.bar(migawka.suma_opadow, x="stacja", y="suma_opadu", title="Suma opadów (mm) w stacjach")
+            fig_bar_opady.update_layout(xaxis_title="Stacja", yaxis_title="Suma opadów (mm)", xaxis_tickangle=45)
+            wykresy['opady'] = fig_bar_opady
+
+        # 10
+        fig_bar_roznica = px.bar(migawka.roznica_heat_temp, x="stacja", y="roznica_heat_temp",
+                                 title="Średnia różnica między temperaturą odczuwalną a rzeczywistą (°C)")
+        fig_bar_roznica.update_layout(xaxis_title="Stacja", yaxis_title="Różnica (°C)", xaxis_tickangle=45)
+        wykresy['roznica'] = fig_bar_roznica
+        return wykresy
+
+    wykresy = migawka.memo("wykresy_ogolne", wykresy_ogolne)
+
+    st.markdown("Średnia temperatura odczuwalna w stacjach")
+    st.plotly_chart(wykresy['heat'], use_container_width=True)
+
+    st.markdown("Korelacja między parametrami pogodowymi")
+    st.plotly_chart(wykresy['korelacja'], use_container_width=True)
+
+    st.markdown("Odchylenie temperatury od średniej krajowej")
+    st.plotly_chart(wykresy['odchylenie'], use_container_width=True)
+
+    if 'wiatr' in wykresy:
+        st.markdown("Maksymalna prędkość wiatru w stacjach")
+        st.plotly_chart(wykresy['wiatr'], use_container_width=True)
+
+    st.markdown("#### 1. Temperatura odczuwalna vs Ciśnienie")
+    st.plotly_chart(wykresy['heat_cisnienie'], use_container_width=True)
+
+    st.markdown("Rozkład wilgotności w stacjach")
+    st.plotly_chart(wykresy['wilgotnosc'], use_container_width=True)
+
+    if 'opady' in wykresy:
+        st.markdown("Suma opadów w stacjach")
+        st.plotly_chart(wykresy['opady'], use_container_width=True)
+
+    # 8
+    if not df_historia_stacja.empty:
+        st.markdown(f"Ciśnienie w ostatnich {liczba_dni} dniach")
+        fig_line_cisnienie_hist = wykres_historii("cisnienie", f"Ciśnienie atmosferyczne – {stacja_wybrana}",
+                                                  "Ciśnienie (hPa)", szerokosc_px=1000)
+        st.plotly_chart(fig_line_cisnienie_hist, use_container_width=True)
+
+    # 9
+    if not df_historia_stacja.empty and 'suma_opadu' in df_historia_stacja.columns:
+        st.markdown(f"#### 2. Liczba dni z opadami w ostatnich {liczba_dni} dniach")
+        df_historia_stacja = calculate_derived_metrics(df_historia_stacja)
+        opady_counts = df_historia_stacja["opady_obecne"].value_counts()[lambda liczby: liczby > 0].reset_index()
+        opady_counts.columns = ["Kategoria", "Liczba dni"]
+        fig_bar_opady_hist = px.bar(opady_counts, x="Kategoria", y="Liczba dni",
+                                    title=f"Liczba dni z opadami – {stacja_wybrana}")
+        fig_bar_opady_hist.update_layout(xaxis_title="Kategoria", yaxis_title="Liczba dni")
+        st.plotly_chart(fig_bar_opady_hist, use_container_width=True)
+
+    # 10
+    st.markdown("#### 1. Różnica między temperaturą a temperaturą odczuwalną")
+    st.plotly_chart(wykresy['roznica'], use_container_width=True)
+finally:
+    wpisy_profilu = finish_run()
+
+# Zestawienie etapów profilowanego przeliczenia
+if profilowanie:
+    st.subheader("Profil przeliczenia strony")
+    st.dataframe(pd.DataFrame(wpisy_profilu).drop(columns=["ts", "przebieg"], errors="ignore"))
@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Skale danych syntetycznych: (liczba stacji, liczba dni, pomiary co godzinę).
+# Magazyn budowany jest dzień po dniu, więc 'duzy' i 'max' (do 87,6 mln wierszy) wymagają miejsca
+# na dysku i czasu, ale nie pamięci proporcjonalnej do zakresu.
+SKALE = {
+    'mini': (60, 1, False),
+    'maly': (60, 30, True),
+    'sredni': (60, 365, True),
+    'duzy': (1000, 365, True),
+    'max': (1000, 3650, True),
+}
+DOMYSLNE_SKALE = ['mini', 'maly', 'sredni']
+
+PLIK_BAZOWY = os.path.join(os.path.dirname(__file__), "benchmarks", "baseline.json")
+PROG_REGRESJI = 0.2
+
+# Różnice poniżej tych wartości to szum pomiarowy, a nie regresja
+MIN_ROZNICA = {'czas_s': 0.01, 'pamiec_mb': 1.0}
+POWTORZENIA = 3
+
+# Przypadki w pamięci (jak jedno pobranie w aplikacji) liczone na próbce z tylu pierwszych dni
+DNI_PROBKI = 7
+
+POCZATEK = datetime(2015, 1, 1)
+
+
+# Surowe dane w kształcie odpowiedzi API synop IMGW (wszystkie pola jako tekst)
+# `od_dnia` przesuwa zakres, więc kolejne dni można generować osobno (synthetic_days)
+def synthetic_synop(stacje, dni, co_godzine=True, seed=0, od_dnia=0):
+    rng = np.random.default_rng(seed)
+    godziny = np.arange(24) if co_godzine else np.array([12])
+    dzien = np.repeat(np.arange(od_dnia, od_dnia + dni), len(godziny) * stacje)
+    godzina = np.tile(np.repeat(godziny, stacje), dni)
+    stacja = np.tile(np.arange(stacje), dni * len(godziny))
+    n = len(stacja)
+
+    doba = (dzien * 24 + godzina) / 24
+    sezon = np.sin(2 * np.pi * (doba - 110) / 365.25)
+    dobowy = np.sin(2 * np.pi * (godzina - 9) / 24)
+    temperatura = 8 + 12 * sezon + 4 * dobowy - stacja % 13 * 0.3 + rng.normal(0, 2, n)
+    daty = (np.datetime64(POCZATEK.date()) + dzien.astype('timedelta64[D]')).astype(str)
+
+    return pd.DataFrame({
+        'id_stacji': (12000 + stacja).astype(str),
+        'stacja': np.char.add('Stacja ', stacja.astype(str)),
+        'data_pomiaru': daty,
+        'godzina_pomiaru': godzina.astype(str),
+        'temperatura': np.round(temperatura, 1).astype(str),
+        'predkosc_wiatru': rng.integers(0, 15, n).astype(str),
+        'kierunek_wiatru': (rng.integers(0, 36, n) * 10).astype(str),
+        'wilgotnosc_wzgledna': np.round(np.clip(75 - 15 * dobowy + rng.normal(0, 10, n), 10, 100), 1).astype(str),
+        'suma_opadu': np.round(np.maximum(rng.normal(-1, 1.5, n), 0), 1).astype(str),
+        'cisnienie': np.round(1013 + rng.normal(0, 8, n), 1).astype(str),
+    })
+
+
+# Kolejne dni danych syntetycznych – zakres dowolnej długości bez trzymania go w pamięci
+def synthetic_days(stacje, dni, co_godzine=True, seed=0):
+    for dzien in range(dni):
+        yield synthetic_synop(stacje, 1, co_godzine, seed=seed + dzien, od_dnia=dzien)
+
+
+# Historia w formacie logu (data_pobrania plus klucz pomiaru)
+def synthetic_log(surowe):
+    log = surowe[['stacja', 'temperatura', 'wilgotnosc_wzgledna', 'cisnienie', 'suma_opadu',
+                  'id_stacji', 'data_pomiaru', 'godzina_pomiaru']].copy()
+    log['data_pobrania'] = surowe['data_pomiaru']
+    return log
+
+
+# Czas: najlepszy z kilku przebiegów; szczyt pamięci: osobny przebieg pod tracemalloc
+# (śledzenie alokacji spowalnia pandas, więc nie może zawyżać pomiaru czasu)
+def _zmierz(funkcja, przygotuj=None, powtorzenia=POWTORZENIA):
+    czasy = []
+    for _ in range(powtorzenia):
+        argumenty = przygotuj() if przygotuj else ()
+        start = time.perf_counter()
+        funkcja(*argumenty)
+        czasy.append(time.perf_counter() - start)
+
+    argumenty = przygotuj() if przygotuj else ()
+    tracemalloc.start()
+    try:
+        funkcja(*argumenty)
+        szczyt = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'czas_s': round(min(czasy), 6), 'pamiec_mb': round(szczyt / 2 ** 20, 3)}
+
+
+# Magazyn zapisywany dzień po dniu tą samą ścieżką co data_logger (upsert + agregaty);
+# zwraca ostatni dzień w formacie logu i liczbę wierszy
+def _zbuduj_magazyn(stacje, dni, co_godzine, katalog):
+    import log_store
+    from aggregates import update_aggregates
+
+    dzien, wiersze = None, 0
+    for surowe in synthetic_days(stacje, dni, co_godzine):
+        dzien = synthetic_log(surowe)
+        zapisane, _ = log_store.upsert_snapshot(dzien, katalog)
+        update_aggregates(zapisane, katalog)
+        wiersze += len(dzien)
+    return dzien, wiersze
+
+
+def benchmark_scale(skala, powtorzenia=POWTORZENIA):
+    import climatology
+    import forecast
+    import log_store
+    from aggregates import update_aggregates
+    from data_processing import calculate_heat_index, clean_and_merge_data, merge_with_locations
+    from schema import apply_schema
+
+    stacje, dni, co_godzine = SKALE[skala]
+    surowe = synthetic_synop(stacje, min(dni, DNI_PROBKI), co_godzine)
+    wyniki = {}
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        wyniki['clean_and_merge_data'] = _zmierz(lambda: clean_and_merge_data(surowe), powtorzenia=powtorzenia)
+        typowane = apply_schema(surowe)
+
+    # Metryki pochodne i współrzędne liczone dla wszystkich wierszy próbki, nie tylko migawki stacji
+    wyniki['calculate_heat_index'] = _zmierz(
+        calculate_heat_index, lambda: (typowane.copy(),), powtorzenia=powtorzenia)
+    wyniki['merge_with_locations'] = _zmierz(lambda: merge_with_locations(typowane), powtorzenia=powtorzenia)
+    for wynik in wyniki.values():
+        wynik['wiersze'] = len(surowe)
+
+    # Pozostałe przypadki działają na magazynie z całym zakresem skali
+    katalog = tempfile.mkdtemp(prefix="bench_log_")
+    przypadki_magazynu = {}
+    try:
+        ostatni_dzien, wiersze = _zbuduj_magazyn(stacje, dni, co_godzine, katalog)
+        kolejne_dni = iter(range(dni, dni + powtorzenia + 1))
+
+        # Każdy przebieg zapisuje nowy dzień – inaczej upsert pominąłby powtórzone klucze
+        def nowy_dzien():
+            data = (POCZATEK + timedelta(days=next(kolejne_dni))).strftime('%Y-%m-%d')
+            return (ostatni_dzien.assign(data_pobrania=data, data_pomiaru=data),)
+
+        def zapisz(dzien):
+            zapisane, _ = log_store.upsert_snapshot(dzien, katalog)
+            update_aggregates(zapisane, katalog)
+
+        przypadki_magazynu['zapisz_dzienne_dane'] = _zmierz(zapisz, nowy_dzien, powtorzenia=powtorzenia)
+
+        # Filtrowanie historii z app.py: jedna stacja, ostatnie 7 dni
+        koniec = POCZATEK + timedelta(days=dni)
+        przypadki_magazynu['historia_stacji_7_dni'] = _zmierz(
+            lambda: log_store.read_station_history('Stacja 0', koniec - timedelta(days=7), koniec, katalog=katalog),
+            powtorzenia=powtorzenia)
+
+        # Normy klimatyczne: przeliczenie całej historii partiami i ocena jednej migawki wszystkich stacji
+        przypadki_magazynu['klimatologia_od_zera'] = _zmierz(
+            lambda: climatology.update_climatology(katalog, od_zera=True), powtorzenia=powtorzenia)
+        przypadki_magazynu['klimatologia_anomalie'] = _zmierz(
+            lambda: climatology.flag_anomalies(typowane.tail(stacje), katalog=katalog), powtorzenia=powtorzenia)
+
+        # Prognoza: dopasowanie modeli wszystkich stacji od zera i prognoza 24 h bez pamięci podręcznej modelu
+        def bez_pamieci():
+            forecast.clear_cache()
+            return ()
+
+        przypadki_magazynu['prognoza_dopasowanie'] = _zmierz(
+            lambda: forecast.update_forecast_model(katalog, od_zera=True), powtorzenia=powtorzenia)
+        przypadki_magazynu['prognoza_wszystkie_stacje'] = _zmierz(
+            lambda: forecast.forecast(katalog=katalog), bez_pamieci, powtorzenia=powtorzenia)
+    finally:
+        shutil.rmtree(katalog, ignore_errors=True)
+
+    for wynik in przypadki_magazynu.values():
+        wynik['wiersze'] = wiersze
+    wyniki.update(przypadki_magazynu)
+    return wyniki
+
+
+def run(skale, powtorzenia=POWTORZENIA):
+    wyniki = {}
+    for skala in skale:
+        for przypadek, wynik in benchmark_scale(skala, powtorzenia).items():
+            klucz = f"{skala}/{przypadek}"
+            wyniki[klucz] = wynik
+            print(f"{klucz:<40} {wynik['czas_s'] * 1000:10.2f} ms {wynik['pamiec_mb']:10.2f} MB")
+    return {
+        'meta': {
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'maszyna': platform.machine(),
+        },
+        'wyniki': wyniki,
+    }
+
+
+# Porównanie z zapisaną linią bazową; zwraca listę regresji powyżej progu
+def compare(biezace, bazowe, prog=PROG_REGRESJI):
+    regresje = []
+    for klucz, wynik in biezace['wyniki'].items():
+        bazowy = bazowe['wyniki'].get(klucz)
+        if bazowy is None:
+            continue
+        for miara in ('czas_s', 'pamiec_mb'):
+            if wynik[miara] > bazowy[miara] * (1 + prog) and wynik[miara] - bazowy[miara] > MIN_ROZNICA[miara]:
+                regresje.append((klucz, miara, bazowy[miara], wynik[miara]))
+    return regresje
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarki przetwarzania i zapisu logu na danych syntetycznych")
+    parser.add_argument("--skale", nargs="+", choices=list(SKALE), default=DOMYSLNE_SKALE)
+    parser.add_argument("--powtorzenia", type=int, default=POWTORZENIA)
+    parser.add_argument("--zapisz", metavar="JSON", nargs="?", const=PLIK_BAZOWY,
+                        help="zapisz wyniki jako linię bazową (domyślnie benchmarks/baseline.json)")
+    parser.add_argument("--porownaj", metavar="JSON", nargs="?", const=PLIK_BAZOWY,
+                        help="porównaj z linią bazową i zakończ kodem 1 przy regresji")
+    parser.add_argument("--prog", type=float, default=PROG_REGRESJI, help="dopuszczalny wzrost (0.2 = 20%%)")
+    argumenty = parser.parse_args()
+
+    wyniki = run(argumenty.skale, argumenty.powtorzenia)
+
+    if argumenty.zapisz:
+        os.makedirs(os.path.dirname(os.path.abspath(argumenty.zapisz)), exist_ok=True)
+        with open(argumenty.zapisz, 'w', encoding='utf-8') as plik:
+            json.dump(wyniki, plik, indent=2, ensure_ascii=False)
+
+    if argumenty.porownaj:
+        with open(argumenty.porownaj, encoding='utf-8') as plik:
+            regresje = compare(wyniki, json.load(plik), argumenty.prog)
+        for klucz, miara, bazowy, biezacy in regresje:
+            print(f"REGRESJA {klucz} {miara}: {bazowy} → {biezacy}")
+        if regresje:
+            sys.exit(1)
+        print("Brak regresji powyżej progu.")
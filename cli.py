@@ -0,0 +1,259 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Wspólny punkt wejścia dla zadań wsadowych (cron, skrypty).
+# Ciężkie biblioteki (pandas, requests, matplotlib) są importowane dopiero w podkomendzie, która ich potrzebuje.
+
+# Moduły importowane przez każdą podkomendę i budżet czasu importu w milisekundach
+IMPORTY = {
+    'fetch': ['imgw_client'],
+    'log': ['data_logger'],
+    'render': ['data_loader', 'data_processing', 'visualization'],
+    'aggregates': ['aggregates'],
+    'compact': ['log_store', 'aggregates'],
+    'collect': ['collector'],
+    'climatology': ['climatology'],
+    'serve-data': ['data_server'],
+    'forecast': ['forecast'],
+}
+BUDZET_IMPORTU_MS = {
+    'fetch': 250,
+    'log': 1000,
+    'render': 900,
+    'aggregates': 900,
+    'compact': 900,
+    'collect': 1000,
+    'climatology': 900,
+    'serve-data': 900,
+    'forecast': 900,
+}
+
+KATALOG = os.path.dirname(os.path.abspath(__file__))
+
+
+def zaladuj(podkomenda):
+    import importlib
+    return [importlib.import_module(nazwa) for nazwa in IMPORTY[podkomenda]]
+
+
+# Pobranie surowych danych synop do CSV – tylko requests + biblioteka standardowa
+def cmd_fetch(argumenty):
+    import csv
+    from imgw_client import fetch_json
+
+    dane = fetch_json()
+    pola = list(dict.fromkeys(klucz for rekord in dane for klucz in rekord))
+    with open(argumenty.plik, 'w', newline='', encoding='utf-8') as plik:
+        zapis = csv.DictWriter(plik, fieldnames=pola)
+        zapis.writeheader()
+        zapis.writerows(dane)
+    print(f"Zapisano {len(dane)} stacji do {argumenty.plik}")
+
+
+def cmd_log(argumenty):
+    from data_logger import zapisz_dzienne_dane
+    zapisz_dzienne_dane()
+
+
+def cmd_render(argumenty):
+    from data_loader import fetch_weather_data, load_from_csv
+    from data_processing import clean_and_merge_data
+    from visualization import render_plots
+
+    df = load_from_csv(argumenty.z_pliku) if argumenty.z_pliku else fetch_weather_data()
+    render_plots(clean_and_merge_data(df), rownolegle=not argumenty.sekwencyjnie)
+
+
+def cmd_aggregates(argumenty):
+    from aggregates import prepare_store, rebuild_aggregates, station_summary
+
+    prepare_store()
+    if argumenty.przebuduj:
+        rozbieznosci = rebuild_aggregates()
+        if rozbieznosci:
+            print("Rozbieżności względem zapisanych agregatów (liczba stacji):", rozbieznosci)
+        else:
+            print("Agregaty zgodne z surowym logiem.")
+    else:
+        print(station_summary().to_string(index=False))
+
+
+# Kompakcja historii: stary weather_log.csv i magazyn partycji – bez powtórzeń klucza, posortowane
+def cmd_compact(argumenty):
+    from aggregates import rebuild_aggregates
+    from log_store import KATALOG_LOGU, compact_csv, compact_log
+
+    if os.path.exists(argumenty.csv):
+        print(f"{argumenty.csv}: usunięto {compact_csv(argumenty.csv)} powtórzonych wierszy")
+    if os.path.isdir(KATALOG_LOGU) and not argumenty.tylko_csv:
+        usuniete = compact_log()
+        print(f"{KATALOG_LOGU}: usunięto {usuniete} powtórzonych wierszy")
+        rebuild_aggregates()
+
+
+# Kolektor działający bez przerwy (zamiast `log` z crona) albo jego symulacja z fake_imgw
+def cmd_collect(argumenty):
+    import collector
+
+    if argumenty.symulacja:
+        import json
+        wynik = collector.simulate(argumenty.symulacja, argumenty.bledy)
+        print(json.dumps(wynik, indent=2, default=str, ensure_ascii=False))
+    else:
+        collector.main(argumenty)
+
+
+# Normy klimatyczne stacji: przyrostowo nowe fragmenty logu (z crona po `log`) lub od zera
+def cmd_climatology(argumenty):
+    from aggregates import prepare_store
+    from climatology import normals, station_percentiles, update_climatology
+
+    prepare_store()
+    print(f"Przetworzone fragmenty logu: {update_climatology(od_zera=argumenty.od_zera)}")
+    if argumenty.stacja:
+        try:
+            print(normals(argumenty.stacja).merge(station_percentiles(argumenty.stacja)).to_string(index=False))
+        except KeyError:
+            print(f"Brak historii stacji {argumenty.stacja}")
+
+
+# Lokalne API danych (migawka i historia jako Arrow IPC / JSON gzip) albo pomiar jego przepustowości
+def cmd_serve_data(argumenty):
+    import data_server
+
+    if argumenty.benchmark:
+        import json
+        wynik = data_server.benchmark(argumenty.benchmark, argumenty.watki)
+        print(json.dumps(wynik, indent=2, ensure_ascii=False))
+    else:
+        data_server.main(argumenty)
+
+
+# Model prognozy: przyrostowe dopasowanie do nowych fragmentów logu, prognoza stacji albo backtest
+def cmd_forecast(argumenty):
+    from forecast import backtest, forecast, update_forecast_model
+
+    if argumenty.backtest:
+        try:
+            wynik = backtest(argumenty.backtest, argumenty.horyzont)
+        except ValueError as blad:
+            print(f"Backtest niemożliwy – {blad}")
+            sys.exit(1)
+        print(wynik.pop('mae').to_string(index=False))
+        print(", ".join(f"{klucz}: {wartosc}" for klucz, wartosc in wynik.items()))
+        return
+    print(f"Przetworzone fragmenty logu: {update_forecast_model(od_zera=argumenty.od_zera)}")
+    if argumenty.stacja:
+        prognoza = forecast(argumenty.horyzont)
+        print(prognoza[prognoza['stacja'] == argumenty.stacja].to_string(index=False))
+
+
+def _czasy_importu(kod):
+    wynik = subprocess.run([sys.executable, "-X", "importtime", "-c", kod],
+                           cwd=KATALOG, capture_output=True, text=True, check=True)
+    czasy = {}
+    for linia in wynik.stderr.splitlines():
+        if not linia.startswith("import time:") or "cumulative" in linia:
+            continue
+        _, kumulatywny, nazwa = linia[len("import time:"):].split("|")
+        # Tylko importy najwyższego poziomu (bez wcięcia) – ich czasy kumulatywne sumują się do całości
+        if not nazwa.startswith("  "):
+            czasy[nazwa.strip()] = int(kumulatywny)
+    return czasy
+
+
+# Czas importu każdej podkomendy (ponad sam start interpretera) wg `python -X importtime`
+def import_budget():
+    start = _czasy_importu("pass")
+    raport = {}
+    for podkomenda in IMPORTY:
+        czasy = _czasy_importu(f"import cli; cli.zaladuj({podkomenda!r})")
+        ms = sum(us for nazwa, us in czasy.items() if nazwa not in start) / 1000
+        raport[podkomenda] = (round(ms, 1), BUDZET_IMPORTU_MS[podkomenda])
+    return raport
+
+
+def cmd_import_budget(argumenty):
+    przekroczone = False
+    for podkomenda, (ms, budzet) in import_budget().items():
+        status = "OK" if ms <= budzet else "PRZEKROCZONY"
+        przekroczone |= ms > budzet
+        print(f"{podkomenda:<12} {ms:8.1f} ms  (budżet {budzet} ms)  {status}")
+    sys.exit(1 if przekroczone else 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="cli.py", description="Pogoda w Polsce – zadania wsadowe")
+    parser.add_argument("--profil", action="store_true", help="mierz czas i pamięć etapów (linie JSON na stderr)")
+    parser.add_argument("--profil-plik", metavar="JSONL", help="jak --profil, ale linie JSON dopisywane do pliku")
+    parser.add_argument("--bez-pamieci", action="store_true", help="przy --profil pomiń śledzenie alokacji")
+    podkomendy = parser.add_subparsers(dest="podkomenda", required=True)
+
+    p = podkomendy.add_parser("fetch", help="pobierz dane synop do CSV")
+    p.add_argument("--plik", default=os.path.join(KATALOG, "weather_data.csv"))
+    p.set_defaults(funkcja=cmd_fetch)
+
+    p = podkomendy.add_parser("log", help="dopisz bieżące dane do logu historii")
+    p.set_defaults(funkcja=cmd_log)
+
+    p = podkomendy.add_parser("render", help="wyrenderuj wykresy PNG")
+    p.add_argument("--z-pliku", metavar="CSV", help="użyj zapisanego CSV zamiast pobierania")
+    p.add_argument("--sekwencyjnie", action="store_true", help="bez puli procesów")
+    p.set_defaults(funkcja=cmd_render)
+
+    p = podkomendy.add_parser("aggregates", help="podsumowanie lub przebudowa agregatów")
+    p.add_argument("--przebuduj", action="store_true")
+    p.set_defaults(funkcja=cmd_aggregates)
+
+    p = podkomendy.add_parser("collect", help="kolektor godzinowych danych synop z endpointem /health")
+    p.add_argument("--url", help="adres API (domyślnie IMGW_API_URL lub API IMGW)")
+    p.add_argument("--port", type=int, help="port endpointu /health i /metrics (domyślnie 8766)")
+    p.add_argument("--symulacja", type=int, metavar="GODZINY", help="test end-to-end z fake_imgw i zegarem symulowanym")
+    p.add_argument("--bledy", type=float, default=0.0, help="w symulacji: odsetek odpowiedzi 503 (0-1)")
+    p.set_defaults(funkcja=cmd_collect)
+
+    p = podkomendy.add_parser("compact", help="usuń powtórzone pomiary i posortuj historię")
+    p.add_argument("--csv", default=os.path.join(KATALOG, "weather_log.csv"), help="stary log CSV do kompakcji")
+    p.add_argument("--tylko-csv", action="store_true", help="bez kompakcji magazynu partycji")
+    p.set_defaults(funkcja=cmd_compact)
+
+    p = podkomendy.add_parser("climatology", help="zaktualizuj normy klimatyczne stacji z historii logu")
+    p.add_argument("--od-zera", action="store_true", help="przelicz normy od początku historii")
+    p.add_argument("--stacja", help="wypisz normy temperatury stacji dla każdego dnia roku")
+    p.set_defaults(funkcja=cmd_climatology)
+
+    p = podkomendy.add_parser("serve-data", help="lokalne API danych: /snapshot i /history (Arrow IPC lub JSON)")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, help="port serwera (domyślnie POGODA_DATA_PORT lub 8767)")
+    p.add_argument("--benchmark", type=int, metavar="ZAPYTANIA", help="zmierz przepustowość na danych lokalnych")
+    p.add_argument("--watki", type=int, default=8, help="w benchmarku: liczba równoległych klientów")
+    p.set_defaults(funkcja=cmd_serve_data)
+
+    p = podkomendy.add_parser("forecast", help="dopasuj model prognozy stacji lub oceń go backtestem")
+    p.add_argument("--od-zera", action="store_true", help="dopasuj model od początku historii")
+    p.add_argument("--stacja", help="wypisz prognozę stacji")
+    p.add_argument("--horyzont", type=int, default=24, help="liczba godzin prognozy")
+    p.add_argument("--backtest", type=int, metavar="DNI", help="oceń model na ostatnich DNI dniach historii")
+    p.set_defaults(funkcja=cmd_forecast)
+
+    p = podkomendy.add_parser("import-budget", help="sprawdź czasy importu podkomend")
+    p.set_defaults(funkcja=cmd_import_budget)
+
+    argumenty = parser.parse_args(argv)
+    if not (argumenty.profil or argumenty.profil_plik):
+        argumenty.funkcja(argumenty)
+        return
+
+    from instrumentation import configure, finish_run, format_breakdown, start_run
+    configure(True, argumenty.profil_plik, not argumenty.bez_pamieci)
+    start_run(argumenty.podkomenda)
+    try:
+        argumenty.funkcja(argumenty)
+    finally:
+        print(format_breakdown(finish_run()), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
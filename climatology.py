@@ -0,0 +1,290 @@
+import argparse
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from log_store import KATALOG_LOGU, read_fragments, station_ids
+from model_state import fragment_paths, load_state, pending_fragments, save_state
+
+# Klimatologia stacji z całej historii logu: normy dla każdej stacji i dnia roku (średnia krocząca
+# ±OKNO_DNI wokół dnia), odchylenia i percentyle z histogramów. Log jest czytany partiami partycji
+# (stała pamięć), a stan – sumy i histogramy – aktualizowany przyrostowo o nowe fragmenty.
+# Stacje są kluczowane po id_stacji, więc zmiana nazwy stacji nie zaczyna nowej klimatologii.
+
+KATALOG_KLIMATU = "_klimat"
+
+# Zmienne z normą średnia/odchylenie; percentyle (histogram) tylko dla temperatury
+ZMIENNE = ['temperatura', 'wilgotnosc_wzgledna', 'cisnienie']
+ZMIENNA_PERCENTYLI = 'temperatura'
+PRZEDZIALY = np.arange(-45.0, 45.5, 1.0)
+
+# Dni roku bez 29 lutego (łączony z 28 lutego)
+DNI_ROKU = 365
+OKNO_DNI = 7
+
+# Ile fragmentów partycji czytamy naraz (po kompakcji jeden fragment na dzień) – ogranicza pamięć
+PARTIA_FRAGMENTOW = 31
+
+# Progi anomalii: |z| i percentyle
+PROG_Z = 2.0
+PERCENTYLE_ANOMALII = (5, 95)
+MIN_POMIAROW = 30
+
+_blokada = threading.Lock()
+_pamiec = {}
+
+
+def _katalog(katalog):
+    return os.path.join(katalog, KATALOG_KLIMATU)
+
+
+def day_of_year(daty):
+    daty = pd.DatetimeIndex(pd.to_datetime(daty))
+    dzien = daty.dayofyear.to_numpy() - 1
+    return np.where(daty.is_leap_year & (dzien >= 59), dzien - 1, dzien)
+
+
+def _pusty_stan():
+    return {
+        'wersja': 0,
+        'stacje': [],
+        'nazwy': [],
+        'fragmenty': {},
+        'momenty': np.zeros((0, DNI_ROKU, len(ZMIENNE), 3)),
+        'histogram': np.zeros((0, DNI_ROKU, len(PRZEDZIALY) - 1), dtype='uint16'),
+    }
+
+
+TABLICE = ('momenty', 'histogram')
+
+
+# Stan sprzed kluczowania po id_stacji (bez nazw) jest liczony od nowa przy najbliższej aktualizacji
+def _wczytaj_stan(katalog, mmap=False):
+    return load_state(_katalog(katalog), _pusty_stan(), TABLICE, mmap=mmap)
+
+
+# Starsze fragmenty bez kolumn klucza dostają puste kolumny (data_pomiaru uzupełniana datą pobrania)
+SCHEMAT_ODCZYTU = pa.schema([('id_stacji', pa.int64()), ('stacja', pa.string()), ('data_pomiaru', pa.string()),
+                             ('data_pobrania', pa.string())] + [(zmienna, pa.float64()) for zmienna in ZMIENNE])
+
+
+def _czytaj_partie(sciezki):
+    df = read_fragments(sciezki, SCHEMAT_ODCZYTU)
+    df['data_pomiaru'] = df['data_pomiaru'].fillna(df['data_pobrania'])
+    df = df.dropna(subset=['stacja', 'data_pomiaru'])
+    return df.assign(id_stacji=station_ids(df))
+
+
+# Dodanie partii wierszy do sum i histogramów (bincount na spłaszczonym indeksie stacja × dzień roku).
+# Nazwa stacji w stanie to ostatnia widziana (partie czytane chronologicznie).
+def _dodaj(stan, df):
+    kody_stacji, stacje = pd.factorize(df['id_stacji'])
+    kody_dat, daty = pd.factorize(df['data_pomiaru'])
+    pozycje = {stacja: i for i, stacja in enumerate(stan['stacje'])}
+    nowe = [int(stacja) for stacja in stacje if stacja not in pozycje]
+    if nowe:
+        for stacja in nowe:
+            pozycje[stacja] = len(stan['stacje'])
+            stan['stacje'].append(stacja)
+            stan['nazwy'].append(None)
+        stan['momenty'] = np.concatenate(
+            [stan['momenty'], np.zeros((len(nowe),) + stan['momenty'].shape[1:])])
+        stan['histogram'] = np.concatenate(
+            [stan['histogram'], np.zeros((len(nowe),) + stan['histogram'].shape[1:], dtype='uint16')])
+
+    for stacja, nazwa in df.drop_duplicates('id_stacji', keep='last')[['id_stacji', 'stacja']].itertuples(index=False):
+        stan['nazwy'][pozycje[stacja]] = nazwa
+
+    liczba = len(stan['stacje']) * DNI_ROKU
+    wiersz_stacji = np.array([pozycje[stacja] for stacja in stacje], dtype='int64')[kody_stacji]
+    komorka = wiersz_stacji * DNI_ROKU + day_of_year(daty)[kody_dat]
+    momenty = stan['momenty'].reshape(liczba, len(ZMIENNE), 3)
+    for i, zmienna in enumerate(ZMIENNE):
+        wartosci = df[zmienna].to_numpy(dtype='float64')
+        jest = ~np.isnan(wartosci)
+        momenty[:, i, 0] += np.bincount(komorka[jest], minlength=liczba)
+        momenty[:, i, 1] += np.bincount(komorka[jest], weights=wartosci[jest], minlength=liczba)
+        momenty[:, i, 2] += np.bincount(komorka[jest], weights=wartosci[jest] ** 2, minlength=liczba)
+        if zmienna == ZMIENNA_PERCENTYLI:
+            liczba_przedzialow = len(PRZEDZIALY) - 1
+            przedzial = np.clip(np.searchsorted(PRZEDZIALY, wartosci[jest], side='right') - 1,
+                                0, liczba_przedzialow - 1)
+            histogram = stan['histogram'].reshape(liczba, liczba_przedzialow)
+            histogram += np.bincount(komorka[jest] * liczba_przedzialow + przedzial,
+                                     minlength=liczba * liczba_przedzialow).reshape(histogram.shape).astype('uint16')
+
+
+# Aktualizacja przyrostowa: przetwarzane są tylko fragmenty partycji, których stan jeszcze nie zna.
+# Zniknięcie znanego fragmentu (upsert z zastąpieniem, compact_log) wymusza przeliczenie od zera;
+# scalenie przetworzonych fragmentów przez compact_partition – tylko podmianę ich nazw w stanie.
+def update_climatology(katalog=KATALOG_LOGU, od_zera=False):
+    stan = _wczytaj_stan(katalog, mmap=od_zera)
+    if od_zera:
+        stan = dict(_pusty_stan(), wersja=stan['wersja'])
+
+    znane = stan['fragmenty']
+    do_przetworzenia, podmienione = pending_fragments(znane, katalog)
+    if do_przetworzenia is None:
+        return update_climatology(katalog, od_zera=True)
+
+    for poczatek in range(0, len(do_przetworzenia), PARTIA_FRAGMENTOW):
+        partia = do_przetworzenia[poczatek:poczatek + PARTIA_FRAGMENTOW]
+        _dodaj(stan, _czytaj_partie(fragment_paths(partia, katalog)))
+        for data, plik in partia:
+            znane.setdefault(data, []).append(plik)
+
+    if do_przetworzenia or podmienione or od_zera:
+        save_state(stan, _katalog(katalog), TABLICE)
+        with _blokada:
+            _pamiec.clear()
+    return len(do_przetworzenia)
+
+
+# Suma kołowa po dniach roku w oknie ±okno (grudzień sąsiaduje ze styczniem)
+def _okno(tablica, okno, os_dni=1):
+    wynik = np.zeros_like(tablica, dtype='float64')
+    for przesuniecie in range(-okno, okno + 1):
+        wynik += np.roll(tablica, przesuniecie, axis=os_dni)
+    return wynik
+
+
+# Normy wygładzone oknem, liczone raz na wersję stanu (stan.json zmienia się przy każdej aktualizacji)
+def _normy(katalog, okno):
+    opis = os.path.join(_katalog(katalog), "stan.json")
+    klucz = (os.path.abspath(katalog), okno, os.path.getmtime(opis) if os.path.exists(opis) else None)
+    with _blokada:
+        if klucz in _pamiec:
+            return _pamiec[klucz]
+    # Dodatkowy zerowy wiersz na końcu: indeks -1 oznacza stację bez historii (n = 0, norma NaN)
+    stan = _wczytaj_stan(katalog, mmap=True)
+    momenty = _okno(np.concatenate([stan['momenty'], np.zeros((1,) + stan['momenty'].shape[1:])]), okno)
+    histogram = np.concatenate([stan['histogram'], np.zeros((1,) + stan['histogram'].shape[1:], dtype='uint16')])
+    n, suma, suma_kw = momenty[..., 0], momenty[..., 1], momenty[..., 2]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        srednia = suma / n
+        odchylenie = np.sqrt(np.clip((suma_kw - suma * srednia) / (n - 1), 0, None))
+    wynik = {'stacje': {s: i for i, s in enumerate(stan['stacje'])}, 'nazwy': list(stan['nazwy']),
+             'po_nazwie': {nazwa: i for i, nazwa in enumerate(stan['nazwy'])},
+             'n': n, 'srednia': srednia, 'odchylenie': odchylenie, 'histogram': histogram}
+    with _blokada:
+        for stary in [k for k in _pamiec if k[:2] == klucz[:2]]:
+            del _pamiec[stary]
+        _pamiec[klucz] = wynik
+    return wynik
+
+
+# Wiersz stanu stacji: id_stacji (liczba) albo bieżąca nazwa; KeyError dla stacji bez historii
+def _pozycja(normy, stacja):
+    if isinstance(stacja, str) and not stacja.lstrip('-').isdigit():
+        return normy['po_nazwie'][stacja]
+    return normy['stacje'][int(stacja)]
+
+
+# Normy wszystkich stacji dla jednego dnia roku lub jednej stacji (id_stacji lub nazwa) dla całego roku
+def normals(stacja=None, data=None, zmienna='temperatura', okno=OKNO_DNI, katalog=KATALOG_LOGU):
+    normy = _normy(katalog, okno)
+    i = ZMIENNE.index(zmienna)
+    if stacja is not None:
+        s = _pozycja(normy, stacja)
+        return pd.DataFrame({'dzien_roku': np.arange(1, DNI_ROKU + 1), 'n': normy['n'][s, :, i],
+                             'norma': normy['srednia'][s, :, i], 'odchylenie': normy['odchylenie'][s, :, i]})
+    dzien = day_of_year([data if data is not None else pd.Timestamp.now()])[0]
+    return pd.DataFrame({'id_stacji': list(normy['stacje']), 'stacja': normy['nazwy'], 'n': normy['n'][:-1, dzien, i],
+                         'norma': normy['srednia'][:-1, dzien, i], 'odchylenie': normy['odchylenie'][:-1, dzien, i]})
+
+
+def _histogramy_okna(histogram, stacje, dni, okno):
+    dni_okna = (dni[:, None] + np.arange(-okno, okno + 1)[None, :]) % DNI_ROKU
+    return histogram[stacje[:, None], dni_okna].astype('float64').sum(axis=1)
+
+
+# Percentyl wartości w rozkładzie historycznym (interpolacja wewnątrz przedziału histogramu)
+def _percentyle(histogram, wartosci):
+    skumulowany = np.cumsum(histogram, axis=1)
+    razem = skumulowany[:, -1]
+    przedzial = np.clip(np.searchsorted(PRZEDZIALY, wartosci, side='right') - 1, 0, histogram.shape[1] - 1)
+    wiersze = np.arange(len(wartosci))
+    ponizej = np.where(przedzial > 0, skumulowany[wiersze, np.maximum(przedzial - 1, 0)], 0)
+    udzial = np.clip((wartosci - PRZEDZIALY[przedzial]) / np.diff(PRZEDZIALY)[przedzial], 0, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return 100 * (ponizej + udzial * histogram[wiersze, przedzial]) / razem
+
+
+# Percentyle p rozkładu wybranej stacji dla każdego dnia roku (np. pasmo 10–90 na wykresie)
+def station_percentiles(stacja, percentyle=(10, 50, 90), okno=OKNO_DNI, katalog=KATALOG_LOGU):
+    normy = _normy(katalog, okno)
+    s = _pozycja(normy, stacja)
+    dni = np.arange(DNI_ROKU)
+    histogram = _histogramy_okna(normy['histogram'], np.full(DNI_ROKU, s), dni, okno)
+    razem = histogram.sum(axis=1)
+    skumulowany = np.cumsum(histogram, axis=1)
+    wiersze = np.arange(DNI_ROKU)
+    wynik = pd.DataFrame({'dzien_roku': dni + 1})
+    for p in percentyle:
+        cel = razem * p / 100
+        przedzial = np.argmax(skumulowany >= cel[:, None], axis=1)
+        ponizej = skumulowany[wiersze, przedzial] - histogram[wiersze, przedzial]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            udzial = np.clip((cel - ponizej) / histogram[wiersze, przedzial], 0, 1)
+        wartosc = PRZEDZIALY[przedzial] + udzial * np.diff(PRZEDZIALY)[przedzial]
+        wynik[f"p{p}"] = np.where(razem > 0, wartosc, np.nan)
+    return wynik
+
+
+# Ocena bieżących odczytów względem normy własnej stacji: z-score dla każdej zmiennej,
+# percentyl temperatury i etykieta anomalii. Stacja po id_stacji (bez tej kolumny – po nazwie);
+# odczyty stacji bez historii dostają NaN.
+def flag_anomalies(df, data=None, okno=OKNO_DNI, prog_z=PROG_Z, percentyle=PERCENTYLE_ANOMALII,
+                   katalog=KATALOG_LOGU):
+    normy = _normy(katalog, okno)
+    wynik = df[['stacja']].copy()
+    wynik['stacja'] = wynik['stacja'].astype(str)
+    if 'id_stacji' in df.columns:
+        s = pd.Series(station_ids(df), index=df.index).map(normy['stacje'])
+    else:
+        s = wynik['stacja'].map(normy['po_nazwie'])
+    s = s.fillna(-1).to_numpy(dtype='int64')
+    # Dzień roku z daty pomiaru wiersza (brak daty – dzisiaj) albo jednej podanej daty
+    if data is None and 'data_pomiaru' in df.columns:
+        daty = pd.to_datetime(df['data_pomiaru']).fillna(pd.Timestamp.now().normalize())
+    else:
+        daty = pd.Series(pd.Timestamp(data if data is not None else pd.Timestamp.now()), index=df.index)
+    dni = day_of_year(daty)
+
+    for i, zmienna in enumerate(ZMIENNE):
+        if zmienna not in df.columns:
+            continue
+        wartosci = pd.to_numeric(df[zmienna], errors='coerce').to_numpy(dtype='float64')
+        n = normy['n'][s, dni, i]
+        norma = np.where(n >= MIN_POMIAROW, normy['srednia'][s, dni, i], np.nan)
+        odchylenie = np.where(n >= MIN_POMIAROW, normy['odchylenie'][s, dni, i], np.nan)
+        wynik[f"{zmienna}_norma"] = norma
+        with np.errstate(invalid='ignore', divide='ignore'):
+            wynik[f"{zmienna}_z"] = (wartosci - norma) / odchylenie
+
+    if ZMIENNA_PERCENTYLI in df.columns:
+        wartosci = pd.to_numeric(df[ZMIENNA_PERCENTYLI], errors='coerce').to_numpy(dtype='float64')
+        histogram = _histogramy_okna(normy['histogram'], s, dni, okno)
+        with np.errstate(invalid='ignore'):
+            percentyl = _percentyle(histogram, wartosci)
+        wynik[f"{ZMIENNA_PERCENTYLI}_percentyl"] = np.where(histogram.sum(axis=1) >= MIN_POMIAROW, percentyl, np.nan)
+
+        z = wynik[f"{ZMIENNA_PERCENTYLI}_z"]
+        p = wynik[f"{ZMIENNA_PERCENTYLI}_percentyl"]
+        wynik['anomalia'] = np.select([(z >= prog_z) | (p >= percentyle[1]), (z <= -prog_z) | (p <= percentyle[0])],
+                                      ['ciepło', 'zimno'], default='')
+    return wynik
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normy klimatyczne stacji z historii logu")
+    parser.add_argument("--od-zera", action="store_true", help="przelicz normy od początku historii")
+    parser.add_argument("--stacja", help="wypisz normy temperatury stacji dla każdego dnia roku")
+    argumenty = parser.parse_args()
+
+    print(f"Przetworzone fragmenty logu: {update_climatology(od_zera=argumenty.od_zera)}")
+    if argumenty.stacja:
+        print(normals(argumenty.stacja).merge(station_percentiles(argumenty.stacja)).to_string(index=False))
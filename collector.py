@@ -0,0 +1,358 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import signal
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from imgw_client import ADRES_API, LICZBA_PROB, OPOZNIENIE_PUBLIKACJI, fetch_json
+from instrumentation import stage
+from log_store import KATALOG_LOGU, PLIK_CSV, compact_partition, list_dates, partition_files
+
+# Długo działający kolektor: zamiast jednego pobrania dziennie z crona odpytuje API zgodnie z harmonogramem
+# publikacji IMGW (co godzinę) i zapisuje tylko wtedy, gdy przesunie się godzina_pomiaru.
+# Między cyklami pozostają ciepłe: sesja HTTP z pulą połączeń i walidatorami ETag (304 = bez parsowania),
+# zaimportowane moduły zapisu oraz ostatni zapisany czas pomiaru (cykl bez nowych danych nie dotyka dysku).
+# Po północy godzinowe fragmenty minionych dni są scalane (compact_partition), więc liczba plików
+# czytanych przez historię w aplikacji nie rośnie z każdą godziną pracy.
+
+# Gdy IMGW spóźnia się z publikacją – kolejna próba po tylu sekundach (najpóźniej przy następnej publikacji)
+PONOWIENIE_BEZ_NOWYCH = 300
+
+# Wycofanie po błędach: 30 s, 60 s, 120 s, ... do 15 minut, z losowym rozrzutem
+BAZA_WYCOFANIA = 30
+MAKS_WYCOFANIE = 900
+
+# Po ilu błędach z rzędu lub jak długim braku udanego zapisu stan zdrowia to "degraded"
+PROG_BLEDOW = 3
+MAKS_WIEK_DANYCH = timedelta(hours=2)
+
+PORT_ZDROWIA = int(os.environ.get("POGODA_COLLECTOR_PORT", 8766))
+
+
+class SystemClock:
+    def now(self):
+        return datetime.now()
+
+    async def sleep(self, sekundy):
+        await asyncio.sleep(sekundy)
+
+
+# Zegar symulowany: sleep przesuwa czas natychmiast i powiadamia obserwatorów (np. publikację w fake_imgw)
+class SimulatedClock:
+    def __init__(self, start):
+        self.teraz = start
+        self.obserwatorzy = []
+
+    def now(self):
+        return self.teraz
+
+    async def sleep(self, sekundy):
+        self.teraz += timedelta(seconds=sekundy)
+        for obserwator in self.obserwatorzy:
+            obserwator(self.teraz)
+        await asyncio.sleep(0)
+
+
+# Ostatnia publikacja IMGW nie późniejsza niż `teraz` i następna po niej
+def publication_window(teraz, opoznienie=OPOZNIENIE_PUBLIKACJI):
+    poczatek = (teraz - opoznienie).replace(minute=0, second=0, microsecond=0) + opoznienie
+    return poczatek, poczatek + timedelta(hours=1)
+
+
+# Najnowszy czas pomiaru w odpowiedzi API – bez budowania DataFrame
+def latest_measurement(dane):
+    czasy = [datetime.strptime(rekord['data_pomiaru'], '%Y-%m-%d') + timedelta(hours=int(rekord['godzina_pomiaru']))
+             for rekord in dane if rekord.get('data_pomiaru') and rekord.get('godzina_pomiaru') not in (None, '')]
+    return max(czasy) if czasy else None
+
+
+class Collector:
+    # plik_csv – stary log przenoszony do magazynu przy starcie (None: bez migracji, np. w symulacji);
+    # proby_http – próby klienta HTTP w jednym cyklu (jego ponowienia śpią w czasie rzeczywistym)
+    def __init__(self, url=ADRES_API, katalog=KATALOG_LOGU, zegar=None, port=PORT_ZDROWIA, host="127.0.0.1",
+                 plik_csv=PLIK_CSV, proby_http=LICZBA_PROB):
+        self.url = url
+        self.proby_http = proby_http
+        self.katalog = katalog
+        self.plik_csv = plik_csv
+        self.zegar = zegar or SystemClock()
+        self.port = port
+        self.host = host
+        self.serwer = None
+        self.ostatni_pomiar = None
+        self.ostatni_sukces = None
+        self.ostatni_przyrost = None
+        self.dzien_zapisu = None
+        self.nastepne_odpytanie = None
+        self.bledy_z_rzedu = 0
+        self.ostatni_blad = None
+        self.uruchomiono = self.zegar.now()
+        self.liczniki = {'cykle': 0, 'pobrania': 0, 'zapisy': 0, 'zapisane_wiersze': 0,
+                         'bez_nowych': 0, 'bledy': 0, 'bledy_klimatologii': 0, 'bledy_prognozy': 0,
+                         'kompakcje': 0, 'bledy_kompakcji': 0, 'czas_cyklu_s': 0.0}
+
+        # Moduły zapisu (pandas, pyarrow) ładowane raz przy starcie, nie w pierwszym cyklu
+        from aggregates import prepare_store
+        from climatology import update_climatology
+        from data_logger import przygotuj_dane, zapisz_pobranie
+        from forecast import update_forecast_model
+        self._przygotuj_magazyn = prepare_store
+        self._przygotuj = przygotuj_dane
+        self._zapisz = zapisz_pobranie
+        self._aktualizuj_klimatologie = update_climatology
+        self._aktualizuj_prognoze = update_forecast_model
+
+    # Jeden cykl: pobranie, zapis tylko przy nowej godzinie pomiaru; zwraca liczbę sekund do kolejnego cyklu
+    async def cycle(self):
+        self.liczniki['cykle'] += 1
+        start = time.perf_counter()
+        try:
+            with stage("collector.cycle"):
+                dane = await asyncio.to_thread(fetch_json, self.url, proby=self.proby_http)
+                self.liczniki['pobrania'] += 1
+                pomiar = latest_measurement(dane)
+                if pomiar is not None and (self.ostatni_pomiar is None or pomiar > self.ostatni_pomiar):
+                    df = self._przygotuj(dane, self.zegar.now())
+                    zapisane = await asyncio.to_thread(self._zapisz, df, self.katalog)
+                    self.liczniki['zapisy'] += 1
+                    self.liczniki['zapisane_wiersze'] += zapisane
+                    self.ostatni_pomiar = pomiar
+                    self.ostatni_przyrost = self.zegar.now()
+                    if zapisane:
+                        await self._aktualizuj_modele()
+                    await self._kompaktuj(df['data_pobrania'].iloc[0])
+                else:
+                    self.liczniki['bez_nowych'] += 1
+        except Exception as blad:
+            self.liczniki['bledy'] += 1
+            self.bledy_z_rzedu += 1
+            self.ostatni_blad = f"{type(blad).__name__}: {blad}"
+            opoznienie = min(MAKS_WYCOFANIE, BAZA_WYCOFANIA * 2 ** (self.bledy_z_rzedu - 1))
+            return opoznienie / 2 + random.uniform(0, opoznienie / 2)
+        finally:
+            self.liczniki['czas_cyklu_s'] = round(time.perf_counter() - start, 6)
+
+        self.bledy_z_rzedu = 0
+        self.ostatni_sukces = self.zegar.now()
+        teraz = self.zegar.now()
+        poczatek, nastepna = publication_window(teraz)
+        do_publikacji = (nastepna - teraz).total_seconds()
+        # Bieżąca publikacja już zapisana – czekamy na następną; inaczej IMGW się spóźnia i pytamy częściej
+        if self.ostatni_przyrost is not None and self.ostatni_przyrost >= poczatek:
+            return do_publikacji
+        return min(PONOWIENIE_BEZ_NOWYCH, do_publikacji)
+
+    # Nowa godzina w logu dopisywana do norm klimatycznych (flagi anomalii) i modelu prognozy;
+    # błąd któregoś z nich nie przerywa zbierania danych
+    async def _aktualizuj_modele(self):
+        for nazwa, licznik, aktualizuj in (("klimatologia", 'bledy_klimatologii', self._aktualizuj_klimatologie),
+                                           ("prognoza", 'bledy_prognozy', self._aktualizuj_prognoze)):
+            try:
+                await asyncio.to_thread(aktualizuj, self.katalog)
+            except Exception as blad:
+                self.liczniki[licznik] += 1
+                self.ostatni_blad = f"{nazwa}: {type(blad).__name__}: {blad}"
+
+    # Pierwszy zapis nowego dnia (i pierwszy po starcie) scala fragmenty wcześniejszych dni. Modele są już
+    # zaktualizowane, więc podmieniają scalone fragmenty bez liczenia od zera; błąd nie przerywa zbierania.
+    async def _kompaktuj(self, dzien):
+        if dzien == self.dzien_zapisu:
+            return
+        self.dzien_zapisu = dzien
+        try:
+            self.liczniki['kompakcje'] += await asyncio.to_thread(self._kompaktuj_przed, dzien)
+        except Exception as blad:
+            self.liczniki['bledy_kompakcji'] += 1
+            self.ostatni_blad = f"kompakcja: {type(blad).__name__}: {blad}"
+
+    def _kompaktuj_przed(self, dzien):
+        scalone = 0
+        for data in list_dates(katalog=self.katalog):
+            if data < dzien and len(partition_files(data, self.katalog)) > 1:
+                compact_partition(data, self.katalog)
+                scalone += 1
+        return scalone
+
+    # Pętla główna; `do` (czas zegara) kończy pracę – używane w symulacji.
+    # Najpierw jednorazowa migracja starego CSV z agregatami – pierwszy zapis tworzy katalog logu,
+    # a read_log nie migruje, więc bez tego historia z CSV nigdy nie trafiłaby do magazynu.
+    async def run(self, do=None):
+        if self.plik_csv:
+            await asyncio.to_thread(self._przygotuj_magazyn, self.plik_csv, self.katalog)
+        while do is None or self.zegar.now() < do:
+            opoznienie = await self.cycle()
+            self.nastepne_odpytanie = self.zegar.now() + timedelta(seconds=opoznienie)
+            if do is not None:
+                opoznienie = min(opoznienie, max((do - self.zegar.now()).total_seconds(), 0))
+            await self.zegar.sleep(opoznienie)
+
+    def health(self):
+        teraz = self.zegar.now()
+        zdrowy = (self.bledy_z_rzedu < PROG_BLEDOW and self.ostatni_sukces is not None
+                  and teraz - self.ostatni_sukces <= MAKS_WIEK_DANYCH)
+        return {
+            'status': 'ok' if zdrowy else 'degraded',
+            'teraz': teraz,
+            'uruchomiono': self.uruchomiono,
+            'ostatni_sukces': self.ostatni_sukces,
+            'ostatni_pomiar': self.ostatni_pomiar,
+            'nastepne_odpytanie': self.nastepne_odpytanie,
+            'bledy_z_rzedu': self.bledy_z_rzedu,
+            'ostatni_blad': self.ostatni_blad,
+        }
+
+    # Liczniki w formacie tekstowym Prometheusa
+    def metrics(self):
+        linie = [f"pogoda_collector_{nazwa} {wartosc}" for nazwa, wartosc in self.liczniki.items()]
+        linie.append(f"pogoda_collector_bledy_z_rzedu {self.bledy_z_rzedu}")
+        if self.ostatni_pomiar is not None:
+            linie.append(f"pogoda_collector_ostatni_pomiar_timestamp {self.ostatni_pomiar.timestamp():.0f}")
+        return "\n".join(linie) + "\n"
+
+    async def _obsluz(self, czytnik, pisarz):
+        try:
+            zadanie = (await czytnik.readline()).decode('latin-1').split()
+            while (await czytnik.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            sciezka = zadanie[1] if len(zadanie) > 1 else "/"
+            if sciezka == "/health":
+                zdrowie = self.health()
+                kod = "200 OK" if zdrowie['status'] == 'ok' else "503 Service Unavailable"
+                cialo = json.dumps(zdrowie, default=str, ensure_ascii=False).encode('utf-8')
+                typ = "application/json; charset=utf-8"
+            elif sciezka == "/metrics":
+                kod, cialo, typ = "200 OK", self.metrics().encode('utf-8'), "text/plain; version=0.0.4"
+            else:
+                kod, cialo, typ = "404 Not Found", b"", "text/plain"
+            pisarz.write(f"HTTP/1.1 {kod}\r\nContent-Type: {typ}\r\nContent-Length: {len(cialo)}\r\n"
+                         f"Connection: close\r\n\r\n".encode('latin-1') + cialo)
+            await pisarz.drain()
+        finally:
+            pisarz.close()
+
+    async def start_health_server(self):
+        if self.port is not None and self.serwer is None:
+            self.serwer = await asyncio.start_server(self._obsluz, self.host, self.port)
+            self.port = self.serwer.sockets[0].getsockname()[1]
+
+    async def stop_health_server(self):
+        if self.serwer is not None:
+            self.serwer.close()
+            await self.serwer.wait_closed()
+            self.serwer = None
+
+
+async def _pobierz_lokalnie(port, sciezka):
+    czytnik, pisarz = await asyncio.open_connection("127.0.0.1", port)
+    pisarz.write(f"GET {sciezka} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode('latin-1'))
+    await pisarz.drain()
+    odpowiedz = await czytnik.read()
+    pisarz.close()
+    naglowki, _, cialo = odpowiedz.partition(b"\r\n\r\n")
+    return int(naglowki.split()[1]), cialo.decode('utf-8')
+
+
+# Test end-to-end: fake_imgw publikuje nową godzinę zgodnie z zegarem symulowanym,
+# kolektor działa przez `godziny` godzin symulowanych w tymczasowym katalogu logu.
+# Klient HTTP bez własnych ponowień – wstrzyknięte 503 trafiają do wycofania kolektora na zegarze symulowanym.
+def simulate(godziny=24, bledy=0.0, start=datetime(2025, 5, 20, 0, 0)):
+    import fake_imgw
+    import imgw_client
+    from log_store import read_log
+
+    imgw_client.reset_client()
+    rekordy = fake_imgw._wczytaj_dane()
+    zegar = SimulatedClock(start)
+    katalog = tempfile.mkdtemp(prefix="collector_sim_")
+    opublikowane = []
+
+    with fake_imgw.FakeIMGW(rekordy, bledy=bledy) as serwer:
+        def publikuj(teraz):
+            pomiar = (teraz - OPOZNIENIE_PUBLIKACJI).replace(minute=0, second=0, microsecond=0)
+            if opublikowane and opublikowane[-1] == pomiar:
+                return
+            opublikowane.append(pomiar)
+            serwer.ustaw_dane([dict(rekord, data_pomiaru=pomiar.strftime('%Y-%m-%d'), godzina_pomiaru=str(pomiar.hour))
+                               for rekord in rekordy])
+
+        publikuj(zegar.now())
+        zegar.obserwatorzy.append(publikuj)
+        kolektor = Collector(url=serwer.url, katalog=katalog, zegar=zegar, port=0, plik_csv=None, proby_http=1)
+
+        async def przebieg():
+            await kolektor.start_health_server()
+            try:
+                await kolektor.run(do=start + timedelta(hours=godziny))
+                return (await _pobierz_lokalnie(kolektor.port, "/health"),
+                        await _pobierz_lokalnie(kolektor.port, "/metrics"))
+            finally:
+                await kolektor.stop_health_server()
+
+        (kod_zdrowia, zdrowie), (_, metryki) = asyncio.run(przebieg())
+        odpowiedzi = dict(serwer.liczniki)
+
+    try:
+        log = read_log(katalog=katalog)
+        powtorzenia = int(log.duplicated(['id_stacji', 'data_pomiaru', 'godzina_pomiaru']).sum())
+        wiersze = len(log)
+    finally:
+        shutil.rmtree(katalog, ignore_errors=True)
+
+    return {
+        'godziny': godziny,
+        'opublikowane_godziny': len(opublikowane),
+        'wiersze_w_logu': wiersze,
+        'oczekiwane_wiersze': len(opublikowane) * len(rekordy),
+        'powtorzenia': powtorzenia,
+        'liczniki': kolektor.liczniki,
+        'odpowiedzi_serwera': odpowiedzi,
+        'health': (kod_zdrowia, json.loads(zdrowie)),
+        'metrics': metryki,
+    }
+
+
+def main(argumenty):
+    kolektor = Collector(url=argumenty.url or ADRES_API,
+                         port=PORT_ZDROWIA if argumenty.port is None else argumenty.port)
+
+    async def przebieg():
+        zadanie = asyncio.current_task()
+        petla = asyncio.get_running_loop()
+        for sygnal in (signal.SIGINT, signal.SIGTERM):
+            try:
+                petla.add_signal_handler(sygnal, zadanie.cancel)
+            except (NotImplementedError, RuntimeError):
+                pass
+        await kolektor.start_health_server()
+        print(f"Kolektor: {kolektor.url} → {kolektor.katalog}, zdrowie: http://{kolektor.host}:{kolektor.port}/health")
+        try:
+            await kolektor.run()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await kolektor.stop_health_server()
+
+    asyncio.run(przebieg())
+
+
+def _parser():
+    parser = argparse.ArgumentParser(description="Kolektor danych synop IMGW (asyncio)")
+    parser.add_argument("--url", default=ADRES_API)
+    parser.add_argument("--port", type=int, default=PORT_ZDROWIA, help="port endpointu /health i /metrics")
+    parser.add_argument("--symulacja", type=int, metavar="GODZINY",
+                        help="test end-to-end z fake_imgw i zegarem symulowanym")
+    parser.add_argument("--bledy", type=float, default=0.0, help="w symulacji: odsetek odpowiedzi 503 (0-1)")
+    return parser
+
+
+if __name__ == "__main__":
+    argumenty = _parser().parse_args()
+    if argumenty.symulacja:
+        print(json.dumps(simulate(argumenty.symulacja, argumenty.bledy), indent=2, default=str, ensure_ascii=False))
+    else:
+        main(argumenty)
@@ -0,0 +1,105 @@
+import threading
+
+from aggregates import station_summary
+from climatology import flag_anomalies
+from data_processing import calculate_derived_metrics, clean_and_merge_data, merge_with_locations
+from instrumentation import stage
+
+# Wszystko, co na pulpicie nie zależy od wybranej stacji ani widżetów, liczone raz na odświeżenie danych
+# i współdzielone przez wszystkie sesje Streamlit w procesie. Przeliczenie strony tylko wycina fragmenty.
+# Migawka jest tylko do odczytu – sesje nie modyfikują jej ramek (nowe kolumny liczy się przy budowie).
+
+# Próg anomalii względem średniej krajowej (°C)
+PROG_ANOMALII = 5
+
+# Rankingi stacji (malejąco) i ekstrema: kolumna → (najwyższa, najniższa) etykieta
+KOLUMNY_RANKINGU = ['temperatura', 'wilgotnosc_wzgledna', 'heat_index', 'cisnienie']
+KOLUMNY_EKSTREMOW = ['temperatura', 'wilgotnosc_wzgledna', 'predkosc_wiatru']
+PARAMETRY_KORELACJI = ['temperatura', 'wilgotnosc_wzgledna', 'cisnienie', 'heat_index', 'predkosc_wiatru', 'suma_opadu']
+
+_blokada = threading.Lock()
+_stan = {'zrodlo': None, 'pobrano': None, 'migawka': None}
+_liczniki = {'zbudowane': 0, 'trafienia': 0}
+
+
+class DashboardSnapshot:
+    def __init__(self, df_surowe, pobrano=None):
+        with stage("dashboard.build_snapshot", len(df_surowe)):
+            df = calculate_derived_metrics(merge_with_locations(clean_and_merge_data(df_surowe)))
+            df['stacja'] = df['stacja'].astype(str)
+            srednia = df['temperatura'].mean()
+            df['odchylenie_temp'] = df['temperatura'] - srednia
+            df['roznica_heat_temp'] = df['heat_index'] - df['temperatura']
+
+            self.pobrano = pobrano
+            self.dane = df
+            self.stacje = df['stacja'].unique().tolist()
+            self.po_stacji = df.set_index('stacja', drop=False)
+            self.srednia = srednia
+            self.odchylenie = df['temperatura'].std()
+            self.gorace = df.loc[df['temperatura'] > srednia + PROG_ANOMALII, ['stacja', 'temperatura']]
+            self.zimne = df.loc[df['temperatura'] < srednia - PROG_ANOMALII, ['stacja', 'temperatura']]
+
+            self.ekstrema = {}
+            for kolumna in KOLUMNY_EKSTREMOW:
+                if kolumna in df.columns and df[kolumna].notna().any():
+                    self.ekstrema[kolumna] = (df.loc[df[kolumna].idxmax()], df.loc[df[kolumna].idxmin()])
+
+            self.rankingi = {kolumna: df.sort_values(by=kolumna, ascending=False)[['stacja', kolumna]]
+                             for kolumna in KOLUMNY_RANKINGU}
+            self.korelacja = df[[k for k in PARAMETRY_KORELACJI if k in df.columns]].corr()
+
+            grupy = df.groupby('stacja', sort=True)
+            self.srednia_heat_index = grupy['heat_index'].mean().reset_index()
+            self.roznica_heat_temp = grupy['roznica_heat_temp'].mean().reset_index()
+            self.max_wiatr = (grupy['predkosc_wiatru'].max().reset_index()
+                              if 'predkosc_wiatru' in df.columns else None)
+            self.suma_opadow = grupy['suma_opadu'].sum().reset_index() if 'suma_opadu' in df.columns else None
+
+            # Średnie historyczne stacji z agregatów przyrostowych
+            try:
+                self.historia_stacji = station_summary().set_index('stacja')
+            except (KeyError, OSError):
+                self.historia_stacji = None
+
+            # Odczyty względem normy własnej stacji dla tego dnia roku (pusty stan klimatologii – same NaN)
+            try:
+                self.anomalie_klimatyczne = flag_anomalies(df).assign(temperatura=df['temperatura'])
+            except (OSError, ValueError):
+                self.anomalie_klimatyczne = None
+
+        # Obiekty pochodne (wykresy, pola IDW) liczone przy pierwszym użyciu, też raz na migawkę
+        self._pochodne = {}
+        self._blokada = threading.Lock()
+
+    def station(self, stacja):
+        return self.po_stacji.loc[stacja]
+
+    def stations(self, stacje):
+        return self.po_stacji.loc[list(stacje)]
+
+    # Wartość pochodna liczona raz na migawkę, np. memo(("mapa", zmienna), lambda: ...)
+    def memo(self, klucz, funkcja):
+        with self._blokada:
+            if klucz in self._pochodne:
+                return self._pochodne[klucz]
+        wynik = funkcja()
+        with self._blokada:
+            return self._pochodne.setdefault(klucz, wynik)
+
+
+# Migawka dla bieżących danych; budowana raz na odświeżenie (kolejne sesje czekają na tę samą budowę)
+def dashboard_snapshot(df_surowe, pobrano=None):
+    with _blokada:
+        if _stan['zrodlo'] is df_surowe and _stan['pobrano'] == pobrano:
+            _liczniki['trafienia'] += 1
+            return _stan['migawka']
+        migawka = DashboardSnapshot(df_surowe, pobrano)
+        _stan.update({'zrodlo': df_surowe, 'pobrano': pobrano, 'migawka': migawka})
+        _liczniki['zbudowane'] += 1
+        return migawka
+
+
+def snapshot_stats():
+    with _blokada:
+        return dict(_liczniki)
@@ -1,11 +1,16 @@
-import requests
 import pandas as pd
 
-def fetch_weather_data():
-    url = "https://danepubliczne.imgw.pl/api/data/synop"
-    response = requests.get(url)
-    response.raise_for_status()
-    return pd.DataFrame(response.json())
+from imgw_client import ADRES_API, fetch_json
+from instrumentation import instrumented
+from schema import apply_schema
+
+@instrumented("data_loader.fetch_weather_data")
+def fetch_weather_data(url=ADRES_API):
+    return pd.DataFrame(fetch_json(url))
 
 def save_to_csv(df, filename="weather_data.csv"):
     df.to_csv(filename, index=False)
+
+@instrumented("data_loader.load_from_csv")
+def load_from_csv(filename="weather_data.csv"):
+    return apply_schema(pd.read_csv(filename, dtype=str))
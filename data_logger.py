@@ -1,34 +1,51 @@
 import pandas as pd
-import requests
 from datetime import datetime
 import os
 
-# Adres API
-ADRES_API = "https://danepubliczne.imgw.pl/api/data/synop"
+from imgw_client import ADRES_API, fetch_json
+from aggregates import prepare_store, refresh_aggregates, update_aggregates
+from instrumentation import instrumented, stage
+from log_store import KATALOG_LOGU, upsert_snapshot
 
-# Ścieżka do pliku logu
+# Ścieżka do starego pliku logu (migrowany jednorazowo do log_store)
 PLIK_LOGU = os.path.join(os.path.dirname(__file__), "weather_log.csv")
 
+# Kolumny zapisywane w logu
+KOLUMNY = ['stacja', 'temperatura', 'wilgotnosc_wzgledna', 'cisnienie', 'data_pobrania', 'suma_opadu',
+           'id_stacji', 'data_pomiaru', 'godzina_pomiaru']
+
+# Rekordy z API jako wiersze logu z datą pobrania
+def przygotuj_dane(dane, pobrano=None):
+    df = pd.DataFrame(dane)
+    df['data_pobrania'] = (pobrano or datetime.now()).strftime('%Y-%m-%d')
+    return df[KOLUMNY]
+
 # Funkcja do pobierania danych pogodowych
+@instrumented("data_logger.pobierz_dane_pogodowe")
 def pobierz_dane_pogodowe():
-    odpowiedz = requests.get(ADRES_API)
-    dane = odpowiedz.json()
-    df = pd.DataFrame(dane)
-    df['data_pobrania'] = datetime.now().strftime('%Y-%m-%d')
-    return df[['stacja', 'temperatura', 'wilgotnosc_wzgledna', 'cisnienie', 'data_pobrania']]
+    return przygotuj_dane(fetch_json(ADRES_API))
+
+# Zapis kluczowany (stacja, data i godzina pomiaru) – ponowne uruchomienie nie dubluje stacji.
+# Zwraca liczbę nowych lub zmienionych wierszy.
+def zapisz_pobranie(nowe_dane, katalog=KATALOG_LOGU):
+    with stage("data_logger.upsert_snapshot", len(nowe_dane)):
+        zapisane, przepisane = upsert_snapshot(nowe_dane, katalog)
+    with stage("data_logger.update_aggregates", len(zapisane)):
+        if przepisane:
+            refresh_aggregates(przepisane + zapisane['data_pobrania'].unique().tolist(), katalog)
+        elif not zapisane.empty:
+            update_aggregates(zapisane, katalog)
+    return len(zapisane)
 
 # Funkcja do zapisywania dziennych danych pogodowych
 def zapisz_dzienne_dane():
     nowe_dane = pobierz_dane_pogodowe()
 
-    if os.path.exists(PLIK_LOGU):
-        df_stare = pd.read_csv(PLIK_LOGU)
-        df_polaczone = pd.concat([df_stare, nowe_dane], ignore_index=True)
-    else:
-        df_polaczone = nowe_dane
-
-    df_polaczone.to_csv(PLIK_LOGU, index=False, encoding='utf-8-sig')
-    print("Dane zapisane:", datetime.now())
+    # Historia z CSV trafia do magazynu tylko raz, kolejne pobrania są dopisywane
+    prepare_store(PLIK_LOGU)
+    zapisane = zapisz_pobranie(nowe_dane)
+    print(f"Dane zapisane: {datetime.now()} (nowe lub zmienione: {zapisane}, "
+          f"pominięte powtórzenia: {len(nowe_dane) - zapisane})")
 
 # Uruchamianie zapisu przy bezpośrednim wykonaniu pliku
 if __name__ == "__main__":
@@ -1,62 +1,116 @@
+import numpy as np
 import pandas as pd
 
+from instrumentation import instrumented
+from schema import apply_schema
+from stations import PLIK_STACJI, station_registry
+
+@instrumented("data_processing.clean_and_merge_data")
 def clean_and_merge_data(df):
-    # Wybór istotnych kolumn
-    df = df[['stacja', 'temperatura', 'wilgotnosc_wzgledna', 'cisnienie',
-             'predkosc_wiatru', 'kierunek_wiatru', 'suma_opadu']]
-    
-    # Konwersja typów danych
-    df['temperatura'] = pd.to_numeric(df['temperatura'], errors='coerce')
-    df['wilgotnosc_wzgledna'] = pd.to_numeric(df['wilgotnosc_wzgledna'], errors='coerce')
-    df['cisnienie'] = pd.to_numeric(df['cisnienie'], errors='coerce')
-    df['predkosc_wiatru'] = pd.to_numeric(df['predkosc_wiatru'], errors='coerce')
-    df['kierunek_wiatru'] = pd.to_numeric(df['kierunek_wiatru'], errors='coerce')
-    df['suma_opadu'] = pd.to_numeric(df['suma_opadu'], errors='coerce')
+    # Wybór istotnych kolumn i konwersja typów w jednym przebiegu (float32, stacja jako kategoria)
+    kolumny = ['id_stacji', 'stacja', 'temperatura', 'wilgotnosc_wzgledna', 'cisnienie',
+               'predkosc_wiatru', 'kierunek_wiatru', 'suma_opadu']
+    if 'id_stacji' not in df.columns:
+        kolumny.remove('id_stacji')
+    df = apply_schema(df, kolumny=kolumny)
 
     # Usunięcie braków danych
-    df.dropna(inplace=True)
+    df = df.dropna()
     
     # Grupowanie – średnia dla każdej stacji
-    df_grouped = df.groupby('stacja').mean(numeric_only=True).reset_index()
+    klucze = [k for k in ('id_stacji', 'stacja') if k in df.columns]
+    df_grouped = df.groupby(klucze, observed=True).mean(numeric_only=True).reset_index()
+
+    # Wynik (jeden wiersz na stację) trafia do interfejsu – z powrotem float64 przez zapis dziesiętny,
+    # żeby 25.3 nie wyświetlało się jako 25.299999237060547
+    for kolumna in df_grouped.columns:
+        if df_grouped[kolumna].dtype == 'float32':
+            df_grouped[kolumna] = df_grouped[kolumna].astype(str).astype('float64')
     
     return df_grouped
 
 
 
-def merge_with_locations(df_weather, location_file="stations_coordinates.csv"):
-    df_locations = pd.read_csv(location_file)
-    return df_weather.merge(df_locations, on="stacja", how="left")
+# Współrzędne z rejestru stacji (wczytywanego raz); łączymy po id_stacji, a gdy go brak – po nazwie
+@instrumented("data_processing.merge_with_locations")
+def merge_with_locations(df_weather, location_file=PLIK_STACJI):
+    df_locations = station_registry(location_file).frame()
+    if 'id_stacji' in df_weather.columns:
+        return df_weather.merge(df_locations.drop(columns='stacja'), on="id_stacji", how="left")
+    return df_weather.merge(df_locations.drop(columns='id_stacji'), on="stacja", how="left")
 
+def _kolumna_liczbowa(df, kolumna, domyslna=np.nan):
+    if kolumna not in df.columns:
+        return np.full(len(df), domyslna, dtype='float64')
+    return pd.to_numeric(df[kolumna], errors='coerce').to_numpy(dtype='float64')
+
+@instrumented("data_processing.calculate_heat_index")
 def calculate_heat_index(df):
-    T = df['temperatura']
-    RH = df['wilgotnosc_wzgledna']
-    V = pd.to_numeric(df.get('predkosc_wiatru', 0), errors='coerce') * 3.6  # m/s → km/h
-
-    # Heat Index dla T > 20°C
-    T_F = (T * 9/5) + 32
-    HI_F = (
-        -42.379 + 2.04901523 * T_F + 10.14333127 * RH
-        - 0.22475541 * T_F * RH - 6.83783e-3 * T_F**2
-        - 5.481717e-2 * RH**2 + 1.22874e-3 * T_F**2 * RH
-        + 8.5282e-4 * T_F * RH**2 - 1.99e-6 * T_F**2 * RH**2
-    )
-    HI_C = (HI_F - 32) * 5/9
+    T = _kolumna_liczbowa(df, 'temperatura')
+    RH = _kolumna_liczbowa(df, 'wilgotnosc_wzgledna')
+    V = _kolumna_liczbowa(df, 'predkosc_wiatru', 0.0) * 3.6  # m/s → km/h
+
+    heat_index = T.copy()  # domyślnie
+
+    # Heat Index dla T > 20°C – wielomian liczony tylko dla tych wierszy (schemat Hornera względem T_F)
+    maska = T > 20
+    if maska.any():
+        T_F = T[maska] * 1.8 + 32
+        rh = RH[maska]
+        a0 = -42.379 + rh * (10.14333127 - 5.481717e-2 * rh)
+        a1 = 2.04901523 + rh * (-0.22475541 + 8.5282e-4 * rh)
+        a2 = -6.83783e-3 + rh * (1.22874e-3 - 1.99e-6 * rh)
+        HI_F = a0 + T_F * (a1 + T_F * a2)
+        heat_index[maska] = (HI_F - 32) * (5 / 9)
 
     # Wind Chill dla T <= 10°C i V >= 4.8 km/h (czyli ~1.3 m/s)
-    wind_chill = 13.12 + 0.6215 * T - 11.37 * V**0.16 + 0.3965 * T * V**0.16
+    maska = (T <= 10) & (V >= 4.8)
+    if maska.any():
+        t = T[maska]
+        v = V[maska] ** 0.16
+        heat_index[maska] = 13.12 + 0.6215 * t + v * (0.3965 * t - 11.37)
 
-    df['heat_index'] = T  # domyślnie
-
-    df.loc[T > 20, 'heat_index'] = HI_C
-    df.loc[(T <= 10) & (V >= 4.8), 'heat_index'] = wind_chill
-
-    df['heat_index'] = df['heat_index'].round(1)
+    df['heat_index'] = np.round(heat_index, 1)
     return df
 
+# Kategorie pogody (kolejność warunków jak w dawnym interpretuj_pogode z app.py)
+OPISY_POGODY = ["❄️ Śnieg", "🌧️ Deszcz", "☁️ Pochmurno", "☀️ Słonecznie", "🌤️ Częściowe zachmurzenie"]
 
+def classify_weather(df):
+    opad = _kolumna_liczbowa(df, 'suma_opadu', 0.0)
+    temp = _kolumna_liczbowa(df, 'temperatura')
+    wilg = _kolumna_liczbowa(df, 'wilgotnosc_wzgledna')
 
-
-
-
-
-
+    kody = np.select(
+        [(opad > 0) & (temp < 0), opad > 2.5, wilg > 85, wilg < 60],
+        [0, 1, 2, 3],
+        default=4,
+    )
+    return pd.Categorical.from_codes(kody, categories=OPISY_POGODY)
+
+KIERUNKI_8 = ["N", "NE", "E", "SE", "S", "SW", "W", "NW"]
+KIERUNKI_16 = ["N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE",
+               "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW"]
+
+# Kierunek wiatru z kąta w stopniach (8 lub 16 rumbów); brak danych → NaN
+def wind_direction_labels(stopnie, punkty=8):
+    kierunki = KIERUNKI_8 if punkty == 8 else KIERUNKI_16
+    stopnie = pd.to_numeric(pd.Series(stopnie), errors='coerce').to_numpy(dtype='float64')
+    kody = np.full(len(stopnie), -1, dtype='int8')
+    maska = ~np.isnan(stopnie)
+    kody[maska] = np.rint(stopnie[maska] / (360 / punkty)).astype('int64') % punkty
+    return pd.Categorical.from_codes(kody, categories=kierunki)
+
+# Wszystkie kolumny pochodne naraz – działa tak samo dla bieżącego odczytu i całej historii
+@instrumented("data_processing.calculate_derived_metrics")
+def calculate_derived_metrics(df):
+    df = calculate_heat_index(df)
+    df['opis_pogody'] = classify_weather(df)
+    if 'kierunek_wiatru' in df.columns:
+        df['kierunek_wiatru_8'] = wind_direction_labels(df['kierunek_wiatru'], 8)
+        df['kierunek_wiatru_16'] = wind_direction_labels(df['kierunek_wiatru'], 16)
+    if 'suma_opadu' in df.columns:
+        opady = _kolumna_liczbowa(df, 'suma_opadu') > 0
+        df['opady'] = opady
+        df['opady_obecne'] = pd.Categorical.from_codes(opady.astype('int8'), categories=["Bez opadów", "Opady"])
+    return df
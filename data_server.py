@@ -0,0 +1,398 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+import pyarrow as pa
+
+from log_store import KATALOG_LOGU, list_dates, partition_files, read_log
+
+# Samodzielne lokalne API odczytu dla konsumentów spoza tego procesu (skrypty, notebooki, inne usługi;
+# app.py i main.py czytają dane bezpośrednio): przetworzona migawka i zakresy historii jako strumień
+# Arrow IPC (klient Pythona czyta bufor bez kopiowania) albo JSON gzip.
+# Każda odpowiedź ma ETag – N konsumentów to jedno pobranie z IMGW i jedno przetworzenie, nie N.
+
+PORT_DANYCH = int(os.environ.get("POGODA_DATA_PORT", 8767))
+
+TYP_ARROW = "application/vnd.apache.arrow.stream"
+TYP_JSON = "application/json; charset=utf-8"
+
+# Historia bez podanego zakresu: ostatnie tyle dni
+DOMYSLNE_DNI_HISTORII = 7
+
+# Ile zakodowanych odpowiedzi trzymamy w pamięci (migawki i zakresy historii)
+MAKS_ODPOWIEDZI = 64
+
+
+def _etag(*czesci):
+    return '"' + hashlib.sha1(repr(czesci).encode('utf-8')).hexdigest()[:20] + '"'
+
+
+# Strumień Arrow IPC; wysyłany bezpośrednio z bufora pyarrow
+def encode_arrow(df):
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    ujscie = pa.BufferOutputStream()
+    with pa.ipc.new_stream(ujscie, tabela.schema) as zapis:
+        zapis.write_table(tabela)
+    return ujscie.getvalue()
+
+
+def encode_json_gzip(df):
+    tekst = df.to_json(orient='records', date_format='iso', force_ascii=False)
+    return gzip.compress(tekst.encode('utf-8'), compresslevel=6)
+
+
+# Migawka z fetch_cache przetworzona raz przez dashboard_snapshot (ta sama, której używa app.py)
+def latest_snapshot():
+    from dashboard import dashboard_snapshot
+    from fetch_cache import cache_stats, get_weather_data
+
+    df_surowe = get_weather_data()
+    pobrano = cache_stats()['pobrano']
+    return dashboard_snapshot(df_surowe, pobrano).dane, pobrano
+
+
+class DataServer:
+    def __init__(self, host="127.0.0.1", port=PORT_DANYCH, katalog=KATALOG_LOGU, zrodlo=latest_snapshot):
+        self.katalog = katalog
+        self.zrodlo = zrodlo
+        self.serwer = ThreadingHTTPServer((host, port), self._handler())
+        self.serwer.daemon_threads = True
+        self._watek = None
+        self._blokada = threading.Lock()
+        self._odpowiedzi = {}
+        self._w_budowie = {}
+        self.liczniki = {'zapytania': 0, '200': 0, '304': 0, '400': 0, '404': 0, '500': 0,
+                         'zbudowane': 0, 'trafienia': 0, 'wyslane_bajty': 0}
+
+    @property
+    def url(self):
+        host, port = self.serwer.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # Zakodowana odpowiedź dla klucza budowana jeden raz – równoległe zapytania o to samo czekają na budowę
+    def _odpowiedz(self, klucz, zbuduj):
+        with self._blokada:
+            if klucz in self._odpowiedzi:
+                self.liczniki['trafienia'] += 1
+                return self._odpowiedzi[klucz]
+            blokada_klucza = self._w_budowie.setdefault(klucz, threading.Lock())
+
+        with blokada_klucza:
+            with self._blokada:
+                if klucz in self._odpowiedzi:
+                    self.liczniki['trafienia'] += 1
+                    return self._odpowiedzi[klucz]
+            try:
+                odpowiedz = zbuduj()
+            except BaseException:
+                with self._blokada:
+                    self._w_budowie.pop(klucz, None)
+                raise
+            # Zapis do pamięci i zwolnienie blokady budowy w jednej sekcji – inaczej zapytanie, które
+            # przyjdzie pomiędzy, nie znalazłoby ani odpowiedzi, ani blokady i budowało ją drugi raz
+            with self._blokada:
+                if len(self._odpowiedzi) >= MAKS_ODPOWIEDZI:
+                    self._odpowiedzi.pop(next(iter(self._odpowiedzi)))
+                self._odpowiedzi[klucz] = odpowiedz
+                self.liczniki['zbudowane'] += 1
+                self._w_budowie.pop(klucz, None)
+        return odpowiedz
+
+    def _zakoduj(self, df, format, etag):
+        cialo = encode_arrow(df) if format == 'arrow' else encode_json_gzip(df)
+        return {'cialo': cialo, 'etag': etag, 'typ': TYP_ARROW if format == 'arrow' else TYP_JSON,
+                'wiersze': len(df)}
+
+    # ETag migawki: czas pobrania i zawartość – odświeżenie z identycznymi danymi nie unieważnia klientów
+    def snapshot(self, format):
+        df, pobrano = self.zrodlo()
+        klucz = ('migawka', format, pobrano)
+
+        def zbuduj():
+            skrot = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+            return self._zakoduj(df, format, _etag('migawka', format, skrot.hexdigest()))
+
+        return self._odpowiedz(klucz, zbuduj)
+
+    # Wersja zakresu historii: nazwy, rozmiary i czasy modyfikacji fragmentów partycji –
+    # ETag znany bez czytania danych, więc 304 nie kosztuje odczytu Parquet
+    def _wersja_historii(self, od, do):
+        wersja = []
+        for data in list_dates(od, do, self.katalog):
+            for sciezka in partition_files(data, self.katalog):
+                stat = os.stat(sciezka)
+                wersja.append((data, os.path.basename(sciezka), stat.st_size, stat.st_mtime_ns))
+        return tuple(wersja)
+
+    # znany_etag: ETag klienta – jeśli aktualny, zwracany jest sam ETag (bez budowania odpowiedzi)
+    def history(self, format, od, do, stacje=None, kolumny=None, znany_etag=None):
+        parametry = (od, do, tuple(stacje) if stacje else None, tuple(kolumny) if kolumny else None)
+        etag = _etag('historia', format, parametry, self._wersja_historii(od, do))
+        if etag == znany_etag:
+            return {'etag': etag}
+
+        def zbuduj():
+            df = read_log(od, do, columns=kolumny, stacje=stacje, katalog=self.katalog)
+            return self._zakoduj(df, format, etag)
+
+        return self._odpowiedz(('historia', format, etag), zbuduj)
+
+    def stats(self):
+        with self._blokada:
+            statystyki = dict(self.liczniki)
+            statystyki['odpowiedzi_w_pamieci'] = len(self._odpowiedzi)
+        return statystyki
+
+    def _handler(self):
+        serwer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Połączenia keep-alive – klient z pulą połączeń nie otwiera gniazda na każde zapytanie
+            protocol_version = "HTTP/1.1"
+            # Nagłówki i ciało idą osobnymi zapisami – bez tego Nagle + opóźniony ACK dodają ~40 ms
+            disable_nagle_algorithm = True
+
+            def _wyslij(self, kod, cialo=b"", naglowki=None):
+                self.send_response(kod)
+                for nazwa, wartosc in (naglowki or {}).items():
+                    self.send_header(nazwa, wartosc)
+                self.send_header("Content-Length", str(len(cialo)))
+                self.end_headers()
+                if cialo:
+                    self.wfile.write(cialo)
+                with serwer._blokada:
+                    serwer.liczniki[str(kod)] = serwer.liczniki.get(str(kod), 0) + 1
+                    serwer.liczniki['wyslane_bajty'] += len(cialo)
+
+            def _format(self, zapytanie):
+                if 'format' in zapytanie:
+                    return zapytanie['format'][0]
+                return 'arrow' if TYP_ARROW in self.headers.get("Accept", "") else 'json'
+
+            def do_GET(self):
+                with serwer._blokada:
+                    serwer.liczniki['zapytania'] += 1
+                adres = urlsplit(self.path)
+                zapytanie = parse_qs(adres.query)
+                try:
+                    if adres.path == "/health":
+                        cialo = json.dumps(serwer.stats()).encode('utf-8')
+                        self._wyslij(200, cialo, {"Content-Type": TYP_JSON, "Cache-Control": "no-cache"})
+                        return
+
+                    format = self._format(zapytanie)
+                    if format not in ('arrow', 'json'):
+                        self._wyslij(400, b"format: arrow lub json", {"Content-Type": "text/plain"})
+                        return
+                    if adres.path == "/snapshot":
+                        odpowiedz = serwer.snapshot(format)
+                    elif adres.path == "/history":
+                        do = date.fromisoformat(zapytanie['do'][0]) if 'do' in zapytanie else date.today()
+                        od = (date.fromisoformat(zapytanie['od'][0]) if 'od' in zapytanie
+                              else do - timedelta(days=DOMYSLNE_DNI_HISTORII))
+                        kolumny = zapytanie['kolumny'][0].split(",") if 'kolumny' in zapytanie else None
+                        odpowiedz = serwer.history(format, od.isoformat(), do.isoformat(), zapytanie.get('stacja'),
+                                                   kolumny, self.headers.get("If-None-Match"))
+                    else:
+                        self._wyslij(404, b"", {"Content-Type": "text/plain"})
+                        return
+                except ValueError as blad:
+                    self._wyslij(400, str(blad).encode('utf-8'), {"Content-Type": "text/plain; charset=utf-8"})
+                    return
+                except Exception as blad:
+                    cialo = f"{type(blad).__name__}: {blad}".encode('utf-8')
+                    self._wyslij(500, cialo, {"Content-Type": "text/plain; charset=utf-8"})
+                    return
+
+                naglowki = {"ETag": odpowiedz['etag'], "Cache-Control": "no-cache", "Vary": "Accept"}
+                if self.headers.get("If-None-Match") == odpowiedz['etag']:
+                    self._wyslij(304, b"", naglowki)
+                    return
+                naglowki["Content-Type"] = odpowiedz['typ']
+                naglowki["X-Wiersze"] = str(odpowiedz['wiersze'])
+                cialo = odpowiedz['cialo']
+                if odpowiedz['typ'] == TYP_JSON:
+                    if "gzip" in self.headers.get("Accept-Encoding", ""):
+                        naglowki["Content-Encoding"] = "gzip"
+                    else:
+                        cialo = gzip.decompress(cialo)
+                self._wyslij(200, memoryview(cialo) if isinstance(cialo, pa.Buffer) else cialo, naglowki)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._watek = threading.Thread(target=self.serwer.serve_forever, daemon=True)
+        self._watek.start()
+        return self
+
+    def stop(self):
+        self.serwer.shutdown()
+        self.serwer.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *wyjatek):
+        self.stop()
+
+
+# Klient: ramki z serwera danych, z walidacją ETag (304 zwraca poprzednio odebraną tabelę)
+class DataClient:
+    def __init__(self, url=f"http://127.0.0.1:{PORT_DANYCH}", format='arrow'):
+        import requests
+
+        self.url = url.rstrip("/")
+        self.format = format
+        self.sesja = requests.Session()
+        self._pamiec = {}
+
+    def table(self, sciezka, **parametry):
+        klucz = (sciezka, tuple(sorted(parametry.items())))
+        naglowki = {"Accept": TYP_ARROW if self.format == 'arrow' else "application/json"}
+        if klucz in self._pamiec:
+            naglowki["If-None-Match"] = self._pamiec[klucz][0]
+        odpowiedz = self.sesja.get(f"{self.url}{sciezka}", params=dict(parametry, format=self.format),
+                                   headers=naglowki, timeout=30)
+        if odpowiedz.status_code == 304:
+            return self._pamiec[klucz][1]
+        odpowiedz.raise_for_status()
+
+        if self.format == 'arrow':
+            # Tabela wskazuje na bufor odpowiedzi – bez kopiowania danych
+            tabela = pa.ipc.open_stream(pa.py_buffer(odpowiedz.content)).read_all()
+        else:
+            tabela = pa.Table.from_pylist(odpowiedz.json())
+        self._pamiec[klucz] = (odpowiedz.headers.get("ETag"), tabela)
+        return tabela
+
+    def snapshot(self):
+        return self.table("/snapshot").to_pandas()
+
+    def history(self, od=None, do=None, stacje=None, kolumny=None):
+        parametry = {}
+        if od is not None:
+            parametry['od'] = str(od)
+        if do is not None:
+            parametry['do'] = str(do)
+        if stacje:
+            parametry['stacja'] = tuple(stacje)
+        if kolumny:
+            parametry['kolumny'] = ",".join(kolumny)
+        return self.table("/history", **parametry).to_pandas()
+
+
+# Pomiar przepustowości i opóźnień: `watki` klientów z własną pulą połączeń, każdy `zapytania` zapytań;
+# z_etag=True – klienci wysyłają If-None-Match (typowy konsument odpytujący cyklicznie)
+def measure(url, sciezka="/snapshot", format='arrow', zapytania=200, watki=8, z_etag=False):
+    import requests
+
+    naglowki = {"Accept": TYP_ARROW if format == 'arrow' else "application/json", "Accept-Encoding": "gzip"}
+
+    def klient(_):
+        sesja = requests.Session()
+        czasy, kody, bajty = [], {}, 0
+        etag = None
+        for _ in range(zapytania):
+            dodatkowe = {"If-None-Match": etag} if z_etag and etag else {}
+            start = time.perf_counter()
+            odpowiedz = sesja.get(f"{url}{sciezka}", headers=dict(naglowki, **dodatkowe), timeout=30)
+            odpowiedz.content
+            czasy.append(time.perf_counter() - start)
+            etag = odpowiedz.headers.get("ETag", etag)
+            kody[odpowiedz.status_code] = kody.get(odpowiedz.status_code, 0) + 1
+            bajty += int(odpowiedz.headers.get("Content-Length", 0))
+        return czasy, kody, bajty
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=watki) as pula:
+        wyniki = list(pula.map(klient, range(watki)))
+    czas = time.perf_counter() - start
+
+    czasy = sorted(t for wynik in wyniki for t in wynik[0])
+    kody = {}
+    for _, kody_klienta, _ in wyniki:
+        for kod, liczba in kody_klienta.items():
+            kody[kod] = kody.get(kod, 0) + liczba
+    return {
+        'sciezka': sciezka,
+        'format': format,
+        'z_etag': z_etag,
+        'zapytania': len(czasy),
+        'na_sekunde': round(len(czasy) / czas, 1),
+        'mediana_ms': round(statistics.median(czasy) * 1000, 2),
+        'p95_ms': round(czasy[int(0.95 * (len(czasy) - 1))] * 1000, 2),
+        'mb_przeslane': round(sum(wynik[2] for wynik in wyniki) / 2 ** 20, 2),
+        'odpowiedzi': kody,
+    }
+
+
+# Benchmark lokalny bez sieci: migawka z weather_data.csv, historia z syntetycznego logu
+def benchmark(zapytania=200, watki=8, dni_historii=30):
+    import shutil
+    import tempfile
+
+    import benchmark as bench
+    from dashboard import DashboardSnapshot
+    from data_loader import load_from_csv
+
+    migawka = DashboardSnapshot(load_from_csv(), datetime.now())
+    katalog = tempfile.mkdtemp(prefix="data_server_")
+    try:
+        bench._zbuduj_magazyn(60, dni_historii, True, katalog)
+        od = bench.POCZATEK.date()
+        do = od + timedelta(days=dni_historii)
+
+        wyniki = []
+        with DataServer(port=0, katalog=katalog, zrodlo=lambda: (migawka.dane, migawka.pobrano)) as serwer:
+            sciezki = [("/snapshot", zapytania), (f"/history?od={od}&do={do}", max(zapytania // 10, 1))]
+            for format in ('arrow', 'json'):
+                for sciezka, liczba in sciezki:
+                    for z_etag in (False, True):
+                        wyniki.append(measure(serwer.url, sciezka, format, liczba, watki, z_etag))
+            statystyki = serwer.stats()
+    finally:
+        shutil.rmtree(katalog, ignore_errors=True)
+    return {'pomiary': wyniki, 'serwer': statystyki}
+
+
+def main(argumenty):
+    serwer = DataServer(host=argumenty.host, port=PORT_DANYCH if argumenty.port is None else argumenty.port)
+    print(f"Serwer danych: {serwer.url}/snapshot, {serwer.url}/history?od=RRRR-MM-DD&do=RRRR-MM-DD "
+          f"(format=arrow|json)")
+    try:
+        serwer.serwer.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        serwer.serwer.server_close()
+
+
+def _parser():
+    parser = argparse.ArgumentParser(description="Lokalne API danych pogodowych (Arrow IPC / JSON gzip, ETag)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT_DANYCH)
+    parser.add_argument("--benchmark", type=int, metavar="ZAPYTANIA",
+                        help="zmierz przepustowość lokalnie (dane z weather_data.csv i syntetycznej historii)")
+    parser.add_argument("--watki", type=int, default=8, help="w benchmarku: liczba równoległych klientów")
+    return parser
+
+
+if __name__ == "__main__":
+    argumenty = _parser().parse_args()
+    if argumenty.benchmark:
+        print(json.dumps(benchmark(argumenty.benchmark, argumenty.watki), indent=2, ensure_ascii=False))
+    else:
+        main(argumenty)
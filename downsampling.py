@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+# Górny limit punktów wysyłanych do przeglądarki na jeden wykres
+MAKS_PUNKTOW = 1000
+
+# Kolejne poziomy agregacji – wybierany jest najdrobniejszy, który mieści się w limicie punktów
+POZIOMY_AGREGACJI = [('h', pd.Timedelta(hours=1)), ('D', pd.Timedelta(days=1)), ('W', pd.Timedelta(weeks=1))]
+
+
+def _jako_liczby(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype('int64').astype('float64')
+    return x.astype('float64')
+
+
+# Largest-Triangle-Three-Buckets: indeksy n punktów zachowujących kształt serii
+def lttb(x, y, n):
+    x = _jako_liczby(x)
+    y = np.asarray(y, dtype='float64')
+    liczba = len(x)
+    if n >= liczba or n < 3:
+        return np.arange(liczba)
+
+    indeksy = np.empty(n, dtype='int64')
+    indeksy[0], indeksy[-1] = 0, liczba - 1
+    krawedzie = np.linspace(1, liczba - 1, n - 1).astype('int64')
+    a = 0
+    for i in range(n - 2):
+        od, do = krawedzie[i], krawedzie[i + 1]
+        nastepny_do = krawedzie[i + 2] if i + 2 < n - 1 else liczba
+        srednia_x = x[do:nastepny_do].mean()
+        srednia_y = y[do:nastepny_do].mean()
+        pole = np.abs((x[a] - srednia_x) * (y[od:do] - y[a]) - (x[a] - x[od:do]) * (srednia_y - y[a]))
+        a = od + int(np.argmax(pole))
+        indeksy[i + 1] = a
+    return indeksy
+
+
+# Najdrobniejszy poziom agregacji, przy którym zakres zmieści się w limicie punktów
+def choose_frequency(start, end, maks_punktow=MAKS_PUNKTOW):
+    zakres = pd.Timestamp(end) - pd.Timestamp(start)
+    for czestotliwosc, krok in POZIOMY_AGREGACJI:
+        if zakres / krok <= maks_punktow:
+            return czestotliwosc
+    return POZIOMY_AGREGACJI[-1][0]
+
+
+# Oś czasu historii: rzeczywisty czas pomiaru (godzinowe wiersze kolektora), a dla wierszy starego logu
+# bez godziny – dzień pobrania
+def measurement_time(df):
+    pobrano = pd.to_datetime(df['data_pobrania'])
+    if 'czas_pomiaru' not in df.columns:
+        return pobrano
+    return pd.to_datetime(df['czas_pomiaru']).fillna(pobrano)
+
+
+def points_for_width(szerokosc_px, maks_punktow=MAKS_PUNKTOW):
+    return max(3, min(maks_punktow, int(szerokosc_px)))
+
+
+# Seria do wykresu historii: surowa, gdy się mieści; inaczej średnia z kubełków czasowych
+# z kolumnami <kolumna>_min/_max, więc ekstrema pozostają widoczne przy każdej rozdzielczości.
+# metoda='lttb' zamiast agregacji wybiera surowe punkty zachowujące kształt serii.
+# Domyślna oś x='czas_pomiaru' pochodzi z measurement_time(), więc pomiary z jednego dnia nie dzielą jednej wartości x.
+def history_for_chart(df, kolumna, x='czas_pomiaru', szerokosc_px=MAKS_PUNKTOW, maks_punktow=MAKS_PUNKTOW,
+                      metoda='kubelki'):
+    limit = points_for_width(szerokosc_px, maks_punktow)
+    czasy = measurement_time(df) if x == 'czas_pomiaru' else df[x]
+    seria = pd.DataFrame({x: czasy, kolumna: df[kolumna]}).dropna().sort_values(x)
+    if len(seria) <= limit:
+        return seria.reset_index(drop=True)
+    if metoda == 'lttb':
+        return seria.iloc[lttb(seria[x].to_numpy(), seria[kolumna].to_numpy(), limit)].reset_index(drop=True)
+
+    czestotliwosc = choose_frequency(seria[x].iloc[0], seria[x].iloc[-1], limit)
+    kubelki = seria.groupby(pd.Grouper(key=x, freq=czestotliwosc))[kolumna]
+    wynik = pd.DataFrame({
+        kolumna: kubelki.mean(),
+        f"{kolumna}_min": kubelki.min(),
+        f"{kolumna}_max": kubelki.max(),
+    }).dropna(subset=[kolumna]).reset_index()
+
+    # Nawet tygodnie się nie mieszczą – łączymy sąsiednie kubełki, zachowując min/max
+    if len(wynik) > limit:
+        grupy = wynik.groupby(np.arange(len(wynik)) * limit // len(wynik))
+        wynik = pd.DataFrame({
+            x: grupy[x].first(),
+            kolumna: grupy[kolumna].mean(),
+            f"{kolumna}_min": grupy[f"{kolumna}_min"].min(),
+            f"{kolumna}_max": grupy[f"{kolumna}_max"].max(),
+        }).reset_index(drop=True)
+    return wynik
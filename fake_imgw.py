@@ -0,0 +1,134 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+# Lokalny zamiennik API IMGW do pomiarów opóźnień i zachowania przy awariach (offline)
+PLIK_DANYCH = os.path.join(os.path.dirname(__file__), "weather_data.csv")
+
+
+def _wczytaj_dane(plik=PLIK_DANYCH):
+    # API IMGW zwraca wszystkie pola jako tekst
+    df = pd.read_csv(plik, dtype=str)
+    return df.where(df.notna(), None).to_dict(orient='records')
+
+
+class FakeIMGW:
+    def __init__(self, dane=None, port=0, opoznienie=0.0, bledy=0.0):
+        self.opoznienie = opoznienie
+        self.bledy = bledy
+        self.liczniki = {'200': 0, '304': 0, '503': 0}
+        self.ustaw_dane(dane if dane is not None else _wczytaj_dane())
+        self.serwer = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._watek = None
+
+    @property
+    def url(self):
+        host, port = self.serwer.server_address[:2]
+        return f"http://{host}:{port}/api/data/synop"
+
+    # Podmiana danych = nowa publikacja (nowy ETag i Last-Modified)
+    def ustaw_dane(self, dane):
+        self.cialo = json.dumps(dane, ensure_ascii=False).encode('utf-8')
+        self.etag = '"' + hashlib.sha1(self.cialo).hexdigest() + '"'
+        self.last_modified = formatdate(usegmt=True)
+
+    def _handler(self):
+        serwer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if serwer.opoznienie:
+                    time.sleep(serwer.opoznienie)
+                if random.random() < serwer.bledy:
+                    serwer.liczniki['503'] += 1
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if self.headers.get("If-None-Match") == serwer.etag:
+                    serwer.liczniki['304'] += 1
+                    self.send_response(304)
+                    self.send_header("ETag", serwer.etag)
+                    self.end_headers()
+                    return
+                serwer.liczniki['200'] += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(serwer.cialo)))
+                self.send_header("ETag", serwer.etag)
+                self.send_header("Last-Modified", serwer.last_modified)
+                self.end_headers()
+                self.wfile.write(serwer.cialo)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._watek = threading.Thread(target=self.serwer.serve_forever, daemon=True)
+        self._watek.start()
+        return self
+
+    def stop(self):
+        self.serwer.shutdown()
+        self.serwer.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *wyjatek):
+        self.stop()
+
+
+# Pomiar: czasy pobrania przez imgw_client przy zadanym opóźnieniu i odsetku błędów
+def zmierz(liczba_zapytan=50, opoznienie=0.0, bledy=0.0):
+    import imgw_client
+
+    imgw_client.reset_client()
+    czasy = []
+    nieudane = 0
+    with FakeIMGW(opoznienie=opoznienie, bledy=bledy) as serwer:
+        for _ in range(liczba_zapytan):
+            start = time.perf_counter()
+            try:
+                imgw_client.fetch_json(serwer.url)
+            except Exception:
+                nieudane += 1
+            czasy.append(time.perf_counter() - start)
+        odpowiedzi = dict(serwer.liczniki)
+
+    czasy.sort()
+    return {
+        'zapytania': liczba_zapytan,
+        'nieudane': nieudane,
+        'mediana_ms': round(statistics.median(czasy) * 1000, 2),
+        'p95_ms': round(czasy[int(0.95 * (len(czasy) - 1))] * 1000, 2),
+        'odpowiedzi_serwera': odpowiedzi,
+        'klient': imgw_client.client_stats(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lokalny zamiennik API synop IMGW")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--opoznienie", type=float, default=0.0, help="opóźnienie odpowiedzi w sekundach")
+    parser.add_argument("--bledy", type=float, default=0.0, help="odsetek odpowiedzi 503 (0-1)")
+    parser.add_argument("--pomiar", type=int, metavar="N", help="wykonaj N pobrań i wypisz statystyki")
+    argumenty = parser.parse_args()
+
+    if argumenty.pomiar:
+        print(json.dumps(zmierz(argumenty.pomiar, argumenty.opoznienie, argumenty.bledy), indent=2))
+    else:
+        serwer = FakeIMGW(port=argumenty.port, opoznienie=argumenty.opoznienie, bledy=argumenty.bledy)
+        print("Serwer:", serwer.url)
+        serwer.serwer.serve_forever()
@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from data_loader import fetch_weather_data
+from imgw_client import OPOZNIENIE_PUBLIKACJI
+
+# IMGW publikuje dane synoptyczne co godzinę – domyślnie tyle żyje wpis w pamięci
+CZAS_ZYCIA = timedelta(seconds=int(os.environ.get("IMGW_CACHE_TTL", 3600)))
+
+# Po nieudanym odświeżeniu kolejne próby wstrzymujemy na tyle sekund (nie każde odczytanie nieaktualnych danych)
+PRZERWA_PO_BLEDZIE = timedelta(seconds=int(os.environ.get("IMGW_RETRY_AFTER", 60)))
+
+# Migawka na dysku – zimny start lub awaria API nadal coś wyświetli
+PLIK_MIGAWKI = os.path.join(os.path.dirname(__file__), "cache", "synop_snapshot.json")
+
+# Stan współdzielony przez wszystkie sesje w procesie
+_blokada = threading.Lock()
+_stan = {'df': None, 'pobrano': None, 'wczytano_z_dysku': False, 'blad': None, 'czas_bledu': None}
+_odswiezanie = None
+_liczniki = {'trafienia': 0, 'chybienia': 0, 'nieaktualne': 0, 'odswiezenia': 0, 'bledy': 0}
+
+
+# Najbliższa publikacja IMGW po danym momencie pobrania
+def _nastepna_publikacja(pobrano):
+    pelna_godzina = pobrano.replace(minute=0, second=0, microsecond=0)
+    publikacja = pelna_godzina + OPOZNIENIE_PUBLIKACJI
+    if publikacja <= pobrano:
+        publikacja += timedelta(hours=1)
+    return publikacja
+
+
+def _czy_aktualne(pobrano, teraz):
+    if pobrano is None:
+        return False
+    return teraz < pobrano + CZAS_ZYCIA and teraz < _nastepna_publikacja(pobrano)
+
+
+def _zapisz_migawke(df, pobrano):
+    os.makedirs(os.path.dirname(PLIK_MIGAWKI), exist_ok=True)
+    # Unikalny plik tymczasowy – aplikacja i data_server mogą zapisywać migawkę równocześnie
+    tymczasowy = f"{PLIK_MIGAWKI}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tymczasowy, 'w', encoding='utf-8') as plik:
+            json.dump({'pobrano': pobrano.isoformat(), 'dane': df.to_dict(orient='records')}, plik, ensure_ascii=False)
+        os.replace(tymczasowy, PLIK_MIGAWKI)
+    finally:
+        if os.path.exists(tymczasowy):
+            os.remove(tymczasowy)
+
+
+def _wczytaj_migawke():
+    _stan['wczytano_z_dysku'] = True
+    if not os.path.exists(PLIK_MIGAWKI):
+        return
+    try:
+        with open(PLIK_MIGAWKI, encoding='utf-8') as plik:
+            zawartosc = json.load(plik)
+        _stan['df'] = pd.DataFrame(zawartosc['dane'])
+        _stan['pobrano'] = datetime.fromisoformat(zawartosc['pobrano'])
+    except (OSError, ValueError, KeyError):
+        pass
+
+
+def _odswiez(zdarzenie):
+    global _odswiezanie
+    try:
+        df = fetch_weather_data()
+        pobrano = datetime.now()
+        with _blokada:
+            _stan['df'] = df
+            _stan['pobrano'] = pobrano
+            _stan['blad'] = None
+            _stan['czas_bledu'] = None
+            _liczniki['odswiezenia'] += 1
+        try:
+            _zapisz_migawke(df, pobrano)
+        except OSError:
+            pass
+    except Exception as blad:
+        with _blokada:
+            _stan['blad'] = blad
+            _stan['czas_bledu'] = datetime.now()
+            _liczniki['bledy'] += 1
+    finally:
+        with _blokada:
+            _odswiezanie = None
+        zdarzenie.set()
+
+
+def _po_bledzie(teraz):
+    return _stan['czas_bledu'] is not None and teraz < _stan['czas_bledu'] + PRZERWA_PO_BLEDZIE
+
+
+# Jedno zapytanie w locie na proces – kolejne sesje czekają na to samo zdarzenie
+def _uruchom_odswiezanie():
+    global _odswiezanie
+    if _odswiezanie is None:
+        _odswiezanie = threading.Event()
+        threading.Thread(target=_odswiez, args=(_odswiezanie,), daemon=True).start()
+    return _odswiezanie
+
+
+# Dane synoptyczne z pamięci podręcznej (stale-while-revalidate)
+def get_weather_data():
+    with _blokada:
+        if not _stan['wczytano_z_dysku']:
+            _wczytaj_migawke()
+
+        teraz = datetime.now()
+        if _stan['df'] is not None:
+            if _czy_aktualne(_stan['pobrano'], teraz):
+                _liczniki['trafienia'] += 1
+            else:
+                _liczniki['nieaktualne'] += 1
+                if not _po_bledzie(teraz):
+                    _uruchom_odswiezanie()
+            return _stan['df']
+
+        _liczniki['chybienia'] += 1
+        if _po_bledzie(teraz) and _odswiezanie is None:
+            raise _stan['blad']
+        zdarzenie = _uruchom_odswiezanie()
+
+    zdarzenie.wait()
+    with _blokada:
+        if _stan['df'] is None:
+            raise _stan['blad']
+        return _stan['df']
+
+
+# Wiek danych i liczniki trafień/chybień
+def cache_stats():
+    with _blokada:
+        statystyki = dict(_liczniki)
+        statystyki['pobrano'] = _stan['pobrano']
+        statystyki['odswiezanie_w_toku'] = _odswiezanie is not None
+    return statystyki
+
+
+def clear_cache():
+    with _blokada:
+        _stan.update({'df': None, 'pobrano': None, 'wczytano_z_dysku': False, 'blad': None, 'czas_bledu': None})
+        for klucz in _liczniki:
+            _liczniki[klucz] = 0
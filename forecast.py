@@ -0,0 +1,367 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from log_store import BRAK_GODZINY, KATALOG_LOGU, list_dates, partition_files, read_fragments, station_ids
+from model_state import fragment_paths, load_state, pending_fragments, save_state
+
+# Krótkoterminowa prognoza dla wszystkich stacji naraz: model autoregresyjny z członem dobowym
+#   y[t] = c + a1·y[t-1] + a2·y[t-2] + a3·y[t-3] + a24·y[t-24] + b·sin(2πh/24) + d·cos(2πh/24)
+# dopasowany osobno dla każdej stacji i zmiennej. Stan to statystyki dostateczne najmniejszych kwadratów
+# (XᵀX, Xᵀy) – nowe godziny są do nich dodawane, a współczynniki rozwiązywane wsadowo dla wszystkich stacji.
+# Stacje są kluczowane po id_stacji (jak w climatology), więc zmiana nazwy nie zaczyna nowej historii.
+
+KATALOG_PROGNOZY = "_prognoza"
+
+ZMIENNE = ['temperatura', 'wilgotnosc_wzgledna', 'cisnienie']
+OPOZNIENIA = (1, 2, 3, 24)
+OKNO = max(OPOZNIENIA)
+LICZBA_CECH = 1 + len(OPOZNIENIA) + 2
+
+HORYZONT = 24
+
+# Regularyzacja grzbietowa (względem liczby wierszy) i minimum wierszy do własnego modelu stacji –
+# poniżej prognoza to ostatnia wartość (persystencja)
+REGULARYZACJA = 1e-3
+MIN_WIERSZY = 72
+
+# Ile partycji (dni) czytamy naraz – ogranicza pamięć siatki godzinowej
+PARTIA_DNI = 14
+
+SCHEMAT_ODCZYTU = pa.schema([('id_stacji', pa.int64()), ('stacja', pa.string()), ('data_pomiaru', pa.string()),
+                             ('godzina_pomiaru', pa.int16())] + [(zmienna, pa.float64()) for zmienna in ZMIENNE])
+
+_blokada = threading.Lock()
+_pamiec = {}
+
+
+def _katalog(katalog):
+    return os.path.join(katalog, KATALOG_PROGNOZY)
+
+
+# Cechy modelu z wartości opóźnionych [..., len(OPOZNIENIA)] i godziny doby
+def _cechy(opoznione, godzina):
+    kat = 2 * np.pi * np.asarray(godzina, dtype='float64') / 24
+    kat = np.broadcast_to(kat, opoznione.shape[:-1])
+    return np.concatenate([np.ones(opoznione.shape[:-1] + (1,)), opoznione,
+                           np.sin(kat)[..., None], np.cos(kat)[..., None]], axis=-1)
+
+
+def _pusty_stan():
+    return {
+        'wersja': 0,
+        'stacje': [],
+        'nazwy': [],
+        'fragmenty': {},
+        'koniec': None,
+        'xtx': np.zeros((0, len(ZMIENNE), LICZBA_CECH, LICZBA_CECH)),
+        'xty': np.zeros((0, len(ZMIENNE), LICZBA_CECH)),
+        'yty': np.zeros((0, len(ZMIENNE))),
+        'n': np.zeros((0, len(ZMIENNE))),
+        'ogon': np.zeros((0, len(ZMIENNE), OKNO)),
+    }
+
+
+TABLICE = ('xtx', 'xty', 'yty', 'n', 'ogon')
+
+
+# Stan sprzed kluczowania po id_stacji (bez nazw, tablice w .npz) jest dopasowywany od nowa
+def _wczytaj_stan(katalog):
+    return load_state(_katalog(katalog), _pusty_stan(), TABLICE)
+
+
+# Wiersze fragmentów z czasem pomiaru jako numerem godziny od epoki (pomiary bez godziny pomijane)
+def _czytaj_godziny(sciezki):
+    df = read_fragments(sciezki, SCHEMAT_ODCZYTU)
+    df = df[df['godzina_pomiaru'].notna() & (df['godzina_pomiaru'] != BRAK_GODZINY)
+            & df['data_pomiaru'].notna() & df['stacja'].notna()]
+    kody_dat, daty = pd.factorize(df['data_pomiaru'])
+    doby = pd.to_datetime(daty).to_numpy().astype('datetime64[h]').astype('int64')
+    df = df.assign(godzina=doby[kody_dat] + df['godzina_pomiaru'].to_numpy(dtype='int64'),
+                   id_stacji=station_ids(df))
+    return df[['id_stacji', 'stacja', 'godzina', *ZMIENNE]]
+
+
+def _dopisz_stacje(stan, stacje):
+    pozycje = {stacja: i for i, stacja in enumerate(stan['stacje'])}
+    nowe = [stacja for stacja in stacje if stacja not in pozycje]
+    for stacja in nowe:
+        pozycje[stacja] = len(stan['stacje'])
+        stan['stacje'].append(stacja)
+        stan['nazwy'].append(None)
+    if nowe:
+        for nazwa in TABLICE:
+            dopisane = np.full((len(nowe),) + stan[nazwa].shape[1:], np.nan if nazwa == 'ogon' else 0.0)
+            stan[nazwa] = np.concatenate([stan[nazwa], dopisane])
+    return np.array([pozycje[stacja] for stacja in stacje], dtype='int64')
+
+
+# Siatka godzinowa [stacja, zmienna, godzina] od (poprzedni koniec - OKNO + 1) do ostatniej nowej godziny,
+# wypełniona ogonem stanu i nowymi pomiarami; wiersze regresji – każda godzina po poprzednim końcu.
+# Nazwa stacji w stanie to ostatnia widziana.
+def _dodaj(stan, df):
+    kody, stacje = pd.factorize(df['id_stacji'])
+    pozycje = _dopisz_stacje(stan, [int(stacja) for stacja in stacje])
+    wiersze = pozycje[kody]
+    for pozycja, nazwa in zip(pozycje, df['stacja'].groupby(kody).last().to_numpy()):
+        stan['nazwy'][pozycja] = nazwa
+    godziny = df['godzina'].to_numpy()
+
+    poprzedni = stan['koniec']
+    # Pierwsze dane albo przerwa dłuższa niż okno – opóźnienia sprzed przerwy nie istnieją
+    if poprzedni is None or godziny.min() > poprzedni + OKNO:
+        poprzedni = int(godziny.min()) - 1
+        stan['ogon'][:] = np.nan
+    # Pomiary spóźnione (starsze niż koniec stanu) trafią do modelu przy przeliczeniu od zera
+    nowe = godziny > poprzedni
+    if not nowe.any():
+        return
+    poczatek = poprzedni - OKNO + 1
+    siatka = np.full((len(stan['stacje']), len(ZMIENNE), int(godziny[nowe].max()) - poczatek + 1), np.nan)
+    siatka[:, :, :OKNO] = stan['ogon']
+    for i, zmienna in enumerate(ZMIENNE):
+        siatka[wiersze[nowe], i, godziny[nowe] - poczatek] = df[zmienna].to_numpy(dtype='float64')[nowe]
+
+    y = siatka[:, :, OKNO:]
+    opoznione = np.stack([siatka[:, :, OKNO - k:siatka.shape[2] - k] for k in OPOZNIENIA], axis=-1)
+    X = _cechy(opoznione, (np.arange(poprzedni + 1, poprzedni + 1 + y.shape[2]) % 24)[None, None, :])
+    maska = np.isfinite(y) & np.isfinite(X).all(axis=-1)
+    X = np.where(maska[..., None], X, 0.0)
+    y = np.where(maska, y, 0.0)
+
+    stan['xtx'] += np.einsum('svmk,svml->svkl', X, X)
+    stan['xty'] += np.einsum('svmk,svm->svk', X, y)
+    stan['yty'] += (y ** 2).sum(axis=-1)
+    stan['n'] += maska.sum(axis=-1)
+    stan['ogon'] = siatka[:, :, -OKNO:]
+    stan['koniec'] = int(siatka.shape[2] + poczatek - 1)
+
+
+# Partie całych dni w kolejności dat – godziny jednej doby nie są rozdzielane między partie
+def _partie(fragmenty, katalog):
+    daty = sorted({data for data, _ in fragmenty})
+    for poczatek in range(0, len(daty), PARTIA_DNI):
+        wybrane = set(daty[poczatek:poczatek + PARTIA_DNI])
+        partia = [(data, plik) for data, plik in fragmenty if data in wybrane]
+        yield partia, _czytaj_godziny(fragment_paths(partia, katalog))
+
+
+# Aktualizacja przyrostowa: nowe fragmenty partycji dopisują swoje godziny do statystyk.
+# Zniknięcie znanego fragmentu (upsert z zastąpieniem, compact_log) wymusza przeliczenie od zera;
+# scalenie przetworzonych fragmentów przez compact_partition – tylko podmianę ich nazw w stanie.
+def update_forecast_model(katalog=KATALOG_LOGU, od_zera=False):
+    stan = _wczytaj_stan(katalog)
+    if od_zera:
+        stan = dict(_pusty_stan(), wersja=stan['wersja'])
+
+    znane = stan['fragmenty']
+    nowe, podmienione = pending_fragments(znane, katalog)
+    if nowe is None:
+        return update_forecast_model(katalog, od_zera=True)
+
+    przetworzone = 0
+    for partia, df in _partie(nowe, katalog):
+        if not df.empty:
+            _dodaj(stan, df)
+        for data, plik in partia:
+            znane.setdefault(data, []).append(plik)
+        przetworzone += len(partia)
+
+    if przetworzone or podmienione or od_zera:
+        save_state(stan, _katalog(katalog), TABLICE)
+        with _blokada:
+            _pamiec.clear()
+    return przetworzone
+
+
+# Współczynniki wszystkich stacji i zmiennych jednym wsadowym rozwiązaniem układów [S, V, K, K];
+# stacje z małą liczbą wierszy dostają persystencję
+def _wspolczynniki(stan):
+    xtx, xty, n = stan['xtx'], stan['xty'], stan['n']
+    kara = REGULARYZACJA * np.maximum(n, 1)[..., None, None] * np.eye(LICZBA_CECH)
+    kara[..., 0, 0] = 0
+    beta = np.linalg.solve(xtx + kara + 1e-9 * np.eye(LICZBA_CECH), xty[..., None])[..., 0]
+
+    persystencja = np.zeros(LICZBA_CECH)
+    persystencja[1] = 1.0
+    beta = np.where((n >= MIN_WIERSZY)[..., None], beta, persystencja)
+
+    # Odchylenie reszt jednego kroku: (yᵀy - 2βᵀXᵀy + βᵀXᵀXβ) / (n - K)
+    rss = stan['yty'] - 2 * np.einsum('svk,svk->sv', beta, xty) + np.einsum('svk,svkl,svl->sv', beta, xtx, beta)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sigma = np.where(n >= MIN_WIERSZY, np.sqrt(np.maximum(rss, 0) / (n - LICZBA_CECH)), np.nan)
+    return beta, sigma
+
+
+# Braki w oknie uzupełniane ostatnią wcześniejszą wartością (stacja, która pominęła godzinę)
+def _uzupelnij(okno):
+    indeksy = np.where(np.isnan(okno), 0, np.arange(okno.shape[-1]))
+    np.maximum.accumulate(indeksy, axis=-1, out=indeksy)
+    return np.take_along_axis(okno, indeksy, axis=-1)
+
+
+# Prognoza rekurencyjna: okno [..., S, V, OKNO] kończące się o godzinie `koniec` (skalar lub [...]) →
+# prognozy [..., S, V, horyzont]; ten sam kod dla prognozy bieżącej i dla wielu punktów startu w backteście
+def _prognozuj(beta, okno, koniec, horyzont):
+    okno = _uzupelnij(okno)
+    koniec = np.asarray(koniec)[..., None, None]
+    wynik = np.empty(okno.shape[:-1] + (horyzont,))
+    for krok in range(horyzont):
+        opoznione = np.stack([okno[..., -k] for k in OPOZNIENIA], axis=-1)
+        wynik[..., krok] = np.einsum('...k,...k->...', _cechy(opoznione, (koniec + krok + 1) % 24), beta)
+        okno = np.concatenate([okno[..., 1:], wynik[..., krok:krok + 1]], axis=-1)
+    return wynik
+
+
+# Odchylenie błędu prognozy h kroków: σ·√(Σ ψj²), gdzie ψ – odpowiedź modelu AR na impuls (ψ0 = 1)
+def _bledy(beta, sigma, horyzont):
+    psi = np.zeros(beta.shape[:-1] + (horyzont,))
+    psi[..., 0] = 1.0
+    for j in range(1, horyzont):
+        for i, k in enumerate(OPOZNIENIA):
+            if j - k >= 0:
+                psi[..., j] += beta[..., 1 + i] * psi[..., j - k]
+    return sigma[..., None] * np.sqrt(np.cumsum(psi ** 2, axis=-1))
+
+
+def _model(katalog):
+    opis = os.path.join(_katalog(katalog), "stan.json")
+    klucz = (os.path.abspath(katalog), os.path.getmtime(opis) if os.path.exists(opis) else None)
+    with _blokada:
+        if klucz in _pamiec:
+            return _pamiec[klucz]
+    stan = _wczytaj_stan(katalog)
+    beta, sigma = _wspolczynniki(stan)
+    model = {'stacje': stan['stacje'], 'nazwy': stan['nazwy'], 'koniec': stan['koniec'], 'ogon': stan['ogon'], 'beta': beta,
+             'sigma': sigma, 'prognozy': {}}
+    with _blokada:
+        for stary in [k for k in _pamiec if k[0] == klucz[0]]:
+            del _pamiec[stary]
+        _pamiec[klucz] = model
+    return model
+
+
+def clear_cache():
+    with _blokada:
+        _pamiec.clear()
+
+
+def _czas(godzina):
+    return pd.to_datetime(np.asarray(godzina, dtype='int64').astype('datetime64[h]'))
+
+
+# Prognoza dla wszystkich stacji na `horyzont` godzin od ostatniego pomiaru w logu (postać długa:
+# id_stacji, bieżąca nazwa stacji, krok, czas, zmienne i odchylenie błędu prognozy). Liczona raz na wersję modelu.
+def forecast(horyzont=HORYZONT, katalog=KATALOG_LOGU):
+    model = _model(katalog)
+    with _blokada:
+        if horyzont in model['prognozy']:
+            return model['prognozy'][horyzont]
+
+    stacje = len(model['stacje'])
+    wynik = pd.DataFrame({'id_stacji': np.repeat(np.array(model['stacje'], dtype='int64'), horyzont),
+                          'stacja': np.repeat(np.array(model['nazwy'], dtype=object), horyzont),
+                          'krok': np.tile(np.arange(1, horyzont + 1), stacje)})
+    if model['koniec'] is not None:
+        prognozy = _prognozuj(model['beta'], model['ogon'], model['koniec'], horyzont)
+        bledy = _bledy(model['beta'], model['sigma'], horyzont)
+        wynik['czas'] = np.tile(_czas(model['koniec'] + np.arange(1, horyzont + 1)), stacje)
+        for i, zmienna in enumerate(ZMIENNE):
+            wynik[zmienna] = prognozy[:, i, :].ravel()
+            wynik[f"{zmienna}_blad"] = bledy[:, i, :].ravel()
+    with _blokada:
+        model['prognozy'][horyzont] = wynik
+    return wynik
+
+
+# Backtest: model dopasowany na historii bez ostatnich `dni` dni, prognozy z punktów startu co `co_ile`
+# godzin w okresie testowym; MAE modelu względem persystencji i wartości sprzed doby, dla wybranych kroków.
+# ValueError, gdy historii godzinowej jest za mało (pusty log, same dzienne wiersze starego CSV, zbyt krótki
+# okres testowy względem horyzontu).
+def backtest(dni=7, horyzont=HORYZONT, co_ile=6, katalog=KATALOG_LOGU):
+    daty = list_dates(katalog=katalog)
+    wszystkie = _czytaj_godziny([sciezka for data in daty[-(dni + 2):] for sciezka in partition_files(data, katalog)])
+    if wszystkie.empty:
+        raise ValueError("za mało historii godzinowej do backtestu: brak pomiarów z godziną w logu")
+    odciecie = int(wszystkie['godzina'].max()) - dni * 24
+
+    start = time.perf_counter()
+    stan = _pusty_stan()
+    fragmenty = [(data, os.path.basename(p)) for data in daty for p in partition_files(data, katalog)]
+    for _, df in _partie(fragmenty, katalog):
+        df = df[df['godzina'] <= odciecie]
+        if not df.empty:
+            _dodaj(stan, df)
+    beta, _ = _wspolczynniki(stan)
+    czas_dopasowania = time.perf_counter() - start
+
+    # Siatka okresu testowego (z oknem przed odcięciem) dla stacji znanych modelowi
+    testowe = wszystkie[(wszystkie['godzina'] > odciecie - OKNO) & wszystkie['id_stacji'].isin(stan['stacje'])]
+    if testowe.empty:
+        raise ValueError(f"za mało historii godzinowej do backtestu: brak pomiarów sprzed ostatnich {dni} dni")
+    pozycje = {stacja: i for i, stacja in enumerate(stan['stacje'])}
+    poczatek = odciecie - OKNO + 1
+    siatka = np.full((len(stan['stacje']), len(ZMIENNE), int(testowe['godzina'].max()) - poczatek + 1), np.nan)
+    wiersze = testowe['id_stacji'].map(pozycje).to_numpy(dtype='int64')
+    for i, zmienna in enumerate(ZMIENNE):
+        siatka[wiersze, i, testowe['godzina'].to_numpy() - poczatek] = testowe[zmienna].to_numpy(dtype='float64')
+
+    starty = np.arange(OKNO - 1, siatka.shape[2] - horyzont, co_ile)
+    if not len(starty):
+        raise ValueError(f"za mało historii godzinowej do backtestu: okres testowy krótszy niż horyzont {horyzont} h")
+    okna = np.stack([siatka[:, :, s - OKNO + 1:s + 1] for s in starty])
+    prawda = np.stack([siatka[:, :, s + 1:s + 1 + horyzont] for s in starty])
+
+    start = time.perf_counter()
+    prognozy = _prognozuj(beta, okna, poczatek + starty, horyzont)
+    czas_prognozy = time.perf_counter() - start
+
+    persystencja = np.repeat(_uzupelnij(okna)[..., -1:], horyzont, axis=-1)
+    kroki = np.arange(1, horyzont + 1)
+    sprzed_doby = np.stack([siatka[:, :, s + kroki - 24] for s in starty])
+
+    raport = []
+    for i, zmienna in enumerate(ZMIENNE):
+        for krok in sorted({1, 3, 6, 12, horyzont} & set(kroki)):
+            y = prawda[:, :, i, krok - 1]
+            wpis = {'zmienna': zmienna, 'krok': krok, 'punkty': int(np.isfinite(y).sum())}
+            for nazwa, p in (('model', prognozy), ('persystencja', persystencja), ('sprzed_doby', sprzed_doby)):
+                blad = np.abs(p[:, :, i, krok - 1] - y)
+                wpis[f"mae_{nazwa}"] = round(float(np.nanmean(blad)), 3) if np.isfinite(blad).any() else None
+            raport.append(wpis)
+
+    return {
+        'stacje': len(stan['stacje']),
+        'godziny_uczace': int(stan['n'][:, 0].sum()),
+        'punkty_startu': len(starty),
+        'czas_dopasowania_s': round(czas_dopasowania, 3),
+        'czas_prognozy_s': round(czas_prognozy, 4),
+        'mae': pd.DataFrame(raport),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prognoza krótkoterminowa dla wszystkich stacji")
+    parser.add_argument("--od-zera", action="store_true", help="dopasuj model od początku historii")
+    parser.add_argument("--stacja", help="wypisz prognozę stacji")
+    parser.add_argument("--backtest", type=int, metavar="DNI", help="oceń model na ostatnich DNI dniach historii")
+    argumenty = parser.parse_args()
+
+    if argumenty.backtest:
+        try:
+            wynik = backtest(argumenty.backtest)
+        except ValueError as blad:
+            parser.exit(1, f"Backtest niemożliwy – {blad}\n")
+        print(wynik.pop('mae').to_string(index=False))
+        print(json.dumps(wynik, indent=2))
+    else:
+        print(f"Przetworzone fragmenty logu: {update_forecast_model(od_zera=argumenty.od_zera)}")
+        if argumenty.stacja:
+            prognoza = forecast()
+            print(prognoza[prognoza['stacja'] == argumenty.stacja].to_string(index=False))
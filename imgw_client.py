@@ -0,0 +1,112 @@
+import os
+import random
+import threading
+import time
+from datetime import timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Adres API (można nadpisać, np. lokalnym serwerem z fake_imgw.py)
+ADRES_API = os.environ.get("IMGW_API_URL", "https://danepubliczne.imgw.pl/api/data/synop")
+
+# Ile minut po pełnej godzinie pojawia się nowy pomiar w API
+OPOZNIENIE_PUBLIKACJI = timedelta(minutes=int(os.environ.get("IMGW_PUBLISH_DELAY", 15)))
+
+# Limity czasu: (połączenie, odczyt) w sekundach
+LIMIT_CZASU = (3.05, 10)
+
+# Ponowienia z losowym rozrzutem (full jitter)
+LICZBA_PROB = 4
+PODSTAWA_OPOZNIENIA = 0.5
+MAKS_OPOZNIENIE = 8.0
+KODY_DO_PONOWIENIA = {429, 500, 502, 503, 504}
+
+# Jedna sesja z pulą połączeń dla całego procesu
+_sesja = requests.Session()
+_sesja.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+_sesja.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+_sesja.headers.update({"Accept": "application/json", "Accept-Encoding": "gzip"})
+
+# ETag / Last-Modified i ostatnia odpowiedź dla każdego adresu
+_blokada = threading.Lock()
+_walidatory = {}
+_liczniki = {'zapytania': 0, 'pelne': 0, 'nie_zmienione': 0, 'ponowienia': 0, 'bledy': 0}
+
+
+def _opoznienie(proba):
+    return random.uniform(0, min(MAKS_OPOZNIENIE, PODSTAWA_OPOZNIENIA * 2 ** proba))
+
+
+def _naglowki_warunkowe(url):
+    with _blokada:
+        wpis = _walidatory.get(url)
+    if wpis is None:
+        return {}
+    naglowki = {}
+    if wpis['etag']:
+        naglowki['If-None-Match'] = wpis['etag']
+    if wpis['last_modified']:
+        naglowki['If-Modified-Since'] = wpis['last_modified']
+    return naglowki
+
+
+def _get(url, naglowki, timeout, proby=LICZBA_PROB):
+    for proba in range(proby):
+        ostatnia = proba == proby - 1
+        try:
+            with _blokada:
+                _liczniki['zapytania'] += 1
+            odpowiedz = _sesja.get(url, headers=naglowki, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if ostatnia:
+                raise
+        else:
+            if odpowiedz.status_code not in KODY_DO_PONOWIENIA or ostatnia:
+                return odpowiedz
+        with _blokada:
+            _liczniki['ponowienia'] += 1
+        time.sleep(_opoznienie(proba))
+
+
+# Pobranie JSON-a; przy 304 zwracamy poprzednio sparsowaną odpowiedź bez ponownego parsowania.
+# 304 bez zapamiętanej odpowiedzi (np. po reset_client w trakcie zapytania) to chybienie –
+# pobieramy ponownie bez nagłówków warunkowych. proby=1 wyłącza ponowienia z time.sleep – wywołujący
+# (np. kolektor z własnym wycofaniem) sam decyduje, kiedy spróbować znowu.
+def fetch_json(url=ADRES_API, timeout=LIMIT_CZASU, proby=LICZBA_PROB):
+    try:
+        odpowiedz = _get(url, _naglowki_warunkowe(url), timeout, proby)
+        if odpowiedz.status_code == 304:
+            with _blokada:
+                wpis = _walidatory.get(url)
+                if wpis is not None:
+                    _liczniki['nie_zmienione'] += 1
+                    return wpis['dane']
+            odpowiedz = _get(url, {'Cache-Control': 'no-cache'}, timeout, proby)
+        odpowiedz.raise_for_status()
+        dane = odpowiedz.json()
+    except Exception:
+        with _blokada:
+            _liczniki['bledy'] += 1
+        raise
+
+    with _blokada:
+        _liczniki['pelne'] += 1
+        _walidatory[url] = {
+            'etag': odpowiedz.headers.get('ETag'),
+            'last_modified': odpowiedz.headers.get('Last-Modified'),
+            'dane': dane,
+        }
+    return dane
+
+
+def client_stats():
+    with _blokada:
+        return dict(_liczniki)
+
+
+def reset_client():
+    with _blokada:
+        _walidatory.clear()
+        for klucz in _liczniki:
+            _liczniki[klucz] = 0
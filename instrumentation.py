@@ -0,0 +1,192 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+# Lekki pomiar etapów potoku: czas, liczba wierszy i szczyt alokacji, zapisywane jako linie JSON.
+# Wyłączony (domyślnie) kosztuje jedno sprawdzenie flagi na wywołanie.
+# Włączenie: POGODA_PROFIL=1 (wypis na stderr) albo POGODA_PROFIL=ścieżka.jsonl, lub configure().
+# Śledzenie pamięci (tracemalloc) wyraźnie spowalnia pandas – POGODA_PROFIL_PAMIEC=0 je wyłącza.
+
+_ustawienia = {'wlaczone': False, 'plik': None, 'pamiec': True}
+_lokalne = threading.local()
+_blokada_zapisu = threading.Lock()
+
+# tracemalloc jest wspólny dla procesu, a stosy etapów są per wątek (np. sesje Streamlit):
+# start/stop pod blokadą z licznikiem aktywnych etapów, zatrzymanie dopiero po ostatnim
+_blokada_sledzenia = threading.Lock()
+_sledzenie = {'aktywne': 0, 'wlasne': False}
+
+
+def configure(wlaczone=True, plik=None, pamiec=True):
+    _ustawienia.update({'wlaczone': wlaczone, 'plik': plik, 'pamiec': pamiec})
+
+
+_zmienna = os.environ.get("POGODA_PROFIL")
+if _zmienna:
+    configure(True, None if _zmienna == "1" else _zmienna, os.environ.get("POGODA_PROFIL_PAMIEC", "1") != "0")
+
+
+def _ustawienie(klucz):
+    lokalnie = getattr(_lokalne, klucz, None)
+    return _ustawienia[klucz] if lokalnie is None else lokalnie
+
+
+def enabled():
+    return _ustawienie('wlaczone')
+
+
+def _stos():
+    if not hasattr(_lokalne, 'stos'):
+        _lokalne.stos = []
+    return _lokalne.stos
+
+
+def _emituj(wpis):
+    przebieg = getattr(_lokalne, 'przebieg', None)
+    if przebieg is not None:
+        wpis['przebieg'] = przebieg['id']
+        przebieg['wpisy'].append(wpis)
+
+    # Linie JSON tylko przy włączeniu globalnym; profilowanie jednej sesji tylko zbiera wpisy
+    if not _ustawienia['wlaczone']:
+        return
+    linia = json.dumps(wpis, ensure_ascii=False, default=str)
+    if _ustawienia['plik']:
+        with _blokada_zapisu, open(_ustawienia['plik'], 'a', encoding='utf-8') as plik:
+            plik.write(linia + "\n")
+    else:
+        print(linia, file=sys.stderr)
+
+
+class _Etap:
+    def __init__(self, nazwa, wiersze=None):
+        self.nazwa = nazwa
+        self.wiersze = wiersze
+        self.aktywny = False
+
+    def __enter__(self):
+        if not enabled():
+            return self
+        self.aktywny = True
+        self.pamiec = _ustawienie('pamiec')
+        if self.pamiec:
+            stos = _stos()
+            with _blokada_sledzenia:
+                if _sledzenie['aktywne'] == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _sledzenie['wlasne'] = True
+                _sledzenie['aktywne'] += 1
+                biezaca, szczyt = tracemalloc.get_traced_memory()
+                if stos:
+                    stos[-1]['szczyt'] = max(stos[-1]['szczyt'], szczyt)
+                # Szczyt zerujemy tylko, gdy wszystkie aktywne etapy należą do tego wątku – przy etapach
+                # innych wątków szczyt jest wspólny i wynik jest górnym oszacowaniem
+                if _sledzenie['aktywne'] == len(stos) + 1:
+                    tracemalloc.reset_peak()
+            self.ramka = {'start': biezaca, 'szczyt': biezaca}
+            stos.append(self.ramka)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *wyjatek):
+        if not self.aktywny:
+            return False
+        czas = time.perf_counter() - self.start
+        wpis = {'etap': self.nazwa, 'czas_s': round(czas, 6), 'wiersze': self.wiersze,
+                'ts': datetime.now().isoformat(timespec='milliseconds')}
+        if self.pamiec:
+            stos = _stos()
+            with _blokada_sledzenia:
+                szczyt = max(self.ramka['szczyt'], tracemalloc.get_traced_memory()[1])
+                _sledzenie['aktywne'] -= 1
+                if _sledzenie['aktywne'] == 0 and _sledzenie['wlasne']:
+                    tracemalloc.stop()
+                    _sledzenie['wlasne'] = False
+            stos.pop()
+            if stos:
+                stos[-1]['szczyt'] = max(stos[-1]['szczyt'], szczyt)
+            wpis['pamiec_szczyt_mb'] = round((szczyt - self.ramka['start']) / 2 ** 20, 3)
+        if wyjatek[0] is not None:
+            wpis['blad'] = wyjatek[0].__name__
+        _emituj(wpis)
+        return False
+
+
+# Menedżer kontekstu: `with stage("nazwa") as etap: ...; etap.wiersze = len(df)`
+def stage(nazwa, wiersze=None):
+    return _Etap(nazwa, wiersze)
+
+
+def _liczba_wierszy(wynik):
+    ksztalt = getattr(wynik, 'shape', None)
+    return int(ksztalt[0]) if ksztalt else None
+
+
+# Dekorator: etap o nazwie funkcji (lub podanej); wiersze z wyniku, jeśli to DataFrame/tablica
+def instrumented(nazwa=None):
+    def dekorator(funkcja):
+        etykieta = nazwa or f"{funkcja.__module__}.{funkcja.__name__}"
+
+        @functools.wraps(funkcja)
+        def opakowanie(*args, **kwargs):
+            if not enabled():
+                return funkcja(*args, **kwargs)
+            with stage(etykieta) as etap:
+                wynik = funkcja(*args, **kwargs)
+                etap.wiersze = _liczba_wierszy(wynik)
+            return wynik
+        return opakowanie
+    return dekorator
+
+
+# Wpis dla czasu zmierzonego gdzie indziej (np. w procesie potomnym)
+def record(nazwa, czas_s, wiersze=None):
+    if enabled():
+        _emituj({'etap': nazwa, 'czas_s': round(czas_s, 6), 'wiersze': wiersze,
+                 'ts': datetime.now().isoformat(timespec='milliseconds')})
+
+
+# Odcinki bez zagnieżdżania kodu: lap("mapa") zamyka poprzedni odcinek i otwiera nowy
+def lap(nazwa):
+    poprzedni = getattr(_lokalne, 'odcinek', None)
+    if poprzedni is not None:
+        poprzedni.__exit__(None, None, None)
+        _lokalne.odcinek = None
+    if nazwa is not None and enabled():
+        _lokalne.odcinek = stage(nazwa).__enter__()
+
+
+# Przebieg (np. jeden rerun Streamlit): zbiera wpisy bieżącego wątku do zestawienia.
+# wlaczone/pamiec=None – obowiązuje ustawienie globalne (POGODA_PROFIL); odcinek pozostawiony
+# przez przerwany poprzedni przebieg w tym wątku jest zamykany.
+def start_run(nazwa="przebieg", wlaczone=None, pamiec=None):
+    lap(None)
+    _lokalne.wlaczone = wlaczone
+    _lokalne.pamiec = pamiec
+    _lokalne.odcinek = None
+    _lokalne.przebieg = {'id': f"{nazwa}-{uuid.uuid4().hex[:8]}", 'wpisy': []}
+    return _lokalne.przebieg['id']
+
+
+def finish_run():
+    lap(None)
+    przebieg = getattr(_lokalne, 'przebieg', None)
+    _lokalne.przebieg = None
+    _lokalne.wlaczone = None
+    _lokalne.pamiec = None
+    return przebieg['wpisy'] if przebieg else []
+
+
+def format_breakdown(wpisy):
+    linie = [f"{'etap':<45} {'czas [ms]':>10} {'wiersze':>9} {'pamięć [MB]':>12}"]
+    for wpis in wpisy:
+        wiersze = '' if wpis.get('wiersze') is None else wpis['wiersze']
+        pamiec = wpis.get('pamiec_szczyt_mb', '')
+        linie.append(f"{wpis['etap']:<45} {wpis['czas_s'] * 1000:>10.1f} {wiersze:>9} {pamiec:>12}")
+    return "\n".join(linie)
@@ -0,0 +1,466 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from instrumentation import instrumented
+from schema import apply_schema
+
+# Katalog z logiem podzielonym na dni (data=RRRR-MM-DD/part-*.parquet)
+KATALOG_LOGU = os.path.join(os.path.dirname(__file__), "weather_log")
+
+# Stary log w formacie CSV (źródło jednorazowej migracji)
+PLIK_CSV = os.path.join(os.path.dirname(__file__), "weather_log.csv")
+
+# Znacznik wykonanej migracji i blokada na czas jej trwania (wspólna dla procesów)
+ZNACZNIK_MIGRACJI = ".migracja_csv"
+BLOKADA_MIGRACJI = ".migracja_csv.lock"
+
+# Blokada starsza niż tyle sekund pochodzi z przerwanej migracji i jest przejmowana
+CZAS_BLOKADY_MIGRACJI = 600
+
+_blokada_migracji = threading.Lock()
+
+# Opis ostatniej kompakcji partycji (compact_partition): scalony plik i fragmenty źródłowe
+OPIS_KOMPAKCJI = "_kompakcja.json"
+
+# Kolumna, po której dzielimy log na partycje
+KOLUMNA_DATY = "data_pobrania"
+
+# Docelowy schemat logu – brakujące kolumny (np. dodane później suma_opadu) uzupełniamy NaN
+KOLUMNY_LOGU = ['stacja', 'temperatura', 'wilgotnosc_wzgledna', 'cisnienie', 'data_pobrania', 'suma_opadu',
+                'id_stacji', 'data_pomiaru', 'godzina_pomiaru']
+KOLUMNY_LICZBOWE = ['temperatura', 'wilgotnosc_wzgledna', 'cisnienie', 'suma_opadu']
+
+# Klucz naturalny pomiaru. Stary log nie zna godziny – takie wiersze mają pustą godzina_pomiaru,
+# a data_pomiaru przejmują z data_pobrania.
+KLUCZ_POMIARU = ['id_stacji', 'data_pomiaru', 'godzina_pomiaru']
+BRAK_GODZINY = 99
+
+# Indeks kluczy: jeden plik .npy na dzień pomiaru (klucz, skrót wartości, partycja z wierszem),
+# więc sprawdzenie duplikatów czyta tylko dni obecne w nowych danych
+KATALOG_KLUCZY = "_klucze"
+TYP_INDEKSU = np.dtype([('klucz', 'i8'), ('skrot', 'u8'), ('partycja', 'U10')])
+
+
+def partition_dir(data, katalog=KATALOG_LOGU):
+    return os.path.join(katalog, f"data={data}")
+
+
+# Identyfikatory stacji po nazwie – dla wierszy starego logu, który zapisywał tylko nazwę
+def _identyfikatory_stacji():
+    from stations import station_registry
+
+    rejestr = station_registry().frame()
+    return dict(zip(rejestr['stacja'], rejestr['id_stacji'].astype('int64')))
+
+
+def _ujednolic_schemat(df):
+    df = df.copy()
+    for kolumna in KOLUMNY_LOGU:
+        if kolumna not in df.columns:
+            df[kolumna] = pd.NA
+    for kolumna in KOLUMNY_LICZBOWE:
+        df[kolumna] = pd.to_numeric(df[kolumna], errors='coerce').astype('float32')
+    df['stacja'] = df['stacja'].astype(str)
+    df[KOLUMNA_DATY] = pd.to_datetime(df[KOLUMNA_DATY]).dt.strftime('%Y-%m-%d')
+
+    df['id_stacji'] = pd.to_numeric(df['id_stacji'], errors='coerce').astype('Int32')
+    brak_id = df['id_stacji'].isna()
+    if brak_id.any():
+        df.loc[brak_id, 'id_stacji'] = df.loc[brak_id, 'stacja'].map(_identyfikatory_stacji()).astype('Int32')
+    data_pomiaru = df['data_pomiaru'].astype(object).where(df['data_pomiaru'].notna(), df[KOLUMNA_DATY])
+    df['data_pomiaru'] = pd.to_datetime(data_pomiaru).dt.strftime('%Y-%m-%d')
+    df['godzina_pomiaru'] = pd.to_numeric(df['godzina_pomiaru'], errors='coerce').astype('Int8')
+
+    pozostale = [k for k in df.columns if k not in KOLUMNY_LOGU]
+    return df[KOLUMNY_LOGU + pozostale]
+
+
+# Stały identyfikator stacji (niezależny od zmiany nazwy): id_stacji, brakujące uzupełniane z rejestru
+# po nazwie, a stacje spoza rejestru dostają ujemną sumę CRC nazwy
+def station_ids(df):
+    identyfikatory = pd.to_numeric(df['id_stacji'], errors='coerce').astype('float64')
+    if identyfikatory.isna().any():
+        nazwy = df['stacja'].astype(str)
+        identyfikatory = identyfikatory.fillna(nazwy.map(_identyfikatory_stacji()).astype('float64'))
+    if identyfikatory.isna().any():
+        zastepcze = nazwy.map({n: -(zlib.crc32(n.encode('utf-8')) & 0x7FFFFFFF) for n in nazwy.unique()})
+        identyfikatory = identyfikatory.fillna(zastepcze)
+    return identyfikatory.to_numpy(dtype='int64')
+
+
+# Klucz w obrębie dnia pomiaru: id_stacji * 100 + godzina
+def _klucze(df):
+    godziny = df['godzina_pomiaru'].astype('float64').fillna(BRAK_GODZINY)
+    return station_ids(df) * 100 + godziny.to_numpy(dtype='int64')
+
+
+# Skrót wartości pomiarowych – powtórzony pomiar z identycznymi wartościami jest pomijany bez czytania partycji
+def _skroty(df):
+    return pd.util.hash_pandas_object(df[KOLUMNY_LICZBOWE], index=False).to_numpy()
+
+
+# Usunięcie powtórzeń klucza (zostaje ostatnie wystąpienie); zwraca ramkę i liczbę usuniętych wierszy
+def _deduplikuj(df):
+    powtorzone = pd.DataFrame({'data': df['data_pomiaru'].to_numpy(), 'klucz': _klucze(df)}).duplicated(
+        keep='last').to_numpy()
+    return df[~powtorzone], int(powtorzone.sum())
+
+
+# Zapis atomowy: plik tymczasowy w tym samym katalogu, a potem os.replace
+def write_parquet_atomic(df, sciezka):
+    tymczasowy = f"{sciezka}.{uuid.uuid4().hex}.tmp"
+    try:
+        df.to_parquet(tymczasowy, index=False)
+        with open(tymczasowy, 'rb') as plik:
+            os.fsync(plik.fileno())
+        os.replace(tymczasowy, sciezka)
+    finally:
+        if os.path.exists(tymczasowy):
+            os.remove(tymczasowy)
+
+
+# Dopisanie nowego pobrania – każda data trafia do własnego fragmentu, bez czytania historii
+def append_snapshot(df, katalog=KATALOG_LOGU):
+    return _dopisz(_ujednolic_schemat(df), katalog)
+
+
+# Zapis fragmentów ramki już w ujednoliconym schemacie
+def _dopisz(df, katalog=KATALOG_LOGU):
+    znacznik_czasu = datetime.now().strftime('%Y%m%d%H%M%S%f')
+    zapisane = []
+    for data, fragment in df.groupby(KOLUMNA_DATY, sort=True):
+        katalog_partycji = partition_dir(data, katalog)
+        os.makedirs(katalog_partycji, exist_ok=True)
+        sciezka = os.path.join(katalog_partycji, f"part-{znacznik_czasu}-{uuid.uuid4().hex[:8]}.parquet")
+        write_parquet_atomic(fragment.sort_values('stacja').reset_index(drop=True), sciezka)
+        zapisane.append(sciezka)
+    return zapisane
+
+
+# Blokada migracji między procesami: plik tworzony z O_CREAT|O_EXCL. Pozostałość po przerwanym procesie
+# (starsza niż CZAS_BLOKADY_MIGRACJI) jest usuwana; zwraca ścieżkę do zwolnienia przez os.remove.
+def _zajmij_blokade_migracji(katalog):
+    os.makedirs(katalog, exist_ok=True)
+    sciezka = os.path.join(katalog, BLOKADA_MIGRACJI)
+    while True:
+        try:
+            deskryptor = os.open(sciezka, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(sciezka) > CZAS_BLOKADY_MIGRACJI:
+                    os.remove(sciezka)
+            except FileNotFoundError:
+                pass
+            time.sleep(0.1)
+            continue
+        with os.fdopen(deskryptor, 'w', encoding='utf-8') as plik:
+            plik.write(f"{os.getpid()}\n")
+        return sciezka
+
+
+# Jednorazowa migracja starego CSV do partycji dziennych, pod blokadą wątków i procesów – równoległe
+# pierwsze uruchomienia czekają na jedną migrację zamiast importować CSV drugi raz. Znacznik powstaje
+# atomowo dopiero po danych i po_migracji (np. przebudowie agregatów); jeśli poprzednia próba przerwała
+# się przed nim, indeks kluczy jest odtwarzany z partycji, więc upsert pomija już przeniesione wiersze.
+def migrate_csv(plik_csv=PLIK_CSV, katalog=KATALOG_LOGU, po_migracji=None):
+    znacznik = os.path.join(katalog, ZNACZNIK_MIGRACJI)
+    if os.path.exists(znacznik) or not os.path.exists(plik_csv):
+        return 0
+
+    with _blokada_migracji:
+        blokada = _zajmij_blokade_migracji(katalog)
+        try:
+            if os.path.exists(znacznik):
+                return 0
+            df = pd.read_csv(plik_csv, encoding='utf-8-sig')
+            df = df.dropna(subset=['stacja', KOLUMNA_DATY])
+            if not df.empty:
+                if list_dates(katalog=katalog):
+                    rebuild_key_index(katalog)
+                upsert_snapshot(df, katalog)
+                if po_migracji is not None:
+                    po_migracji(katalog)
+
+            tymczasowy = f"{znacznik}.{uuid.uuid4().hex}.tmp"
+            with open(tymczasowy, 'w', encoding='utf-8') as plik:
+                plik.write(f"{plik_csv}\n{len(df)}\n")
+                plik.flush()
+                os.fsync(plik.fileno())
+            os.replace(tymczasowy, znacznik)
+            return len(df)
+        finally:
+            os.remove(blokada)
+
+
+# Lista dat (partycji) dostępnych w logu, opcjonalnie zawężona do zakresu
+def list_dates(start=None, end=None, katalog=KATALOG_LOGU):
+    if not os.path.isdir(katalog):
+        return []
+    # Przy obu granicach sprawdzamy tylko katalogi z okna – koszt zależy od długości okna, nie historii
+    if start is not None and end is not None:
+        zakres = pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize(), freq='D')
+        return [data for data in zakres.strftime('%Y-%m-%d')
+                if os.path.isdir(partition_dir(data, katalog))]
+    start = pd.Timestamp(start).strftime('%Y-%m-%d') if start is not None else None
+    end = pd.Timestamp(end).strftime('%Y-%m-%d') if end is not None else None
+    daty = []
+    for nazwa in sorted(os.listdir(katalog)):
+        if not nazwa.startswith("data="):
+            continue
+        data = nazwa[len("data="):]
+        if start is not None and data < start:
+            continue
+        if end is not None and data > end:
+            continue
+        daty.append(data)
+    return daty
+
+
+def partition_files(data, katalog=KATALOG_LOGU):
+    katalog_partycji = partition_dir(data, katalog)
+    return [os.path.join(katalog_partycji, nazwa)
+            for nazwa in sorted(os.listdir(katalog_partycji))
+            if nazwa.startswith("part-") and nazwa.endswith(".parquet")]
+
+
+# Wybrane kolumny wielu fragmentów: odczyt samym pyarrow i jedna konwersja do pandas (narzut na plik
+# dominowałby przy setkach małych fragmentów). Kolumny brakujące w starszych fragmentach są puste.
+def read_fragments(sciezki, schemat):
+    tabele = []
+    for sciezka in sciezki:
+        tabela = pq.read_table(sciezka, columns=[k for k in schemat.names if k in pq.read_schema(sciezka).names])
+        kolumny = [tabela.column(pole.name).cast(pole.type) if pole.name in tabela.column_names
+                   else pa.nulls(tabela.num_rows, pole.type) for pole in schemat]
+        tabele.append(pa.Table.from_arrays(kolumny, schema=schemat))
+    return (pa.concat_tables(tabele) if tabele else schemat.empty_table()).to_pandas()
+
+
+# Wszystkie fragmenty partycji w kolejności zapisu, w ujednoliconym schemacie
+def _wczytaj_partycje(data, katalog=KATALOG_LOGU):
+    pliki = partition_files(data, katalog)
+    if not pliki:
+        return pd.DataFrame(columns=KOLUMNY_LOGU), pliki
+    df = pd.concat([pd.read_parquet(sciezka) for sciezka in pliki], ignore_index=True)
+    return _ujednolic_schemat(df), pliki
+
+
+# Zastąpienie podanych fragmentów partycji jednym plikiem (nowy zapisywany przed usunięciem starych);
+# fragmenty spoza listy zostają. Partycja bez fragmentów zostaje z samym agregatem dziennym – jego
+# stary wkład odejmuje, a potem katalog usuwa aktualizacja agregatów (refresh/rebuild_aggregates).
+def _przepisz_partycje(data, df, stare_pliki, katalog=KATALOG_LOGU):
+    nowe = _dopisz(df, katalog) if not df.empty else []
+    for sciezka in stare_pliki:
+        if sciezka not in nowe:
+            os.remove(sciezka)
+    katalog_partycji = partition_dir(data, katalog)
+    if df.empty:
+        if os.path.exists(opis := os.path.join(katalog_partycji, OPIS_KOMPAKCJI)):
+            os.remove(opis)
+        if not os.listdir(katalog_partycji):
+            os.rmdir(katalog_partycji)
+
+
+def _plik_kluczy(data_pomiaru, katalog=KATALOG_LOGU):
+    return os.path.join(katalog, KATALOG_KLUCZY, f"data={data_pomiaru}.npy")
+
+
+def _wczytaj_klucze(data_pomiaru, katalog=KATALOG_LOGU):
+    sciezka = _plik_kluczy(data_pomiaru, katalog)
+    return np.load(sciezka) if os.path.exists(sciezka) else np.empty(0, dtype=TYP_INDEKSU)
+
+
+def _zapisz_klucze(data_pomiaru, indeks, katalog=KATALOG_LOGU):
+    sciezka = _plik_kluczy(data_pomiaru, katalog)
+    os.makedirs(os.path.dirname(sciezka), exist_ok=True)
+    tymczasowy = f"{sciezka}.{uuid.uuid4().hex}.tmp.npy"
+    np.save(tymczasowy, np.sort(indeks, order='klucz'))
+    os.replace(tymczasowy, sciezka)
+
+
+def _wpisy_indeksu(df):
+    wpisy = np.empty(len(df), dtype=TYP_INDEKSU)
+    wpisy['klucz'] = _klucze(df)
+    wpisy['skrot'] = _skroty(df)
+    wpisy['partycja'] = df[KOLUMNA_DATY].to_numpy(dtype=str)
+    return wpisy
+
+
+# Indeks kluczy od zera z całego logu (jednorazowo dla logu sprzed indeksu i po kompakcji)
+def rebuild_key_index(katalog=KATALOG_LOGU):
+    shutil.rmtree(os.path.join(katalog, KATALOG_KLUCZY), ignore_errors=True)
+    os.makedirs(os.path.join(katalog, KATALOG_KLUCZY), exist_ok=True)
+    indeksy = {}
+    for data in list_dates(katalog=katalog):
+        df, _ = _wczytaj_partycje(data, katalog)
+        for data_pomiaru, fragment in df.groupby('data_pomiaru', sort=True):
+            indeksy.setdefault(data_pomiaru, []).append(_wpisy_indeksu(fragment))
+    for data_pomiaru, wpisy in indeksy.items():
+        indeks = np.concatenate(wpisy)
+        # Przy powtórzeniach (log sprzed indeksu) obowiązuje ostatni zapis – jak w upsert_snapshot
+        _, ostatnie = np.unique(indeks['klucz'][::-1], return_index=True)
+        _zapisz_klucze(data_pomiaru, indeks[len(indeks) - 1 - ostatnie], katalog)
+    return sum(len(wpisy) for wpisy in indeksy.values())
+
+
+# Zapis kluczowany (id_stacji, data_pomiaru, godzina_pomiaru): nowe klucze są dopisywane,
+# powtórzenia z tymi samymi wartościami pomijane, a zmienione wartości zastępują stary wiersz.
+# Koszt sprawdzenia – O(nowe wiersze) plus indeksy dni z nowych danych.
+# Zwraca zapisane wiersze i daty partycji, z których usunięto zastąpione wiersze.
+def upsert_snapshot(df, katalog=KATALOG_LOGU):
+    df, _ = _deduplikuj(_ujednolic_schemat(df))
+    if not os.path.isdir(os.path.join(katalog, KATALOG_KLUCZY)):
+        rebuild_key_index(katalog)
+
+    do_zapisu = []
+    do_usuniecia = {}
+    nowe_indeksy = {}
+    for data_pomiaru, fragment in df.groupby('data_pomiaru', sort=True):
+        indeks = _wczytaj_klucze(data_pomiaru, katalog)
+        wpisy = _wpisy_indeksu(fragment)
+        pozycje = np.minimum(np.searchsorted(indeks['klucz'], wpisy['klucz']), max(len(indeks) - 1, 0))
+        znane = (indeks['klucz'][pozycje] == wpisy['klucz']) if len(indeks) else np.zeros(len(wpisy), dtype=bool)
+        bez_zmian = znane & (indeks['skrot'][pozycje] == wpisy['skrot']) if len(indeks) else znane
+        zmienione = znane & ~bez_zmian
+        if not (~bez_zmian).any():
+            continue
+
+        for partycja, klucz in zip(indeks['partycja'][pozycje[zmienione]], wpisy['klucz'][zmienione]):
+            do_usuniecia.setdefault(str(partycja), set()).add((data_pomiaru, int(klucz)))
+        pozostale = indeks[~np.isin(indeks['klucz'], wpisy['klucz'][zmienione])]
+        nowe_indeksy[data_pomiaru] = np.concatenate([pozostale, wpisy[~bez_zmian]])
+        do_zapisu.append(fragment[~bez_zmian])
+
+    # Kolejność: nowe wiersze, potem partycje bez zastąpionych wierszy, na końcu indeks. Awaria w trakcie
+    # zostawia najwyżej powtórzenia (usuwa je compact_log()), nigdy utratę pomiaru. Fragmenty partycji
+    # są zapamiętane przed dopisaniem, więc przepisanie nie dotyka właśnie zapisanych wierszy.
+    do_przepisania = [(partycja, klucze, *_wczytaj_partycje(partycja, katalog))
+                      for partycja, klucze in sorted(do_usuniecia.items())]
+
+    zapisane = pd.concat(do_zapisu, ignore_index=True) if do_zapisu else df.iloc[:0]
+    if not zapisane.empty:
+        _dopisz(zapisane, katalog)
+
+    for partycja, klucze, stare, pliki in do_przepisania:
+        zastapione = pd.Series(list(zip(stare['data_pomiaru'], _klucze(stare)))).isin(klucze).to_numpy()
+        _przepisz_partycje(partycja, stare[~zastapione], pliki, katalog)
+
+    for data_pomiaru, indeks in nowe_indeksy.items():
+        _zapisz_klucze(data_pomiaru, indeks, katalog)
+    return zapisane, sorted(do_usuniecia)
+
+
+# Kompakcja magazynu: jeden posortowany fragment na partycję, bez powtórzeń klucza (także między
+# partycjami – zostaje wiersz z ostatniego pobrania); zwraca liczbę usuniętych wierszy
+def compact_log(katalog=KATALOG_LOGU):
+    daty = list_dates(katalog=katalog)
+    klucze = []
+    for data in daty:
+        df, _ = _wczytaj_partycje(data, katalog)
+        df, _ = _deduplikuj(df)
+        klucze.append(pd.DataFrame({'data_pomiaru': df['data_pomiaru'].to_numpy(), 'klucz': _klucze(df),
+                                    'partycja': data}))
+    wszystkie = pd.concat(klucze, ignore_index=True) if klucze else pd.DataFrame(columns=['partycja'])
+    starsze = wszystkie[wszystkie.duplicated(['data_pomiaru', 'klucz'], keep='last')]
+    starsze = {data: set(zip(grupa['data_pomiaru'], grupa['klucz'])) for data, grupa in starsze.groupby('partycja')}
+
+    usuniete = 0
+    for data in daty:
+        df, pliki = _wczytaj_partycje(data, katalog)
+        przed = len(df)
+        df, _ = _deduplikuj(df)
+        if data in starsze:
+            df = df[~pd.Series(list(zip(df['data_pomiaru'], _klucze(df)))).isin(starsze[data]).to_numpy()]
+        usuniete += przed - len(df)
+        if len(pliki) > 1 or len(df) < przed:
+            _przepisz_partycje(data, df.sort_values(['stacja', 'data_pomiaru', 'godzina_pomiaru']), pliki, katalog)
+
+    rebuild_key_index(katalog)
+    return usuniete
+
+
+# Kompakcja jednej partycji (np. wczorajszej w kolektorze, który dopisuje fragment co godzinę): fragmenty
+# scalone w jeden posortowany plik. Wiersze się nie zmieniają, więc indeks kluczy i agregat dzienny pozostają
+# aktualne. Opis kompakcji powstaje przed scalonym plikiem – modele przyrostowe (model_state) podmieniają
+# wg niego znane fragmenty zamiast liczyć od zera. Zwraca liczbę scalonych fragmentów.
+def compact_partition(data, katalog=KATALOG_LOGU):
+    df, pliki = _wczytaj_partycje(data, katalog)
+    if len(pliki) < 2:
+        return 0
+    katalog_partycji = partition_dir(data, katalog)
+    nowy = f"part-{datetime.now():%Y%m%d%H%M%S%f}-{uuid.uuid4().hex[:8]}.parquet"
+
+    opis = os.path.join(katalog_partycji, OPIS_KOMPAKCJI)
+    tymczasowy = f"{opis}.{uuid.uuid4().hex}.tmp"
+    with open(tymczasowy, 'w', encoding='utf-8') as plik:
+        json.dump({'plik': nowy, 'zrodla': [os.path.basename(sciezka) for sciezka in pliki]}, plik)
+    os.replace(tymczasowy, opis)
+
+    write_parquet_atomic(df.sort_values(['stacja', 'data_pomiaru', 'godzina_pomiaru']).reset_index(drop=True),
+                         os.path.join(katalog_partycji, nowy))
+    for sciezka in pliki:
+        os.remove(sciezka)
+    return len(pliki)
+
+
+def compaction_record(data, katalog=KATALOG_LOGU):
+    sciezka = os.path.join(partition_dir(data, katalog), OPIS_KOMPAKCJI)
+    if not os.path.exists(sciezka):
+        return None
+    with open(sciezka, encoding='utf-8') as plik:
+        return json.load(plik)
+
+
+# Kompakcja starego CSV: ujednolicony schemat, bez powtórzeń klucza, posortowany; zwraca liczbę usuniętych wierszy
+def compact_csv(plik_csv=PLIK_CSV):
+    df = pd.read_csv(plik_csv, encoding='utf-8-sig')
+    przed = len(df)
+    df, _ = _deduplikuj(_ujednolic_schemat(df.dropna(subset=['stacja', KOLUMNA_DATY])))
+    df = df.sort_values([KOLUMNA_DATY, 'stacja', 'data_pomiaru', 'godzina_pomiaru'], kind='stable')
+
+    tymczasowy = f"{plik_csv}.{uuid.uuid4().hex}.tmp"
+    try:
+        df.to_csv(tymczasowy, index=False, encoding='utf-8-sig')
+        os.replace(tymczasowy, plik_csv)
+    finally:
+        if os.path.exists(tymczasowy):
+            os.remove(tymczasowy)
+    return przed - len(df)
+
+
+# Odczyt logu (zamiennik pd.read_csv("weather_log.csv")); czyta tylko partycje z zakresu dat
+# i – jeśli podano stacje – tylko ich wiersze (fragmenty są posortowane po stacji).
+# Nie migruje starego CSV – robi to aggregates.prepare_store() przy starcie programu.
+def read_log(start=None, end=None, columns=None, stacje=None, katalog=KATALOG_LOGU):
+    filtry = [('stacja', 'in', list(stacje))] if stacje is not None else None
+    fragmenty = []
+    for data in list_dates(start, end, katalog):
+        for sciezka in partition_files(data, katalog):
+            fragmenty.append(pd.read_parquet(sciezka, columns=columns, filters=filtry))
+
+    if not fragmenty:
+        return pd.DataFrame(columns=columns or KOLUMNY_LOGU)
+    return apply_schema(pd.concat(fragmenty, ignore_index=True), dodatkowe=(KOLUMNA_DATY,))
+
+
+# Historia jednej stacji w zadanym oknie czasu, posortowana po dacie
+@instrumented("log_store.read_station_history")
+def read_station_history(stacja, start=None, end=None, columns=None, katalog=KATALOG_LOGU):
+    if end is None:
+        end = datetime.now()
+    if columns is not None and KOLUMNA_DATY not in columns:
+        columns = [KOLUMNA_DATY] + list(columns)
+
+    df = read_log(start, end, columns=columns, stacje=[stacja], katalog=katalog)
+    df[KOLUMNA_DATY] = pd.to_datetime(df[KOLUMNA_DATY])
+    return df.sort_values(KOLUMNA_DATY, kind='stable').reset_index(drop=True)
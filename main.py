@@ -1,13 +1,33 @@
 from data_loader import fetch_weather_data, save_to_csv
 from data_processing import clean_and_merge_data
-from visualization import plot_temperature, plot_humidity
+from schema import apply_schema, memory_saved
+from aggregates import national_summary, prepare_store
+from visualization import render_plots
+from instrumentation import enabled, finish_run, format_breakdown, start_run
 
 def main():
+    start_run("main")
+    prepare_store()
     df_raw = fetch_weather_data()
     save_to_csv(df_raw)
     df_clean = clean_and_merge_data(df_raw)
-    plot_temperature(df_clean)
-    plot_humidity(df_clean)
+    pamiec = memory_saved(df_raw, apply_schema(df_raw, waliduj=False))
+    print(f"Schemat synop: {pamiec['przed_bajty']} B → {pamiec['po_bajty']} B (-{pamiec['oszczednosc_proc']}%)")
+    render_plots(df_clean)
+
+    # Statystyki całej historii z agregatów przyrostowych
+    historia, _ = national_summary()
+    if historia.empty:
+        print("Historia: brak pomiarów w logu")
+    else:
+        print(f"Historia: średnia temperatura {historia['temperatura_srednia']:.1f} °C "
+              f"(σ {historia['temperatura_odchylenie']:.1f}, min {historia['temperatura_min']:.1f}, "
+              f"max {historia['temperatura_max']:.1f}), pomiarów: {int(historia['temperatura_n'])}")
+
+    # Zestawienie etapów przy POGODA_PROFIL=1 lub POGODA_PROFIL=plik.jsonl
+    wpisy = finish_run()
+    if enabled():
+        print(format_breakdown(wpisy))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,80 @@
+import json
+import os
+import uuid
+
+import numpy as np
+
+from log_store import compaction_record, list_dates, partition_dir, partition_files
+
+# Wspólny stan modeli liczonych przyrostowo nad logiem (klimatologia, prognoza): opis w stan.json
+# (numer wersji, przetworzone fragmenty partycji, stacje) i tablice numpy zapisane pod numerem wersji.
+
+
+# Stan z katalogu. Brak stanu, stan w starszym formacie (bez któregoś pola pustego stanu) albo brak
+# tablic jego wersji daje pusty stan – model liczony od nowa, z zachowanym numerem wersji.
+def load_state(sciezka, pusty, tablice, mmap=False):
+    opis = os.path.join(sciezka, "stan.json")
+    if not os.path.exists(opis):
+        return pusty
+    with open(opis, encoding='utf-8') as plik:
+        stan = json.load(plik)
+    pliki = {nazwa: os.path.join(sciezka, f"{nazwa}-{stan['wersja']}.npy") for nazwa in tablice}
+    if any(klucz not in stan for klucz in pusty if klucz not in tablice) or not all(map(os.path.exists,
+                                                                                         pliki.values())):
+        return dict(pusty, wersja=stan['wersja'])
+    tryb = 'r' if mmap else None
+    stan.update({nazwa: np.load(sciezka_tablicy, mmap_mode=tryb) for nazwa, sciezka_tablicy in pliki.items()})
+    return stan
+
+
+# Każda aktualizacja zapisuje tablice pod nowym numerem wersji, a dopiero potem stan.json, który je
+# wskazuje – przerwany zapis zostawia poprzednią, spójną wersję (sumy zgodne z listą fragmentów)
+def save_state(stan, sciezka, tablice):
+    os.makedirs(sciezka, exist_ok=True)
+    stan['wersja'] += 1
+    for nazwa in tablice:
+        np.save(os.path.join(sciezka, f"{nazwa}-{stan['wersja']}.npy"), stan[nazwa])
+    tymczasowy = os.path.join(sciezka, f"stan.json.{uuid.uuid4().hex}.tmp")
+    with open(tymczasowy, 'w', encoding='utf-8') as plik:
+        json.dump({klucz: wartosc for klucz, wartosc in stan.items() if klucz not in tablice}, plik,
+                  ensure_ascii=False)
+    os.replace(tymczasowy, os.path.join(sciezka, "stan.json"))
+
+    # Usuwane są też tablice starszego formatu (.npz)
+    for nazwa in os.listdir(sciezka):
+        if nazwa.endswith((".npy", ".npz")) and not nazwa.endswith(f"-{stan['wersja']}.npy"):
+            try:
+                os.remove(os.path.join(sciezka, nazwa))
+            except OSError:
+                pass
+
+
+# Fragmenty partycji nieznane jeszcze stanowi, jako (data, plik) w kolejności dat, i liczba partycji,
+# w których plik z compact_partition zastąpił w `znane` swoje fragmenty źródłowe (wszystkie już przetworzone –
+# stan trzeba zapisać). None zamiast listy, gdy znany fragment zniknął w inny sposób (upsert z zastąpieniem,
+# compact_log) – model trzeba wtedy przeliczyć od zera.
+def pending_fragments(znane, katalog):
+    biezace = {data: [os.path.basename(sciezka) for sciezka in partition_files(data, katalog)]
+               for data in list_dates(katalog=katalog)}
+    podmienione = 0
+    for data, pliki in biezace.items():
+        if data not in znane or set(znane[data]) == set(pliki):
+            continue
+        opis = compaction_record(data, katalog)
+        if opis is None or opis['plik'] not in pliki:
+            continue
+        zrodla = set(opis['zrodla'])
+        if zrodla & set(pliki):
+            # Kompakcja przerwana przed usunięciem źródeł – scalony plik powtarza ich wiersze
+            pliki.remove(opis['plik'])
+        elif zrodla <= set(znane[data]):
+            znane[data] = [plik for plik in znane[data] if plik not in zrodla] + [opis['plik']]
+            podmienione += 1
+    if any(not set(pliki) <= set(biezace.get(data, [])) for data, pliki in znane.items()):
+        return None, podmienione
+    return [(data, plik) for data, pliki in biezace.items() for plik in pliki
+            if plik not in znane.get(data, [])], podmienione
+
+
+def fragment_paths(fragmenty, katalog):
+    return [os.path.join(partition_dir(data, katalog), plik) for data, plik in fragmenty]
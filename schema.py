@@ -0,0 +1,107 @@
+import warnings
+
+import pandas as pd
+
+# Zadeklarowany schemat danych synop z API IMGW (wszystkie pola przychodzą jako tekst)
+SCHEMAT_SYNOP = {
+    'id_stacji': 'Int32',
+    'stacja': 'category',
+    'data_pomiaru': 'date',
+    'godzina_pomiaru': 'Int8',
+    'temperatura': 'float32',
+    'predkosc_wiatru': 'float32',
+    'kierunek_wiatru': 'float32',
+    'wilgotnosc_wzgledna': 'float32',
+    'suma_opadu': 'float32',
+    'cisnienie': 'float32',
+}
+
+KOLUMNY_POMIAROWE = [k for k, typ in SCHEMAT_SYNOP.items() if typ == 'float32']
+
+# Pola dodawane przez apply_schema – ponowne zastosowanie schematu ich nie zgłasza
+POLA_POCHODNE = ('czas_pomiaru',)
+
+
+class SchemaWarning(UserWarning):
+    pass
+
+
+def _przyklady(kolumna, maska, limit=3):
+    return ", ".join(repr(w) for w in kolumna[maska].head(limit).tolist())
+
+
+# Wartości, które nie są puste, a mimo to nie dały się sparsować
+def _nieparsowalne(surowa, sparsowana):
+    podejrzane = sparsowana.isna() & surowa.notna()
+    if podejrzane.any() and surowa.dtype == object:
+        podejrzane &= surowa.astype(str).str.strip() != ""
+    return podejrzane
+
+
+def _konwertuj(nazwa, kolumna, typ, problemy):
+    if typ == 'category':
+        return kolumna.astype('category')
+
+    if typ == 'date':
+        daty = pd.to_datetime(kolumna, format='%Y-%m-%d', errors='coerce')
+        bledne = _nieparsowalne(kolumna, daty)
+        if bledne.any():
+            problemy.append(f"{nazwa}: {int(bledne.sum())} niepoprawnych dat ({_przyklady(kolumna, bledne)})")
+        return daty
+
+    liczby = pd.to_numeric(kolumna, errors='coerce')
+    bledne = _nieparsowalne(kolumna, liczby)
+    if bledne.any():
+        problemy.append(f"{nazwa}: {int(bledne.sum())} wartości nieliczbowych ({_przyklady(kolumna, bledne)})")
+
+    if typ.startswith('Int'):
+        ulamkowe = liczby.notna() & (liczby != liczby.round())
+        if ulamkowe.any():
+            problemy.append(f"{nazwa}: {int(ulamkowe.sum())} wartości niecałkowitych ({_przyklady(kolumna, ulamkowe)})")
+            liczby = liczby.where(~ulamkowe)
+    return liczby.astype(typ)
+
+
+# Jednoprzebiegowe parsowanie do zwartych typów z walidacją schematu.
+# `dane` to DataFrame albo lista rekordów z JSON-a; `dodatkowe` to dozwolone pola spoza schematu.
+def apply_schema(dane, kolumny=None, dodatkowe=(), waliduj=True):
+    df = dane if isinstance(dane, pd.DataFrame) else pd.DataFrame.from_records(dane)
+    problemy = []
+
+    nieoczekiwane = [k for k in df.columns
+                     if k not in SCHEMAT_SYNOP and k not in POLA_POCHODNE and k not in dodatkowe]
+    if nieoczekiwane:
+        problemy.append(f"nieoczekiwane pola: {', '.join(map(str, nieoczekiwane))}")
+
+    if kolumny is not None:
+        brakujace = [k for k in kolumny if k not in df.columns]
+        if brakujace:
+            problemy.append(f"brakujące pola: {', '.join(brakujace)}")
+        df = df[[k for k in kolumny if k in df.columns]]
+
+    wynik = {}
+    for nazwa in df.columns:
+        typ = SCHEMAT_SYNOP.get(nazwa)
+        wynik[nazwa] = df[nazwa] if typ is None else _konwertuj(nazwa, df[nazwa], typ, problemy)
+    wynik = pd.DataFrame(wynik, index=df.index)
+
+    # Rzeczywisty znacznik czasu pomiaru
+    if 'data_pomiaru' in wynik.columns and 'godzina_pomiaru' in wynik.columns:
+        godziny = wynik['godzina_pomiaru'].astype('float64')
+        wynik['czas_pomiaru'] = wynik['data_pomiaru'] + pd.to_timedelta(godziny, unit='h')
+
+    if waliduj and problemy:
+        warnings.warn("Niezgodność ze schematem synop: " + "; ".join(problemy), SchemaWarning, stacklevel=2)
+    return wynik
+
+
+# Zużycie pamięci przed i po zastosowaniu schematu
+def memory_saved(df_przed, df_po):
+    przed = int(df_przed.memory_usage(deep=True).sum())
+    po = int(df_po.memory_usage(deep=True).sum())
+    return {
+        'przed_bajty': przed,
+        'po_bajty': po,
+        'oszczednosc_bajty': przed - po,
+        'oszczednosc_proc': round(100 * (przed - po) / przed, 1) if przed else 0.0,
+    }
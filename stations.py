@@ -0,0 +1,183 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Współrzędne stacji synop IMGW, klucz: id_stacji
+PLIK_STACJI = os.path.join(os.path.dirname(__file__), "stations_coordinates.csv")
+
+# Zwarte kopie rejestru (tablice strukturalne .npy, wczytywane przez mmap) – osobna dla każdego pliku CSV
+KATALOG_REJESTRU = os.path.join(os.path.dirname(__file__), "cache")
+
+PROMIEN_ZIEMI_KM = 6371.0
+
+# Obszar siatki interpolacji (Polska z marginesem) i domyślny krok w stopniach
+OBSZAR = {'lat_min': 49.0, 'lat_max': 55.0, 'lon_min': 14.0, 'lon_max': 24.2}
+KROK_SIATKI = 0.1
+
+_blokada = threading.Lock()
+_rejestry = {}
+_pola = {}
+MAKS_POL_W_PAMIECI = 32
+
+
+def _na_sferze(lat, lon):
+    lat = np.radians(np.asarray(lat, dtype='float64'))
+    lon = np.radians(np.asarray(lon, dtype='float64'))
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def _cieciwa_na_km(cieciwa):
+    return 2 * PROMIEN_ZIEMI_KM * np.arcsin(np.clip(cieciwa / 2, 0, 1))
+
+
+# Indeks przestrzenny punktów (KD-drzewo na sferze jednostkowej, cięciwa rośnie z odległością po łuku).
+# scipy importowane dopiero tutaj – import data_processing nie płaci za nie w każdej podkomendzie cli.
+class SpatialIndex:
+    def __init__(self, lat, lon):
+        self.punkty = _na_sferze(lat, lon)
+        try:
+            from scipy.spatial import cKDTree
+        except ImportError:  # scipy jest opcjonalne – bez niego wyszukiwanie liczone wprost w numpy
+            cKDTree = None
+        self.drzewo = cKDTree(self.punkty) if cKDTree is not None else None
+
+    def query(self, lat, lon, k=1):
+        zapytania = _na_sferze(lat, lon).reshape(-1, 3)
+        k = min(k, len(self.punkty))
+        if self.drzewo is not None:
+            cieciwy, indeksy = self.drzewo.query(zapytania, k=k)
+            cieciwy = cieciwy.reshape(len(zapytania), k)
+            indeksy = indeksy.reshape(len(zapytania), k)
+        else:
+            cieciwy = np.sqrt(((zapytania[:, None, :] - self.punkty[None, :, :]) ** 2).sum(axis=-1))
+            indeksy = np.argsort(cieciwy, axis=1)[:, :k]
+            cieciwy = np.take_along_axis(cieciwy, indeksy, axis=1)
+        return _cieciwa_na_km(cieciwy), indeksy
+
+
+class StationRegistry:
+    def __init__(self, tablica):
+        self.tablica = tablica
+        self.id_stacji = tablica['id_stacji']
+        self.indeks = SpatialIndex(tablica['latitude'], tablica['longitude'])
+        self._pozycje = {int(i): n for n, i in enumerate(self.id_stacji)}
+
+    def frame(self):
+        return pd.DataFrame({
+            'id_stacji': pd.array(self.tablica['id_stacji'], dtype='Int32'),
+            'stacja': self.tablica['stacja'].astype(str),
+            'latitude': self.tablica['latitude'].astype('float64'),
+            'longitude': self.tablica['longitude'].astype('float64'),
+        })
+
+    def __len__(self):
+        return len(self.tablica)
+
+    def __getitem__(self, id_stacji):
+        wiersz = self.tablica[self._pozycje[int(id_stacji)]]
+        return {'id_stacji': int(wiersz['id_stacji']), 'stacja': str(wiersz['stacja']),
+                'latitude': float(wiersz['latitude']), 'longitude': float(wiersz['longitude'])}
+
+    # Najbliższe stacje dla punktów (lat, lon): odległości w km i id_stacji
+    def nearest(self, lat, lon, k=1):
+        odleglosci, indeksy = self.indeks.query(lat, lon, k)
+        return odleglosci, self.id_stacji[indeksy]
+
+
+def _zbuduj_tablice(plik_csv):
+    df = pd.read_csv(plik_csv, encoding='utf-8')
+    tablica = np.empty(len(df), dtype=[('id_stacji', 'i4'), ('stacja', 'U32'),
+                                       ('latitude', 'f8'), ('longitude', 'f8')])
+    tablica['id_stacji'] = df['id_stacji'].to_numpy()
+    tablica['stacja'] = df['stacja'].to_numpy(dtype=str)
+    tablica['latitude'] = df['latitude'].to_numpy()
+    tablica['longitude'] = df['longitude'].to_numpy()
+    return np.sort(tablica, order='id_stacji')
+
+
+# Klucz kopii: ścieżka CSV oraz jego rozmiar i czas modyfikacji; zapisany w nazwie pliku kopii
+# (stations-<skrót ścieżki>-<skrót wersji>.npy), więc inny CSV nigdy nie dostanie cudzego rejestru
+def _klucz_rejestru(plik_csv):
+    stan = os.stat(plik_csv)
+    return os.path.abspath(plik_csv), stan.st_size, stan.st_mtime_ns
+
+
+def _plik_rejestru(klucz, katalog_rejestru):
+    sciezka = hashlib.sha1(klucz[0].encode('utf-8')).hexdigest()[:12]
+    wersja = hashlib.sha1(f"{klucz[1]}:{klucz[2]}".encode('utf-8')).hexdigest()[:12]
+    return os.path.join(katalog_rejestru, f"stations-{sciezka}-{wersja}.npy")
+
+
+# Rejestr budowany raz na proces; zwarta kopia na dysku odświeżana, gdy zmieni się CSV
+def station_registry(plik_csv=PLIK_STACJI, katalog_rejestru=KATALOG_REJESTRU):
+    klucz = _klucz_rejestru(plik_csv)
+    with _blokada:
+        if klucz in _rejestry:
+            return _rejestry[klucz]
+
+        plik_rejestru = _plik_rejestru(klucz, katalog_rejestru)
+        if os.path.exists(plik_rejestru):
+            tablica = np.load(plik_rejestru, mmap_mode='r')
+        else:
+            tablica = _zbuduj_tablice(plik_csv)
+            try:
+                os.makedirs(katalog_rejestru, exist_ok=True)
+                tymczasowy = f"{plik_rejestru}.{os.getpid()}.tmp.npy"
+                np.save(tymczasowy, tablica)
+                os.replace(tymczasowy, plik_rejestru)
+                # Kopie poprzednich wersji tego samego CSV (pliki tymczasowe innych procesów zostają)
+                nazwa_kopii = os.path.basename(plik_rejestru)
+                prefiks = nazwa_kopii.rsplit('-', 1)[0] + '-'
+                for nazwa in os.listdir(katalog_rejestru):
+                    if nazwa.startswith(prefiks) and '.tmp' not in nazwa and nazwa != nazwa_kopii:
+                        os.remove(os.path.join(katalog_rejestru, nazwa))
+            except OSError:
+                pass
+
+        _rejestry[klucz] = StationRegistry(tablica)
+        return _rejestry[klucz]
+
+
+# Interpolacja IDW na regularnej siatce: k najbliższych stacji, wagi 1/d^potega
+def idw_grid(df, zmienna, krok=KROK_SIATKI, k=8, potega=2.0, obszar=OBSZAR):
+    dane = df.dropna(subset=['latitude', 'longitude', zmienna])
+    lat = np.arange(obszar['lat_min'], obszar['lat_max'] + krok / 2, krok)
+    lon = np.arange(obszar['lon_min'], obszar['lon_max'] + krok / 2, krok)
+    if dane.empty:
+        return lat, lon, np.full((len(lat), len(lon)), np.nan)
+
+    indeks = SpatialIndex(dane['latitude'].to_numpy(), dane['longitude'].to_numpy())
+    siatka_lat, siatka_lon = np.meshgrid(lat, lon, indexing='ij')
+    odleglosci, indeksy = indeks.query(siatka_lat.ravel(), siatka_lon.ravel(), k=k)
+
+    wartosci = dane[zmienna].to_numpy(dtype='float64')[indeksy]
+    wagi = 1.0 / np.maximum(odleglosci, 1e-6) ** potega
+    pole = (wagi * wartosci).sum(axis=1) / wagi.sum(axis=1)
+    return lat, lon, pole.reshape(siatka_lat.shape)
+
+
+# Pole liczone raz na migawkę danych i współdzielone przez wszystkie sesje w procesie
+def cached_idw_grid(df, zmienna, **parametry):
+    dane = df[['latitude', 'longitude', zmienna]]
+    skrot = hashlib.sha1(pd.util.hash_pandas_object(dane, index=False).to_numpy().tobytes())
+    klucz = (zmienna, skrot.hexdigest(), tuple(sorted(parametry.items())))
+    with _blokada:
+        if klucz in _pola:
+            return _pola[klucz]
+
+    wynik = idw_grid(df, zmienna, **parametry)
+    with _blokada:
+        if len(_pola) >= MAKS_POL_W_PAMIECI:
+            _pola.pop(next(iter(_pola)))
+        _pola[klucz] = wynik
+    return wynik
+
+
+# Siatka w postaci długiej (latitude, longitude, wartość) – do nałożenia na mapę
+def grid_frame(lat, lon, pole, zmienna):
+    siatka_lat, siatka_lon = np.meshgrid(lat, lon, indexing='ij')
+    return pd.DataFrame({'latitude': siatka_lat.ravel(), 'longitude': siatka_lon.ravel(),
+                         zmienna: pole.ravel()})
@@ -1,24 +1,102 @@
-import matplotlib.pyplot as plt
-import seaborn as sns
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-def plot_temperature(df):
-    df_sorted = df.sort_values(by='temperatura', ascending=False)
+import pandas as pd
 
-    plt.figure(figsize=(10, 12))
-    sns.barplot(x='temperatura', y='stacja', data=df_sorted)
-    plt.title('Średnia temperatura w miastach')
-    plt.tight_layout()
-    plt.savefig('temperature_plot.png')
-    plt.close()
+from instrumentation import record, stage
 
+# Rejestr wykresów: nazwa → specyfikacja (kolumna, tytuł, plik wynikowy)
+PLOTY = {}
 
-def plot_humidity(df):
-    df_sorted = df.sort_values(by='wilgotnosc_wzgledna', ascending=False)
 
-    plt.figure(figsize=(10, 12))
-    sns.barplot(x='wilgotnosc_wzgledna', y='stacja', data=df_sorted)
-    plt.title('Średnia wilgotność względna w miastach')
+def register_plot(nazwa, kolumna, tytul, plik, rozmiar=(10, 12)):
+    PLOTY[nazwa] = {'nazwa': nazwa, 'kolumna': kolumna, 'tytul': tytul, 'plik': plik, 'rozmiar': rozmiar}
+
+
+register_plot('temperatura', 'temperatura', 'Średnia temperatura w miastach', 'temperature_plot.png')
+register_plot('wilgotnosc', 'wilgotnosc_wzgledna', 'Średnia wilgotność względna w miastach', 'humidity_plot.png')
+
+
+# Stacja jako tekst: seaborn rysuje kategorie w kolejności kategorii (alfabetycznie, z pustymi słupkami
+# dla nieużywanych), a słupki mają iść w kolejności sortowania po wartości
+def _dane_wykresu(df, spec):
+    dane = df[['stacja', spec['kolumna']]].sort_values(by=spec['kolumna'], ascending=False)
+    return dane.assign(stacja=dane['stacja'].astype(str))
+
+
+# Skrót danych i specyfikacji – ten sam skrót oznacza identyczny obrazek
+def _skrot(dane, spec):
+    skrot = hashlib.sha1(repr(sorted(spec.items())).encode('utf-8'))
+    skrot.update(pd.util.hash_pandas_object(dane, index=False).to_numpy().tobytes())
+    return skrot.hexdigest()
+
+
+def _plik_skrotu(spec):
+    return spec['plik'] + '.sha1'
+
+
+def _bez_zmian(spec, skrot):
+    try:
+        with open(_plik_skrotu(spec), encoding='utf-8') as plik:
+            return plik.read().strip() == skrot and os.path.exists(spec['plik'])
+    except OSError:
+        return False
+
+
+# Rysowanie jednego wykresu (uruchamiane też w procesach potomnych, backend bez okien)
+def _renderuj(spec, dane):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    start = time.perf_counter()
+    plt.figure(figsize=spec['rozmiar'])
+    sns.barplot(x=spec['kolumna'], y='stacja', data=dane)
+    plt.title(spec['tytul'])
     plt.tight_layout()
-    plt.savefig('humidity_plot.png')
+    plt.savefig(spec['plik'])
     plt.close()
+    return time.perf_counter() - start
+
+
+# Renderuje zarejestrowane wykresy; pomija niezmienione, resztę rysuje równolegle
+def render_plots(df, nazwy=None, rownolegle=True):
+    specyfikacje = [PLOTY[n] for n in (nazwy or PLOTY)]
+    do_narysowania = []
+    czasy = {}
+    with stage("visualization.hash_inputs", len(df)):
+        for spec in specyfikacje:
+            dane = _dane_wykresu(df, spec)
+            skrot = _skrot(dane, spec)
+            if _bez_zmian(spec, skrot):
+                print(f"Wykres {spec['nazwa']}: bez zmian, pominięto")
+                czasy[spec['nazwa']] = 0.0
+            else:
+                do_narysowania.append((spec, dane, skrot))
+
+    with stage("visualization.render_plots", len(do_narysowania)):
+        if rownolegle and len(do_narysowania) > 1:
+            with ProcessPoolExecutor(max_workers=min(len(do_narysowania), os.cpu_count() or 1)) as pula:
+                wyniki = list(pula.map(_renderuj, [s for s, _, _ in do_narysowania],
+                                       [d for _, d, _ in do_narysowania]))
+        else:
+            wyniki = [_renderuj(spec, dane) for spec, dane, _ in do_narysowania]
 
+    for (spec, dane, skrot), czas in zip(do_narysowania, wyniki):
+        with open(_plik_skrotu(spec), 'w', encoding='utf-8') as plik:
+            plik.write(skrot)
+        print(f"Wykres {spec['nazwa']}: {czas:.2f} s")
+        record(f"visualization.render:{spec['nazwa']}", czas, len(dane))
+        czasy[spec['nazwa']] = czas
+    return czasy
+
+
+def plot_temperature(df):
+    render_plots(df, ['temperatura'], rownolegle=False)
+
+
+def plot_humidity(df):
+    render_plots(df, ['wilgotnosc'], rownolegle=False)